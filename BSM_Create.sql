@@ -74,3 +74,334 @@ CREATE TABLE ImportDetails (
     FOREIGN KEY (book_id) REFERENCES Books(book_id)
 );
 
+
+-- Index phục vụ phân trang keyset theo ngày (mới nhất trước)
+CREATE INDEX idx_Orders_OrderDate ON Orders(order_date DESC, order_id DESC)
+    INCLUDE (order_code, customer_id, total_amount, status);
+
+CREATE INDEX idx_ImportBooks_ImportDate ON ImportBooks(import_date DESC, import_id DESC)
+    INCLUDE (import_code, supplier, total_amount);
+
+-- Index phục vụ tìm khách hàng theo tiền tố số điện thoại
+-- (tìm theo họ tên dùng idx_Customers_NamePhone trong "Các câu truy vấn.sql")
+CREATE INDEX idx_Customers_Phone ON Customers(phone_number)
+    INCLUDE (customer_code, full_name, address);
+GO
+
+-- Outbox đồng bộ SQL -> MongoDB: ghi trong cùng giao dịch với thao tác nghiệp vụ (qua trigger)
+CREATE TABLE SyncOutbox (
+    outbox_id BIGINT IDENTITY(1,1) PRIMARY KEY,
+    table_name VARCHAR(30) NOT NULL,
+    entity_id INT NOT NULL,
+    operation CHAR(1) NOT NULL,          -- 'U': thêm/sửa, 'D': xóa
+    created_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+);
+
+-- Vị trí đã đồng bộ của từng tiến trình đồng bộ
+CREATE TABLE SyncState (
+    sync_name VARCHAR(50) PRIMARY KEY,
+    position BIGINT NOT NULL DEFAULT 0,
+    updated_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+);
+GO
+
+CREATE TRIGGER trg_Outbox_Books ON Books
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    INSERT INTO SyncOutbox (table_name, entity_id, operation)
+    SELECT 'Books', book_id, 'U' FROM inserted
+    UNION ALL
+    SELECT 'Books', d.book_id, 'D' FROM deleted d
+    WHERE NOT EXISTS (SELECT 1 FROM inserted i WHERE i.book_id = d.book_id);
+END;
+GO
+
+CREATE TRIGGER trg_Outbox_Customers ON Customers
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    INSERT INTO SyncOutbox (table_name, entity_id, operation)
+    SELECT 'Customers', customer_id, 'U' FROM inserted
+    UNION ALL
+    SELECT 'Customers', d.customer_id, 'D' FROM deleted d
+    WHERE NOT EXISTS (SELECT 1 FROM inserted i WHERE i.customer_id = d.customer_id);
+END;
+GO
+
+CREATE TRIGGER trg_Outbox_Orders ON Orders
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    INSERT INTO SyncOutbox (table_name, entity_id, operation)
+    SELECT 'Orders', order_id, 'U' FROM inserted
+    UNION ALL
+    SELECT 'Orders', d.order_id, 'D' FROM deleted d
+    WHERE NOT EXISTS (SELECT 1 FROM inserted i WHERE i.order_id = d.order_id);
+END;
+GO
+
+CREATE TRIGGER trg_Outbox_ImportBooks ON ImportBooks
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    INSERT INTO SyncOutbox (table_name, entity_id, operation)
+    SELECT 'ImportBooks', import_id, 'U' FROM inserted
+    UNION ALL
+    SELECT 'ImportBooks', d.import_id, 'D' FROM deleted d
+    WHERE NOT EXISTS (SELECT 1 FROM inserted i WHERE i.import_id = d.import_id);
+END;
+GO
+
+-- Trigger outbox tắt mặc định (chế độ 'direct': ứng dụng tự ghi MongoDB, không ai đọc SyncOutbox).
+-- mongo_replicator.py bật trigger rồi chuyển SyncMode sang 'outbox' khi khởi động, --disable chuyển về.
+DISABLE TRIGGER trg_Outbox_Books ON Books;
+DISABLE TRIGGER trg_Outbox_Customers ON Customers;
+DISABLE TRIGGER trg_Outbox_Orders ON Orders;
+DISABLE TRIGGER trg_Outbox_ImportBooks ON ImportBooks;
+GO
+
+-- Chế độ đồng bộ MongoDB dùng chung cho mọi quầy (chỉ mongo_replicator.py đổi):
+--   'direct'   ứng dụng ghi trực tiếp, trigger outbox tắt
+--   'outbox'   trigger outbox bật, ứng dụng bỏ ghi trực tiếp (chỉ khi mọi trigger outbox đang bật)
+--   'draining' đang chuyển về 'direct': ứng dụng đã ghi trực tiếp lại, trigger vẫn bật đến khi outbox hết
+CREATE TABLE SyncMode (
+    id TINYINT PRIMARY KEY CHECK (id = 1),
+    mode VARCHAR(10) NOT NULL CHECK (mode IN ('direct', 'outbox', 'draining')),
+    updated_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+);
+INSERT INTO SyncMode (id, mode) VALUES (1, 'direct');
+
+-- Bản ghi outbox lỗi lặp lại (không phải lỗi kết nối) được chuyển ra đây để không chặn các bản ghi sau
+CREATE TABLE SyncOutboxDeadLetter (
+    outbox_id BIGINT PRIMARY KEY,
+    table_name VARCHAR(30) NOT NULL,
+    entity_id INT NOT NULL,
+    operation CHAR(1) NOT NULL,
+    created_at DATETIME2 NOT NULL,
+    failed_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+    error NVARCHAR(2000) NULL
+);
+GO
+
+-- Rowversion phục vụ đồng bộ tăng dần theo watermark (mongo_incremental_sync.py)
+ALTER TABLE Books ADD row_version ROWVERSION;
+ALTER TABLE Customers ADD row_version ROWVERSION;
+ALTER TABLE Orders ADD row_version ROWVERSION;
+ALTER TABLE ImportBooks ADD row_version ROWVERSION;
+GO
+
+CREATE INDEX idx_Books_RowVersion ON Books(row_version);
+CREATE INDEX idx_Customers_RowVersion ON Customers(row_version);
+CREATE INDEX idx_Orders_RowVersion ON Orders(row_version);
+CREATE INDEX idx_ImportBooks_RowVersion ON ImportBooks(row_version);
+GO
+
+-- Bảng chi tiết không có rowversion: mỗi câu lệnh đổi chi tiết cập nhật lại dòng cha (một lần cho cả câu lệnh)
+-- để row_version của đơn / phiếu nhập tăng và trg_Outbox_Orders / trg_Outbox_ImportBooks ghi outbox.
+-- Dòng cha đã được ghi trong cùng giao dịch (tạo đơn khi thanh toán, cộng tổng tiền khi thêm nhiều sách)
+-- được đánh dấu qua SESSION_CONTEXT (mongo_sync.mark_parent_written) và bỏ qua, tránh ghi lặp.
+CREATE TRIGGER trg_TouchOrderOnDetailChange ON OrderDetails
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    UPDATE o SET total_amount = o.total_amount
+    FROM Orders o
+    WHERE o.order_id IN (SELECT order_id FROM inserted UNION SELECT order_id FROM deleted)
+      AND CONCAT(CURRENT_TRANSACTION_ID(), ':', o.order_id)
+          <> ISNULL(CAST(SESSION_CONTEXT(N'order_written') AS VARCHAR(40)), '');
+END;
+GO
+
+CREATE TRIGGER trg_TouchImportOnDetailChange ON ImportDetails
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+    UPDATE ib SET total_amount = ib.total_amount
+    FROM ImportBooks ib
+    WHERE ib.import_id IN (SELECT import_id FROM inserted UNION SELECT import_id FROM deleted)
+      AND CONCAT(CURRENT_TRANSACTION_ID(), ':', ib.import_id)
+          <> ISNULL(CAST(SESSION_CONTEXT(N'import_written') AS VARCHAR(40)), '');
+END;
+GO
+
+-- Tổng hợp doanh thu theo ngày / tháng của các đơn 'Completed', giữ đúng bởi trigger bên dưới (revenue_rollups.py)
+CREATE TABLE RevenueDaily (
+    revenue_date DATE PRIMARY KEY,
+    order_count INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    item_count INT NOT NULL DEFAULT 0
+);
+
+CREATE TABLE RevenueMonthly (
+    revenue_month DATE PRIMARY KEY,   -- ngày đầu tháng
+    order_count INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    item_count INT NOT NULL DEFAULT 0
+);
+GO
+
+-- Khởi tạo rollup từ các đơn đã hoàn thành sẵn có (giống revenue_rollups.py), để dashboard và
+-- thống kê không trả về 0 trên cơ sở dữ liệu đã có đơn hàng
+IF NOT EXISTS (SELECT 1 FROM RevenueDaily)
+BEGIN
+    INSERT INTO RevenueDaily (revenue_date, order_count, revenue, item_count)
+    SELECT CAST(o.order_date AS DATE), COUNT(*), ISNULL(SUM(o.total_amount), 0), ISNULL(SUM(d.items), 0)
+    FROM Orders o
+    LEFT JOIN (SELECT order_id, SUM(quantity) AS items FROM OrderDetails GROUP BY order_id) d
+        ON d.order_id = o.order_id
+    WHERE o.status = 'Completed'
+    GROUP BY CAST(o.order_date AS DATE);
+
+    INSERT INTO RevenueMonthly (revenue_month, order_count, revenue, item_count)
+    SELECT DATEFROMPARTS(YEAR(revenue_date), MONTH(revenue_date), 1),
+           SUM(order_count), SUM(revenue), SUM(item_count)
+    FROM RevenueDaily
+    GROUP BY DATEFROMPARTS(YEAR(revenue_date), MONTH(revenue_date), 1);
+END
+GO
+
+-- Phần chênh lệch doanh thu theo ngày, cộng vào RevenueDaily và RevenueMonthly
+CREATE TYPE RevenueDelta AS TABLE (
+    revenue_date DATE PRIMARY KEY,
+    order_count INT NOT NULL,
+    revenue DECIMAL(14,2) NOT NULL,
+    item_count INT NOT NULL
+);
+GO
+
+CREATE PROCEDURE usp_ApplyRevenueDelta @delta RevenueDelta READONLY
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    MERGE RevenueDaily WITH (HOLDLOCK) AS r
+    USING @delta s ON r.revenue_date = s.revenue_date
+    WHEN MATCHED THEN UPDATE SET
+        order_count = r.order_count + s.order_count,
+        revenue = r.revenue + s.revenue,
+        item_count = r.item_count + s.item_count
+    WHEN NOT MATCHED THEN
+        INSERT (revenue_date, order_count, revenue, item_count)
+        VALUES (s.revenue_date, s.order_count, s.revenue, s.item_count);
+
+    MERGE RevenueMonthly WITH (HOLDLOCK) AS r
+    USING (
+        SELECT DATEFROMPARTS(YEAR(revenue_date), MONTH(revenue_date), 1) AS revenue_month,
+               SUM(order_count) AS order_count, SUM(revenue) AS revenue, SUM(item_count) AS item_count
+        FROM @delta
+        GROUP BY DATEFROMPARTS(YEAR(revenue_date), MONTH(revenue_date), 1)
+    ) s ON r.revenue_month = s.revenue_month
+    WHEN MATCHED THEN UPDATE SET
+        order_count = r.order_count + s.order_count,
+        revenue = r.revenue + s.revenue,
+        item_count = r.item_count + s.item_count
+    WHEN NOT MATCHED THEN
+        INSERT (revenue_month, order_count, revenue, item_count)
+        VALUES (s.revenue_month, s.order_count, s.revenue, s.item_count);
+END;
+GO
+
+-- Đơn vào / ra trạng thái 'Completed' (ứng dụng hay câu lệnh SQL trực tiếp), hoặc đổi ngày / tổng tiền khi
+-- đang 'Completed': trừ phần cũ (deleted), cộng phần mới (inserted)
+CREATE TRIGGER trg_RevenueRollup_Orders ON Orders
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    IF NOT EXISTS (SELECT 1 FROM inserted WHERE status = 'Completed')
+       AND NOT EXISTS (SELECT 1 FROM deleted WHERE status = 'Completed')
+        RETURN;
+
+    DECLARE @delta RevenueDelta;
+
+    INSERT INTO @delta (revenue_date, order_count, revenue, item_count)
+    SELECT c.revenue_date, SUM(c.order_count), SUM(c.revenue), SUM(c.item_count)
+    FROM (
+        SELECT CAST(i.order_date AS DATE) AS revenue_date, 1 AS order_count,
+               ISNULL(i.total_amount, 0) AS revenue, ISNULL(d.items, 0) AS item_count
+        FROM inserted i
+        OUTER APPLY (SELECT SUM(quantity) AS items FROM OrderDetails WHERE order_id = i.order_id) d
+        WHERE i.status = 'Completed'
+        UNION ALL
+        SELECT CAST(x.order_date AS DATE), -1, -ISNULL(x.total_amount, 0), -ISNULL(d.items, 0)
+        FROM deleted x
+        OUTER APPLY (SELECT SUM(quantity) AS items FROM OrderDetails WHERE order_id = x.order_id) d
+        WHERE x.status = 'Completed'
+    ) c
+    GROUP BY c.revenue_date
+    HAVING SUM(c.order_count) <> 0 OR SUM(c.revenue) <> 0 OR SUM(c.item_count) <> 0;
+
+    IF EXISTS (SELECT 1 FROM @delta)
+        EXEC usp_ApplyRevenueDelta @delta;
+END;
+GO
+
+-- Số sách bán ra của đơn đang 'Completed' thay đổi theo chi tiết đơn (thanh toán tạo đơn trước rồi mới thêm chi tiết)
+CREATE TRIGGER trg_RevenueRollup_OrderDetails ON OrderDetails
+AFTER INSERT, UPDATE, DELETE
+AS
+BEGIN
+    SET NOCOUNT ON;
+
+    DECLARE @delta RevenueDelta;
+
+    INSERT INTO @delta (revenue_date, order_count, revenue, item_count)
+    SELECT CAST(o.order_date AS DATE), 0, 0, SUM(c.quantity)
+    FROM (
+        SELECT order_id, quantity FROM inserted
+        UNION ALL
+        SELECT order_id, -quantity FROM deleted
+    ) c
+    JOIN Orders o ON o.order_id = c.order_id
+    WHERE o.status = 'Completed'
+    GROUP BY CAST(o.order_date AS DATE)
+    HAVING SUM(c.quantity) <> 0;
+
+    IF EXISTS (SELECT 1 FROM @delta)
+        EXEC usp_ApplyRevenueDelta @delta;
+END;
+GO
+
+-- Máy chạy ứng dụng: mã quầy nằm trong mã đơn hàng / phiếu nhập nên mỗi máy một mã (document_codes.py)
+CREATE TABLE Terminals (
+    terminal_id SMALLINT PRIMARY KEY CHECK (terminal_id BETWEEN 0 AND 999),
+    machine_name NVARCHAR(128) NOT NULL,
+    registered_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+    last_seen_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+);
+GO
+
+-- Chỉ số dashboard: đơn chờ xử lý, sách sắp hết hàng
+CREATE INDEX idx_Orders_Status ON Orders(status);
+CREATE INDEX idx_Books_QuantityInStock ON Books(quantity_in_stock);
+GO
+
+-- Giữ chỗ tồn kho cho giỏ hàng đang mở: tồn kho đã bị trừ khi giữ, được hoàn lại khi hết hạn
+-- hoặc hủy giỏ, và chuyển thành bán khi thanh toán
+CREATE TABLE StockHolds (
+    cart_id VARCHAR(36) NOT NULL,
+    book_id INT NOT NULL,
+    quantity INT NOT NULL CHECK (quantity > 0),
+    expires_at DATETIME2 NOT NULL,
+    PRIMARY KEY (cart_id, book_id),
+    FOREIGN KEY (book_id) REFERENCES Books(book_id)
+);
+
+CREATE INDEX idx_StockHolds_ExpiresAt ON StockHolds(expires_at);
+GO
+
+-- Ứng dụng đã trừ kho khi bán, trigger trừ kho trên OrderDetails làm trừ hai lần
+DROP TRIGGER IF EXISTS trg_UpdateStockWhenOrderCreated;
+GO
+
+-- Tương tự, ứng dụng đã cộng kho khi nhập, trigger cộng kho trên ImportDetails làm cộng hai lần
+DROP TRIGGER IF EXISTS trg_UpdateStockWhenImportCreated;
+GO
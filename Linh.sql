@@ -69,20 +69,9 @@ BEGIN
 END;
 GO
 
--- TRIGGER: Cập nhật tồn kho khi nhập sách (ĐƠN GIẢN)
-CREATE OR ALTER TRIGGER trg_UpdateStockWhenImportCreated
-ON ImportDetails
-AFTER INSERT
-AS
-BEGIN
-    SET NOCOUNT ON;
-    
-    UPDATE b
-    SET quantity_in_stock = quantity_in_stock + i.quantity,
-        updated_date = GETDATE()
-    FROM Books b
-    INNER JOIN inserted i ON b.book_id = i.book_id;
-END;
+-- Tồn kho khi nhập do ứng dụng cộng (add_import_item, add_import_items_bulk) nên không dùng trigger
+-- cộng kho trên ImportDetails, tránh cộng hai lần cho cùng một dòng phiếu nhập
+DROP TRIGGER IF EXISTS trg_UpdateStockWhenImportCreated;
 GO
 
 -- VIEW: Sách cần nhập thêm
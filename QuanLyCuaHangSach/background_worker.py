@@ -0,0 +1,105 @@
+import queue
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BackgroundWorker:
+    """Chạy truy vấn CSDL trên luồng nền, trả kết quả về luồng giao diện qua root.after"""
+
+    def __init__(self, root, max_workers=4, poll_interval=50):
+        self.root = root
+        self.poll_interval = poll_interval
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db-worker')
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+        self._generations = {}
+        self._futures = {}
+        self._closed = False
+        self._poll_job = None
+
+        self._schedule_poll()
+
+    def submit(self, key, func, *args, on_success=None, on_error=None, **kwargs):
+        """Gửi công việc theo khóa; yêu cầu cũ cùng khóa sẽ bị hủy và kết quả của nó bị bỏ qua"""
+        if self._closed:
+            return None
+
+        with self._lock:
+            generation = self._generations.get(key, 0) + 1
+            self._generations[key] = generation
+
+            previous = self._futures.get(key)
+            if previous is not None:
+                previous.cancel()
+
+            future = self._executor.submit(self._run, key, generation, func, args, kwargs,
+                                           on_success, on_error)
+            self._futures[key] = future
+
+        return generation
+
+    def _run(self, key, generation, func, args, kwargs, on_success, on_error):
+        if not self._is_current(key, generation):
+            return
+
+        try:
+            result = func(*args, **kwargs)
+            self._results.put((key, generation, on_success, result))
+        except Exception as e:
+            self._results.put((key, generation, on_error, e))
+
+    def _is_current(self, key, generation):
+        with self._lock:
+            return self._generations.get(key) == generation
+
+    def is_pending(self, key):
+        """Còn công việc đang chạy với khóa này hay không"""
+        with self._lock:
+            future = self._futures.get(key)
+            return future is not None and not future.done()
+
+    def cancel(self, key):
+        """Hủy yêu cầu đang chờ; nếu đã chạy thì kết quả sẽ bị bỏ qua"""
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            future = self._futures.pop(key, None)
+            if future is not None:
+                future.cancel()
+
+    def _schedule_poll(self):
+        if not self._closed:
+            self._poll_job = self.root.after(self.poll_interval, self._poll)
+
+    def _poll(self):
+        """Áp dụng kết quả trên luồng giao diện"""
+        try:
+            while True:
+                try:
+                    key, generation, callback, value = self._results.get_nowait()
+                except queue.Empty:
+                    break
+
+                if callback is None or not self._is_current(key, generation):
+                    continue
+
+                try:
+                    callback(value)
+                except Exception:
+                    # Không nuốt lỗi giao diện: chuyển cho cơ chế báo lỗi callback của Tk
+                    self.root.report_callback_exception(*sys.exc_info())
+        finally:
+            self._schedule_poll()
+
+    def shutdown(self):
+        """Dừng nhận việc mới và hủy các yêu cầu chưa chạy"""
+        self._closed = True
+        if self._poll_job is not None:
+            try:
+                self.root.after_cancel(self._poll_job)
+            except Exception:
+                pass
+            self._poll_job = None
+
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,5 +1,7 @@
+import os
 import pyodbc
 from pymongo import MongoClient
+from connection_pool import SQLConnectionPool
 
 class DatabaseConfig:
     # SQL Server Config
@@ -9,10 +11,56 @@ class DatabaseConfig:
     SQL_PASSWORD = 'aa:123'
     SQL_DRIVER = '{ODBC Driver 17 for SQL Server}'
 
+    # SQL Connection Pool Config
+    SQL_POOL_MIN_SIZE = 1
+    SQL_POOL_MAX_SIZE = 8
+    SQL_POOL_MAX_LIFETIME = 1800   # giây, sau đó kết nối được tạo lại
+    SQL_POOL_VALIDATE_AFTER = 30   # giây nhàn rỗi trước khi kiểm tra lại kết nối
+    SQL_POOL_TIMEOUT = 10          # giây chờ mượn kết nối
+
+    # Query Cache Config
+    QUERY_CACHE_TTL = 60           # giây
+    QUERY_CACHE_MAX_ENTRIES = 256
+
+    # Mã quầy (1-999) dùng trong mã đơn hàng / phiếu nhập, mỗi máy một mã, đăng ký trong bảng Terminals.
+    # Mặc định tự cấp theo tên máy; đặt biến môi trường BSM_TERMINAL_ID để dùng mã cố định
+    # (ứng dụng không khởi động nếu mã đó đã được máy khác đăng ký).
+    TERMINAL_ID = int(os.environ['BSM_TERMINAL_ID']) if os.environ.get('BSM_TERMINAL_ID') else None
+
+    # Dashboard Config
+    DASHBOARD_REFRESH_INTERVAL = 30   # giây giữa hai lần cập nhật card dashboard
+    LOW_STOCK_THRESHOLD = 10          # tồn kho dưới mức này được tính là sắp hết hàng
+
+    # Stock Hold Config
+    STOCK_HOLD_TTL = 900              # giây giữ chỗ tồn kho cho giỏ hàng chưa thanh toán
+    CLOSE_RELEASE_TIMEOUT = 3.0       # giây tối đa chờ trả tồn kho của giỏ khi đóng ứng dụng
+
+    # Search Index Config
+    BOOK_SEARCH_INDEX_ENABLED = True       # tìm sách qua chỉ mục trong bộ nhớ thay vì LIKE
+    CUSTOMER_SEARCH_INDEX_ENABLED = True   # tìm khách hàng theo SĐT / họ tên trong bộ nhớ
+
     # MongoDB Config
     MONGO_URI = "mongodb://localhost:27017/"
     MONGO_DATABASE = "bookstore_analytics"
 
+    # Ghi trực tiếp hay qua SyncOutbox do bảng SyncMode + trạng thái trigger outbox quyết định (đổi bằng
+    # mongo_replicator.py); ứng dụng đọc lại sau mỗi khoảng này
+    SYNC_MODE_REFRESH_INTERVAL = 10   # giây
+
+    # MongoDB Write-behind Config
+    MONGO_WRITE_BEHIND_ENABLED = True
+    MONGO_WRITE_BATCH_SIZE = 500
+    MONGO_WRITE_FLUSH_INTERVAL = 0.5   # giây
+    MONGO_WRITE_MAX_PENDING = 10000    # số thao tác tối đa trong hàng đợi
+    MONGO_WRITE_PUT_TIMEOUT = 2.0      # giây chờ khi hàng đợi đầy
+
+    # Báo cáo tính bằng aggregation trên MongoDB thay vì SQL Server, bật theo từng báo cáo
+    MONGO_REPORTS = {
+        'best_selling_books': False,
+        'customers_by_purchases': False,
+        'order_statistics_by_date': False,
+    }
+
     @staticmethod
     def get_sql_connection():
         """Kết nối SQL Server"""
@@ -28,6 +76,18 @@ class DatabaseConfig:
         except Exception:
             return None
 
+    @staticmethod
+    def create_sql_pool():
+        """Tạo pool kết nối SQL Server"""
+        return SQLConnectionPool(
+            DatabaseConfig.get_sql_connection,
+            min_size=DatabaseConfig.SQL_POOL_MIN_SIZE,
+            max_size=DatabaseConfig.SQL_POOL_MAX_SIZE,
+            max_lifetime=DatabaseConfig.SQL_POOL_MAX_LIFETIME,
+            validate_after=DatabaseConfig.SQL_POOL_VALIDATE_AFTER,
+            timeout=DatabaseConfig.SQL_POOL_TIMEOUT
+        )
+
     @staticmethod
     def get_mongo_client():
         """Kết nối MongoDB"""
@@ -0,0 +1,298 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+def is_disconnect(error):
+    """SQLSTATE lớp 08 là lỗi mất kết nối"""
+    state = error.args[0] if getattr(error, 'args', None) else ''
+    return isinstance(state, str) and state.startswith('08')
+
+
+class PooledConnection:
+    """Kết nối SQL kèm thời điểm tạo / sử dụng gần nhất"""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def is_expired(self, max_lifetime):
+        return max_lifetime and time.monotonic() - self.created_at > max_lifetime
+
+    def idle_time(self):
+        return time.monotonic() - self.last_used
+
+    def close(self):
+        try:
+            self.raw.close()
+        except Exception:
+            pass
+
+
+class _RetryingCursor:
+    """Cursor của _RetryingConnection; các thuộc tính khác chuyển thẳng sang cursor pyodbc"""
+
+    def __init__(self, owner, cursor):
+        object.__setattr__(self, '_owner', owner)
+        object.__setattr__(self, '_cursor', cursor)
+
+    def execute(self, *args):
+        owner = self._owner
+        if owner.executed:
+            self._cursor.execute(*args)
+            return self
+
+        owner.executed = True
+        try:
+            self._cursor.execute(*args)
+        except Exception as e:
+            # Chưa có lệnh nào chạy trên kết nối này nên chạy lại trên kết nối mới là an toàn
+            if not is_disconnect(e) or not owner.reconnect():
+                raise
+            try:
+                self._cursor.close()
+            except Exception:
+                pass
+            object.__setattr__(self, '_cursor', owner.conn.raw.cursor())
+            self._cursor.execute(*args)
+        return self
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+
+class _RetryingConnection:
+    """Kết nối cho mượn từ pool
+
+    Kết nối rớt trong lúc nằm chờ (chưa tới validate_after nên không được ping) chỉ lộ ra ở lệnh đầu
+    tiên; khi đó kết nối được thay bằng kết nối mới và lệnh đầu tiên được chạy lại một lần.
+    """
+
+    def __init__(self, pool, conn):
+        self.pool = pool
+        self.conn = conn
+        self.executed = False
+
+    def cursor(self):
+        return _RetryingCursor(self, self.conn.raw.cursor())
+
+    def reconnect(self):
+        """Thay kết nối hỏng bằng kết nối mới, giữ nguyên chỗ đã mượn trong pool"""
+        fresh = self.pool._create()
+        if fresh is None:
+            return False
+        self.conn.close()
+        self.pool._count_discarded()
+        self.conn = fresh
+        return True
+
+    def __getattr__(self, name):
+        return getattr(self.conn.raw, name)
+
+
+class SQLConnectionPool:
+    """Pool kết nối SQL Server an toàn đa luồng"""
+
+    def __init__(self, factory, min_size=1, max_size=8, max_lifetime=1800,
+                 validate_after=30, timeout=10):
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.max_lifetime = max_lifetime
+        self.validate_after = validate_after
+        self.timeout = timeout
+
+        self._idle = []
+        self._in_use = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+        self.created_count = 0
+        self.discarded_count = 0
+        self.last_error = None
+
+        self.fill()
+
+    def fill(self):
+        """Mở sẵn tối thiểu min_size kết nối"""
+        while True:
+            with self._condition:
+                if self._closed or self._total() >= self.min_size:
+                    return
+                self._in_use += 1
+
+            conn = self._create()
+            with self._condition:
+                self._in_use -= 1
+                if conn is None:
+                    self._condition.notify()
+                    return
+                self._idle.append(conn)
+                self._condition.notify()
+
+    def _total(self):
+        return len(self._idle) + self._in_use
+
+    def _create(self):
+        try:
+            raw = self.factory()
+        except Exception as e:
+            self.last_error = e
+            return None
+
+        if raw is None:
+            return None
+
+        with self._condition:
+            self.created_count += 1
+        return PooledConnection(raw)
+
+    def _count_discarded(self):
+        with self._condition:
+            self.discarded_count += 1
+
+    def _is_healthy(self, conn):
+        """Kiểm tra kết nối trước khi cho mượn"""
+        if conn.is_expired(self.max_lifetime):
+            return False
+
+        if conn.idle_time() < self.validate_after:
+            return True
+
+        cursor = None
+        try:
+            cursor = conn.raw.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            return True
+        except Exception as e:
+            self.last_error = e
+            return False
+        finally:
+            if cursor:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+
+    def acquire(self, timeout=None):
+        """Mượn một kết nối, trả về None nếu không thể kết nối"""
+        if timeout is None:
+            timeout = self.timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            with self._condition:
+                while True:
+                    if self._closed:
+                        return None
+
+                    if self._idle:
+                        conn = self._idle.pop()
+                        self._in_use += 1
+                        create = False
+                        break
+
+                    if self._total() < self.max_size:
+                        conn = None
+                        self._in_use += 1
+                        create = True
+                        break
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return None
+                    self._condition.wait(remaining)
+
+            if create:
+                conn = self._create()
+                if conn is None:
+                    self._release_slot()
+                    return None
+                return conn
+
+            if self._is_healthy(conn):
+                return conn
+
+            conn.close()
+            self._count_discarded()
+            self._release_slot()
+
+    def _release_slot(self):
+        with self._condition:
+            self._in_use -= 1
+            self._condition.notify()
+
+    def release(self, conn, broken=False):
+        """Trả kết nối về pool; kết nối lỗi hoặc hết hạn sẽ bị đóng"""
+        if conn is None:
+            return
+
+        conn.last_used = time.monotonic()
+        with self._condition:
+            self._in_use -= 1
+            if not broken and not self._closed and not conn.is_expired(self.max_lifetime):
+                self._idle.append(conn)
+                self._condition.notify()
+                return
+            self._condition.notify()
+
+        conn.close()
+        self._count_discarded()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Mượn kết nối trong khối with; lỗi sẽ rollback, kết nối hỏng (SQLSTATE 08) bị loại bỏ"""
+        conn = self.acquire(timeout)
+        if conn is None:
+            yield None
+            return
+
+        borrowed = _RetryingConnection(self, conn)
+        broken = False
+        try:
+            yield borrowed
+        except BaseException as e:
+            self.last_error = e
+            broken = self._is_disconnect(e) or not self._rollback(borrowed.conn)
+            raise
+        finally:
+            self.release(borrowed.conn, broken=broken)
+
+    _is_disconnect = staticmethod(is_disconnect)
+
+    @staticmethod
+    def _rollback(conn):
+        try:
+            conn.raw.rollback()
+            return True
+        except Exception:
+            return False
+
+    def stats(self):
+        """Thống kê pool"""
+        with self._condition:
+            return {
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'max_size': self.max_size,
+                'created': self.created_count,
+                'discarded': self.discarded_count
+            }
+
+    def close(self):
+        """Đóng toàn bộ kết nối"""
+        with self._condition:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+
+        for conn in idle:
+            conn.close()
@@ -1,12 +1,51 @@
+import json
+import threading
+from contextlib import contextmanager
 from datetime import datetime, date
 from decimal import Decimal
 from config import DatabaseConfig
+from query_cache import QueryCache, cached, invalidates
+from mongo_write_queue import MongoWriteQueue
+from mongo_schema import DOCUMENT_CONVERTERS, ensure_indexes
+from mongo_reports import MongoReports
+from mongo_sync import SYNC_TABLES, OUTBOX_ACTIVE_SQL, mark_parent_written
+from revenue_rollups import RANGE_TOTALS_SQL, whole_day_range, range_totals_params
+from stock_holds import RELEASE_EXPIRED_HOLDS_SQL, release_expired
+from document_codes import (CODE_RETRIES, DocumentCodeGenerator, DuplicateCodeError, TerminalConflictError,
+                            is_duplicate_key, register_terminal)
+from search_index import BookSearchIndex, CustomerSearchIndex, normalize_phone
+
+# Dòng của các bảng danh sách trên giao diện (cùng cột với get_*_page). Thao tác ghi trả về các dòng
+# đã thay đổi dạng {'books': {'inserted': [...], 'updated': [...], 'deleted': [book_id, ...]}, ...}
+# để giao diện cập nhật tại chỗ thay vì tải lại cả bảng.
+BOOK_ROW_SQL = """
+    SELECT book_id, book_code, title, author, publisher, publish_year, quantity_in_stock, price
+    FROM Books
+"""
+
+ORDER_ROW_SQL = """
+    SELECT o.order_id, o.order_code, o.order_date, c.full_name as customer_name, o.total_amount, o.status
+    FROM Orders o
+    LEFT JOIN Customers c ON o.customer_id = c.customer_id
+"""
+
+IMPORT_ROW_SQL = """
+    SELECT import_id, import_code, import_date, supplier, total_amount
+    FROM ImportBooks
+"""
 
 
 class MongoDBManager:
     def __init__(self):
         self.client = None
         self.db = None
+        self.writer = None
+        self.reports = None
+        # True khi SyncOutbox + mongo_replicator.py đang đảm nhận việc ghi (DatabaseManager.refresh_sync_mode)
+        self.via_outbox = False
+        self.last_error = None
+        # Collection -> lỗi khi tạo collection / index lúc kết nối (giao diện hiển thị trên dashboard)
+        self.setup_errors = {}
         self.connect_mongodb()
 
     def connect_mongodb(self):
@@ -15,25 +54,47 @@ class MongoDBManager:
             if self.client is not None:
                 self.db = self.client[DatabaseConfig.MONGO_DATABASE]
                 self.ensure_collections()
+                self.reports = MongoReports(self.db)
+                if DatabaseConfig.MONGO_WRITE_BEHIND_ENABLED:
+                    self.writer = MongoWriteQueue(
+                        self.db,
+                        batch_size=DatabaseConfig.MONGO_WRITE_BATCH_SIZE,
+                        flush_interval=DatabaseConfig.MONGO_WRITE_FLUSH_INTERVAL,
+                        max_pending=DatabaseConfig.MONGO_WRITE_MAX_PENDING,
+                        put_timeout=DatabaseConfig.MONGO_WRITE_PUT_TIMEOUT
+                    )
                 return True
             return False
         except Exception:
             return False
 
     def ensure_collections(self):
-        """Chỉ tạo các collection thực sự được sử dụng"""
+        """Chỉ tạo các collection thực sự được sử dụng, kèm các index khai báo trong MONGO_INDEXES
+
+        Trả về danh sách collection bị lỗi; lỗi chi tiết lưu trong setup_errors và last_error.
+        """
+        self.setup_errors = {}
         if self.db is None:
-            return
+            return []
 
+        collections = ['books', 'customers', 'orders', 'imports']
         try:
-            collections = ['books', 'customers', 'orders', 'imports']
             existing = self.db.list_collection_names()
+        except Exception as e:
+            self.last_error = e
+            self.setup_errors = {col: e for col in collections}
+            return collections
 
-            for col in collections:
+        # Lỗi ở một collection (quyền, index xung đột...) không được chặn các collection còn lại
+        for col in collections:
+            try:
                 if col not in existing:
                     self.db.create_collection(col)
-        except Exception:
-            pass
+                ensure_indexes(self.db[col])
+            except Exception as e:
+                self.last_error = e
+                self.setup_errors[col] = e
+        return list(self.setup_errors)
 
     def convert_for_mongodb(self, data):
         """Chuyển đổi dữ liệu để tương thích với MongoDB"""
@@ -56,17 +117,29 @@ class MongoDBManager:
             except:
                 return None
 
+    def prepare_document(self, collection_name: str, data: dict):
+        """Chuyển đổi document theo schema đã biên dịch, dùng convert_for_mongodb nếu collection chưa có schema"""
+        converter = DOCUMENT_CONVERTERS.get(collection_name)
+        if converter is None:
+            return self.convert_for_mongodb(data)
+        return converter(data)
+
     def save_to_mongodb(self, collection_name: str, data: dict):
         """Lưu dữ liệu vào MongoDB"""
         if self.db is None:
             return False
+        if self.via_outbox:
+            return True
 
         try:
             data_to_save = data.copy()
             data_to_save['created_at'] = datetime.now()
             data_to_save['source'] = 'sql_sync'
 
-            prepared_data = self.convert_for_mongodb(data_to_save)
+            prepared_data = self.prepare_document(collection_name, data_to_save)
+            if self.writer:
+                return self.writer.insert(collection_name, prepared_data)
+
             result = self.db[collection_name].insert_one(prepared_data)
 
             return result.inserted_id is not None
@@ -77,10 +150,14 @@ class MongoDBManager:
         """Cập nhật dữ liệu trong MongoDB"""
         if self.db is None:
             return False
+        if self.via_outbox:
+            return True
 
         try:
-            prepared_filter = self.convert_for_mongodb(filter_data)
-            prepared_update = self.convert_for_mongodb(update_data)
+            prepared_filter = self.prepare_document(collection_name, dict(filter_data))
+            prepared_update = self.prepare_document(collection_name, dict(update_data))
+            if self.writer:
+                return self.writer.upsert(collection_name, prepared_filter, prepared_update)
 
             self.db[collection_name].update_one(
                 prepared_filter,
@@ -91,100 +168,304 @@ class MongoDBManager:
         except Exception:
             return False
 
+    def replace_in_mongodb(self, collection_name: str, filter_data: dict, document: dict):
+        """Ghi đè toàn bộ document trong MongoDB (tạo mới nếu chưa có)"""
+        if self.db is None:
+            return False
+        if self.via_outbox:
+            return True
+
+        try:
+            document = dict(document)
+            document['created_at'] = datetime.now()
+            document['source'] = 'sql_sync'
+
+            prepared_filter = self.prepare_document(collection_name, dict(filter_data))
+            prepared_document = self.prepare_document(collection_name, document)
+            if self.writer:
+                return self.writer.replace(collection_name, prepared_filter, prepared_document)
+
+            self.db[collection_name].replace_one(prepared_filter, prepared_document, upsert=True)
+            return True
+        except Exception:
+            return False
+
+    def delete_from_mongodb(self, collection_name: str, filter_data: dict):
+        """Xóa dữ liệu trong MongoDB"""
+        if self.db is None:
+            return False
+        if self.via_outbox:
+            return True
+
+        try:
+            prepared_filter = self.prepare_document(collection_name, dict(filter_data))
+            if self.writer:
+                return self.writer.delete(collection_name, prepared_filter)
+
+            self.db[collection_name].delete_one(prepared_filter)
+            return True
+        except Exception:
+            return False
+
+    def flush(self, timeout=None):
+        """Chờ ghi hết các thao tác đang nằm trong hàng đợi"""
+        if self.writer:
+            return self.writer.flush(timeout)
+        return True
+
+    def write_stats(self):
+        """Thống kê hàng đợi ghi trễ (None nếu không dùng ghi trễ)"""
+        return self.writer.stats() if self.writer else None
+
+    def close(self):
+        """Ghi nốt hàng đợi rồi đóng kết nối MongoDB"""
+        try:
+            if self.writer:
+                self.writer.close()
+        except Exception:
+            pass
+
+        try:
+            if self.client:
+                self.client.close()
+        except Exception:
+            pass
+
 class DatabaseManager:
     def __init__(self):
-        self.connection = None
+        self.pool = None
+        self.last_error = None
+        self.cache = QueryCache(DatabaseConfig.QUERY_CACHE_MAX_ENTRIES, DatabaseConfig.QUERY_CACHE_TTL)
+        self.search_indexes = {}
+        self._index_lock = threading.Lock()
+        self._index_building = set()
+        self._index_pending = {}
+        self.codes = None
         self.mongo_manager = MongoDBManager()
         self.connect_sql()
+        self.refresh_sync_mode()
+
+        # Trùng mã quầy với máy khác thì không được chạy; mất kết nối thì đăng ký lại khi cần mã lần đầu
+        try:
+            self.ensure_terminal()
+        except TerminalConflictError:
+            raise
+        except Exception as e:
+            self.last_error = e
 
     def connect_sql(self):
-        """Kết nối SQL Server"""
+        """Khởi tạo pool kết nối SQL Server"""
         try:
-            self.connection = DatabaseConfig.get_sql_connection()
-            return self.connection is not None
-        except Exception:
+            if self.pool is None:
+                self.pool = DatabaseConfig.create_sql_pool()
+            return self.pool.stats()['idle'] > 0
+        except Exception as e:
+            self.last_error = e
             return False
 
+    def refresh_sync_mode(self) -> bool:
+        """Đọc lại chế độ đồng bộ MongoDB (lỗi hoặc CSDL chưa có SyncMode thì ghi trực tiếp)"""
+        result = self.execute_query(OUTBOX_ACTIVE_SQL)
+        self.mongo_manager.via_outbox = bool(result and result[0][0])
+        return self.mongo_manager.via_outbox
+
+    def ensure_terminal(self) -> int:
+        """Đăng ký mã quầy của máy trong bảng Terminals (một lần) và tạo bộ sinh mã chứng từ"""
+        if self.codes is None:
+            if self.pool is None and not self.connect_sql():
+                raise ConnectionError("Chưa khởi tạo được pool kết nối SQL Server")
+            with self.pool.connection() as conn:
+                if conn is None:
+                    raise ConnectionError("Không thể kết nối SQL Server để đăng ký mã quầy")
+                self.codes = DocumentCodeGenerator(register_terminal(conn, DatabaseConfig.TERMINAL_ID))
+        return self.codes.terminal_id
+
+    def next_document_code(self, prefix: str) -> str:
+        """Sinh mã đơn hàng / phiếu nhập duy nhất theo quầy, không cần truy vấn CSDL"""
+        self.ensure_terminal()
+        return self.codes.next_code(prefix)
+
+    @staticmethod
+    def _next_rows(cursor):
+        """Chuyển sang result set kế tiếp của batch và lấy toàn bộ dòng ([] nếu batch không còn result set)"""
+        if not cursor.nextset():
+            return []
+        return cursor.fetchall()
+
+    @contextmanager
+    def transaction(self):
+        """Mượn kết nối từ pool; commit khi thành công, rollback khi lỗi"""
+        if self.pool is None:
+            self.connect_sql()
+        if self.pool is None:
+            raise ConnectionError("Chưa khởi tạo được pool kết nối SQL Server")
+
+        with self.pool.connection() as conn:
+            if conn is None:
+                raise ConnectionError("Không thể kết nối SQL Server")
+
+            cursor = conn.cursor()
+            try:
+                yield cursor
+                conn.commit()
+            finally:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+
     def execute_query(self, query: str, params: tuple = None, fetch: bool = True):
         """Thực thi query SQL"""
-        if self.connection is None:
+        try:
+            with self.transaction() as cursor:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
+
+                if fetch and query.strip().upper().startswith('SELECT'):
+                    return cursor.fetchall()
+                return True
+
+        except Exception as e:
+            self.last_error = e
             return None if fetch else False
 
-        cursor = None
+    def iter_query(self, query: str, params: tuple = None, batch_size: int = 500):
+        """Đọc kết quả SELECT theo từng lô fetchmany; dừng vòng lặp sớm sẽ hủy truy vấn
+
+        Lỗi giữa chừng được ghi vào last_error rồi ném lại, để nơi gọi không nhận nhầm
+        phần dữ liệu đã đọc là toàn bộ kết quả.
+        """
         try:
-            cursor = self.connection.cursor()
+            with self.transaction() as cursor:
+                if params:
+                    cursor.execute(query, params)
+                else:
+                    cursor.execute(query)
 
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
+                finished = False
+                try:
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            finished = True
+                            break
+                        for row in rows:
+                            yield row
+                finally:
+                    if not finished:
+                        try:
+                            cursor.cancel()
+                        except Exception:
+                            pass
+
+        except Exception as e:
+            self.last_error = e
+            raise
+
+    def insert_returning(self, table: str, data: dict, key_column: str, unique_column: str = None):
+        """INSERT và trả về khóa vừa tạo trong cùng một câu lệnh
+
+        Nếu có unique_column, bản ghi chỉ được thêm khi giá trị đó chưa tồn tại;
+        trùng mã hoặc lỗi đều trả về None.
+        """
+        columns = list(data)
+        params = [data[column] for column in columns]
+
+        duplicate_filter = ""
+        if unique_column:
+            duplicate_filter = (f"WHERE NOT EXISTS (SELECT 1 FROM {table} WITH (UPDLOCK, HOLDLOCK) "
+                                f"WHERE {unique_column} = ?)")
+            params.append(data[unique_column])
+
+        query = f"""
+            SET NOCOUNT ON;
+            DECLARE @inserted TABLE (id INT);
+
+            INSERT INTO {table} ({', '.join(columns)})
+            OUTPUT INSERTED.{key_column} INTO @inserted
+            SELECT {', '.join('?' for _ in columns)}
+            {duplicate_filter};
+
+            SELECT id FROM @inserted;
+        """
 
-            if fetch and query.strip().upper().startswith('SELECT'):
-                result = cursor.fetchall()
-                return result
-            else:
-                self.connection.commit()
-                return True
+        try:
+            with self.transaction() as cursor:
+                cursor.execute(query, params)
+                row = cursor.fetchone()
+            if row:
+                return row[0]
+            if unique_column:
+                self.last_error = DuplicateCodeError(f"{unique_column} '{data[unique_column]}' đã tồn tại")
+            return None
 
-        except Exception:
-            if self.connection:
-                try:
-                    self.connection.rollback()
-                except:
-                    pass
-            return None if fetch else False
-        finally:
-            if cursor:
-                try:
-                    cursor.close()
-                except:
-                    pass
+        except Exception as e:
+            self.last_error = e
+            return None
 
     # ========== QUẢN LÝ SÁCH ==========
+    @cached('books')
     def get_all_books(self):
         """Lấy tất cả sách"""
         try:
-            result = self.execute_query("""
-                SELECT book_id, book_code, title, author, publisher, 
-                       publish_year, quantity_in_stock, price 
-                FROM Books ORDER BY book_id
-            """)
-            return result if result else []
-        except Exception:
+            return list(self.iter_all_books())
+        except Exception as e:
+            self.last_error = e
             return []
 
-    def add_book(self, book_data: tuple) -> bool:
-        """Thêm sách mới"""
-        try:
-            book_code, title, author, publisher, publish_year, quantity, price = book_data
-
-            # Kiểm tra mã sách trùng
-            check_result = self.execute_query(
-                "SELECT book_id FROM Books WHERE book_code = ?",
-                (book_code,),
-                fetch=True
-            )
-
-            if check_result:
-                return False
-
-            # Thêm vào SQL
-            sql_success = self.execute_query("""
-                INSERT INTO Books (book_code, title, author, publisher, publish_year, quantity_in_stock, price)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, book_data, fetch=False)
+    def iter_all_books(self, batch_size: int = 500):
+        """Duyệt sách theo từng lô"""
+        return self.iter_query("""
+            SELECT book_id, book_code, title, author, publisher, 
+                   publish_year, quantity_in_stock, price 
+            FROM Books ORDER BY book_id
+        """, batch_size=batch_size)
 
-            if not sql_success:
-                return False
+    def get_books_page(self, after_key=None, page_size: int = 100):
+        """Lấy một trang sách theo book_id (keyset); trả về (rows, next_key)"""
+        try:
+            if after_key is None:
+                rows = self.execute_query("""
+                    SELECT TOP (?) book_id, book_code, title, author, publisher,
+                           publish_year, quantity_in_stock, price
+                    FROM Books
+                    ORDER BY book_id
+                """, (page_size,))
+            else:
+                rows = self.execute_query("""
+                    SELECT TOP (?) book_id, book_code, title, author, publisher,
+                           publish_year, quantity_in_stock, price
+                    FROM Books
+                    WHERE book_id > ?
+                    ORDER BY book_id
+                """, (page_size, after_key))
+
+            return self._page_result(rows, page_size, lambda row: row[0])
+        except Exception:
+            return [], None
 
-            # Lấy ID vừa tạo
-            result = self.execute_query("SELECT @@IDENTITY", fetch=True)
+    @invalidates('books')
+    def add_book(self, book_data: tuple):
+        """Thêm sách mới; trả về dòng thay đổi {'books': {'inserted': [row]}} hoặc False"""
+        try:
+            book_code, title, author, publisher, publish_year, quantity, price = book_data
 
-            if not result or not result[0]:
+            # Thêm vào SQL, trả về ID trong cùng câu lệnh (bỏ qua nếu trùng mã)
+            book_id = self.insert_returning("Books", {
+                "book_code": book_code,
+                "title": title,
+                "author": author,
+                "publisher": publisher,
+                "publish_year": publish_year,
+                "quantity_in_stock": quantity,
+                "price": price
+            }, "book_id", unique_column="book_code")
+
+            if book_id is None:
                 return False
 
-            book_id = result[0][0]
-
             # Đồng bộ lên MongoDB
             mongo_data = {
                 "book_id": int(book_id),
@@ -198,13 +479,16 @@ class DatabaseManager:
             }
 
             self.mongo_manager.save_to_mongodb("books", mongo_data)
-            return True
+            row = (int(book_id), book_code, title, author, publisher, publish_year, quantity, price)
+            self._update_search_index('books', 'add', row)
+            return {'books': {'inserted': [row]}}
 
         except Exception:
             return False
 
-    def update_book(self, book_data: tuple) -> bool:
-        """Cập nhật thông tin sách"""
+    @invalidates('books')
+    def update_book(self, book_data: tuple):
+        """Cập nhật thông tin sách; trả về dòng thay đổi {'books': {'updated': [row]}} hoặc False"""
         try:
             title, author, publisher, publish_year, quantity, price, book_code = book_data
 
@@ -218,15 +502,16 @@ class DatabaseManager:
             if not sql_success:
                 return False
 
-            # Lấy ID sách
+            # Lấy dòng sách sau khi cập nhật
             result = self.execute_query(
-                "SELECT book_id FROM Books WHERE book_code = ?",
+                f"{BOOK_ROW_SQL} WHERE book_code = ?",
                 (book_code,),
                 fetch=True
             )
 
             if result and result[0]:
                 book_id = result[0][0]
+                self._update_search_index('books', 'add', (book_id, book_code, title, author, publisher, publish_year, quantity, price))
 
                 # Đồng bộ lên MongoDB
                 mongo_data = {
@@ -246,13 +531,14 @@ class DatabaseManager:
                     mongo_data
                 )
 
-            return True
+            return {'books': {'updated': list(result or [])}}
 
         except Exception:
             return False
 
-    def delete_book(self, book_code: str) -> bool:
-        """Xóa sách"""
+    @invalidates('books')
+    def delete_book(self, book_code: str):
+        """Xóa sách; trả về khóa đã xóa {'books': {'deleted': [book_id]}} hoặc False"""
         try:
             # Lấy ID sách trước khi xóa
             result = self.execute_query(
@@ -275,24 +561,124 @@ class DatabaseManager:
             if not sql_success:
                 return False
 
+            if book_id:
+                self._update_search_index('books', 'remove', book_id)
+
             # Xóa từ MongoDB
-            if book_id and self.mongo_manager.db:
-                self.mongo_manager.db['books'].delete_one({"book_id": book_id})
+            if book_id:
+                self.mongo_manager.delete_from_mongodb("books", {"book_id": book_id})
 
-            return True
+            return {'books': {'deleted': [book_id] if book_id else []}}
 
         except Exception:
             return False
 
     def search_books(self, **kwargs):
-        """Tìm kiếm sách"""
+        """Tìm kiếm sách (qua chỉ mục trong bộ nhớ, SQL khi chỉ mục chưa sẵn sàng)
+
+        query tìm trên mọi trường, limit giới hạn số kết quả; các khóa còn lại như trước.
+        """
         try:
-            query = """
-                SELECT book_id, book_code, title, author, publisher, 
+            index = self.get_book_index()
+            if index is None:
+                return self._search_books_sql(**kwargs)
+
+            return self.get_books_by_ids(index.search(**kwargs))
+        except Exception:
+            return []
+
+    def get_books_by_ids(self, book_ids):
+        """Lấy sách theo danh sách ID, giữ nguyên thứ tự truyền vào"""
+        if not book_ids:
+            return []
+
+        result = self.execute_query("""
+            SELECT b.book_id, b.book_code, b.title, b.author, b.publisher,
+                   b.publish_year, b.quantity_in_stock, b.price
+            FROM OPENJSON(?) ids
+            JOIN Books b ON b.book_id = CAST(ids.value AS INT)
+            ORDER BY CAST(ids.[key] AS INT)
+        """, (json.dumps([int(book_id) for book_id in book_ids]),))
+        return result if result else []
+
+    # Nguồn dữ liệu cho từng chỉ mục tìm kiếm trong bộ nhớ
+    SEARCH_INDEX_SOURCES = {
+        'books': (BookSearchIndex, """
+            SELECT book_id, book_code, title, author, publisher,
+                   publish_year, quantity_in_stock, price
+            FROM Books
+        """),
+        'customers': (CustomerSearchIndex, """
+            SELECT customer_id, customer_code, full_name, address, phone_number
+            FROM Customers
+        """)
+    }
+
+    def get_book_index(self):
+        """Trả về chỉ mục tìm kiếm sách; lần đầu sẽ dựng ở luồng nền và trả về None"""
+        if not DatabaseConfig.BOOK_SEARCH_INDEX_ENABLED:
+            return None
+        return self._get_search_index('books')
+
+    def get_customer_index(self):
+        """Trả về chỉ mục tìm kiếm khách hàng; lần đầu sẽ dựng ở luồng nền và trả về None"""
+        if not DatabaseConfig.CUSTOMER_SEARCH_INDEX_ENABLED:
+            return None
+        return self._get_search_index('customers')
+
+    def _get_search_index(self, name):
+        with self._index_lock:
+            index = self.search_indexes.get(name)
+            if index is None and name not in self._index_building:
+                self._index_building.add(name)
+                threading.Thread(target=self._build_search_index, args=(name,), daemon=True).start()
+            return index
+
+    def _build_search_index(self, name):
+        """Dựng chỉ mục từ toàn bộ bảng, áp dụng các thay đổi xảy ra trong lúc dựng"""
+        index_class, query = self.SEARCH_INDEX_SOURCES[name]
+        index = None
+        try:
+            with self.transaction() as cursor:
+                cursor.execute(query)
+                batches = iter(lambda: cursor.fetchmany(1000), [])
+                index = index_class().build(row for batch in batches for row in batch)
+        except Exception as e:
+            self.last_error = e
+
+        with self._index_lock:
+            self._index_building.discard(name)
+            pending = self._index_pending.pop(name, [])
+            if index is None:
+                return
+            for action, value in pending:
+                getattr(index, action)(value)
+            self.search_indexes[name] = index
+
+    def _update_search_index(self, name, action, value):
+        """Cập nhật chỉ mục sau thao tác ghi; action là 'add' (thêm/sửa) hoặc 'remove'"""
+        with self._index_lock:
+            index = self.search_indexes.get(name)
+            if index is not None:
+                getattr(index, action)(value)
+            elif name in self._index_building:
+                self._index_pending.setdefault(name, []).append((action, value))
+
+    @cached('books')
+    def _search_books_sql(self, **kwargs):
+        """Tìm kiếm sách bằng LIKE trên SQL Server"""
+        try:
+            top = "TOP (?)" if kwargs.get('limit') else ""
+            query = f"""
+                SELECT {top} book_id, book_code, title, author, publisher, 
                        publish_year, quantity_in_stock, price 
                 FROM Books WHERE 1=1
             """
-            params = []
+            params = [int(kwargs['limit'])] if kwargs.get('limit') else []
+
+            if kwargs.get('query'):
+                query += " AND (book_code LIKE ? OR title LIKE ? OR author LIKE ?)"
+                params.extend([f"%{kwargs['query']}%"] * 3)
 
             if kwargs.get('title'):
                 query += " AND title LIKE ?"
@@ -327,53 +713,96 @@ class DatabaseManager:
             result = self.execute_query(query, tuple(params) if params else None)
             return result if result else []
 
-        except Exception:
+        except Exception as e:
+            self.last_error = e
             return []
 
     # ========== QUẢN LÝ KHÁCH HÀNG ==========
+    @cached('customers')
     def get_all_customers(self):
         """Lấy tất cả khách hàng"""
         try:
-            result = self.execute_query("""
-                SELECT customer_id, customer_code, full_name, address, phone_number
-                FROM Customers ORDER BY customer_id
-            """)
-            return result if result else []
-        except Exception:
+            return list(self.iter_all_customers())
+        except Exception as e:
+            self.last_error = e
             return []
 
-    def add_customer(self, customer_data: tuple) -> bool:
-        """Thêm khách hàng mới"""
-        try:
-            customer_code, full_name, address, phone_number = customer_data
+    def iter_all_customers(self, batch_size: int = 500):
+        """Duyệt khách hàng theo từng lô"""
+        return self.iter_query("""
+            SELECT customer_id, customer_code, full_name, address, phone_number
+            FROM Customers ORDER BY customer_id
+        """, batch_size=batch_size)
 
-            # Kiểm tra mã KH trùng
-            check_result = self.execute_query(
-                "SELECT customer_id FROM Customers WHERE customer_code = ?",
-                (customer_code,),
-                fetch=True
-            )
+    def get_customers_page(self, after_key=None, page_size: int = 100):
+        """Lấy một trang khách hàng theo customer_id (keyset); trả về (rows, next_key)"""
+        try:
+            if after_key is None:
+                rows = self.execute_query("""
+                    SELECT TOP (?) customer_id, customer_code, full_name, address, phone_number
+                    FROM Customers
+                    ORDER BY customer_id
+                """, (page_size,))
+            else:
+                rows = self.execute_query("""
+                    SELECT TOP (?) customer_id, customer_code, full_name, address, phone_number
+                    FROM Customers
+                    WHERE customer_id > ?
+                    ORDER BY customer_id
+                """, (page_size, after_key))
+
+            return self._page_result(rows, page_size, lambda row: row[0])
+        except Exception:
+            return [], None
 
-            if check_result:
-                return False
+    def search_customers(self, query: str, limit: int = 20):
+        """Tìm khách hàng theo SĐT (tiền tố, chỉ so chữ số), mã hoặc họ tên không dấu"""
+        try:
+            query = (query or "").strip()
+            if not query:
+                return []
+
+            index = self.get_customer_index()
+            if index is not None:
+                return index.search(query, limit)
+
+            # Chỉ mục chưa sẵn sàng: tìm tiền tố trên SQL để dùng được idx_Customers_Phone / idx_Customers_NamePhone
+            if not any(ch.isalpha() for ch in query):
+                result = self.execute_query("""
+                    SELECT TOP (?) customer_id, customer_code, full_name, address, phone_number
+                    FROM Customers
+                    WHERE phone_number LIKE ?
+                    ORDER BY phone_number
+                """, (limit, normalize_phone(query) + '%'))
+            else:
+                result = self.execute_query("""
+                    SELECT TOP (?) customer_id, customer_code, full_name, address, phone_number
+                    FROM Customers
+                    WHERE full_name LIKE ? OR customer_code LIKE ?
+                    ORDER BY full_name
+                """, (limit, query + '%', query + '%'))
 
-            # Thêm vào SQL
-            sql_success = self.execute_query("""
-                INSERT INTO Customers (customer_code, full_name, address, phone_number)
-                VALUES (?, ?, ?, ?)
-            """, customer_data, fetch=False)
+            return result if result else []
+        except Exception:
+            return []
 
-            if not sql_success:
-                return False
+    @invalidates('customers')
+    def add_customer(self, customer_data: tuple):
+        """Thêm khách hàng mới; trả về dòng thay đổi {'customers': {'inserted': [row]}} hoặc False"""
+        try:
+            customer_code, full_name, address, phone_number = customer_data
 
-            # Lấy ID vừa tạo
-            result = self.execute_query("SELECT @@IDENTITY", fetch=True)
+            # Thêm vào SQL, trả về ID trong cùng câu lệnh (bỏ qua nếu trùng mã)
+            customer_id = self.insert_returning("Customers", {
+                "customer_code": customer_code,
+                "full_name": full_name,
+                "address": address,
+                "phone_number": phone_number
+            }, "customer_id", unique_column="customer_code")
 
-            if not result or not result[0]:
+            if customer_id is None:
                 return False
 
-            customer_id = result[0][0]
-
             # Đồng bộ lên MongoDB
             mongo_data = {
                 "customer_id": int(customer_id),
@@ -384,13 +813,16 @@ class DatabaseManager:
             }
 
             self.mongo_manager.save_to_mongodb("customers", mongo_data)
-            return True
+            row = (int(customer_id), customer_code, full_name, address, phone_number)
+            self._update_search_index('customers', 'add', row)
+            return {'customers': {'inserted': [row]}}
 
         except Exception:
             return False
 
-    def update_customer(self, customer_data: tuple) -> bool:
-        """Cập nhật thông tin khách hàng"""
+    @invalidates('customers')
+    def update_customer(self, customer_data: tuple):
+        """Cập nhật thông tin khách hàng; trả về dòng thay đổi {'customers': {'updated': [row]}} hoặc False"""
         try:
             full_name, address, phone_number, customer_code = customer_data
 
@@ -403,15 +835,16 @@ class DatabaseManager:
             if not sql_success:
                 return False
 
-            # Lấy ID khách hàng
-            result = self.execute_query(
-                "SELECT customer_id FROM Customers WHERE customer_code = ?",
-                (customer_code,),
-                fetch=True
-            )
+            # Lấy dòng khách hàng sau khi cập nhật
+            result = self.execute_query("""
+                SELECT customer_id, customer_code, full_name, address, phone_number
+                FROM Customers WHERE customer_code = ?
+            """, (customer_code,), fetch=True)
 
             if result and result[0]:
                 customer_id = result[0][0]
+                self._update_search_index('customers', 'add',
+                                          (customer_id, customer_code, full_name, address, phone_number))
 
                 # Đồng bộ lên MongoDB
                 mongo_data = {
@@ -428,13 +861,14 @@ class DatabaseManager:
                     mongo_data
                 )
 
-            return True
+            return {'customers': {'updated': list(result or [])}}
 
         except Exception:
             return False
 
-    def delete_customer(self, customer_code: str) -> bool:
-        """Xóa khách hàng"""
+    @invalidates('customers')
+    def delete_customer(self, customer_code: str):
+        """Xóa khách hàng; trả về khóa đã xóa {'customers': {'deleted': [customer_id]}} hoặc False"""
         try:
             # Lấy ID khách hàng trước khi xóa
             result = self.execute_query(
@@ -457,16 +891,20 @@ class DatabaseManager:
             if not sql_success:
                 return False
 
+            if customer_id:
+                self._update_search_index('customers', 'remove', customer_id)
+
             # Xóa từ MongoDB
-            if customer_id and self.mongo_manager.db:
-                self.mongo_manager.db['customers'].delete_one({"customer_id": customer_id})
+            if customer_id:
+                self.mongo_manager.delete_from_mongodb("customers", {"customer_id": customer_id})
 
-            return True
+            return {'customers': {'deleted': [customer_id] if customer_id else []}}
 
         except Exception:
             return False
 
     # ========== QUẢN LÝ ĐƠN HÀNG ==========
+    @invalidates('orders')
     def create_order(self, order_code: str, customer_id: int, order_date=None):
         """Tạo đơn hàng mới"""
         try:
@@ -475,159 +913,483 @@ class DatabaseManager:
             elif isinstance(order_date, date) and not isinstance(order_date, datetime):
                 order_date = datetime.combine(order_date, datetime.min.time())
 
-            # Thêm đơn hàng vào SQL
-            sql_success = self.execute_query("""
-                INSERT INTO Orders (order_code, customer_id, order_date, total_amount, status)
-                VALUES (?, ?, ?, 0, 'Pending')
-            """, (order_code, customer_id, order_date), fetch=False)
-
-            if not sql_success:
-                return None
-
-            # Lấy ID đơn hàng vừa tạo
-            result = self.execute_query(
-                "SELECT order_id FROM Orders WHERE order_code = ?",
-                (order_code,),
-                fetch=True
-            )
-
-            if not result or not result[0]:
-                return None
-
-            order_id = result[0][0]
-
-            # Đồng bộ lên MongoDB
-            mongo_data = {
-                "order_id": int(order_id),
+            # Thêm đơn hàng vào SQL, trả về ID trong cùng câu lệnh
+            order_id = self.insert_returning("Orders", {
                 "order_code": order_code,
-                "customer_id": int(customer_id),
+                "customer_id": customer_id,
                 "order_date": order_date,
-                "total_amount": 0.0,
+                "total_amount": 0,
                 "status": "Pending"
-            }
+            }, "order_id", unique_column="order_code")
 
-            self.mongo_manager.save_to_mongodb("orders", mongo_data)
+            # Đơn hàng chỉ được ghi lên MongoDB một lần khi hoàn thành
             return order_id
 
         except Exception:
             return None
 
+    @invalidates('orders', 'books')
     def add_order_item(self, order_id: int, book_id: int, quantity: int, unit_price: float) -> bool:
-        """Thêm sách vào đơn hàng"""
+        """Thêm sách vào đơn hàng, chỉ trừ kho khi còn đủ hàng"""
         try:
             subtotal = quantity * unit_price
 
-            # Thêm chi tiết đơn hàng
-            sql_success = self.execute_query("""
-                INSERT INTO OrderDetails (order_id, book_id, quantity, unit_price, subtotal)
-                VALUES (?, ?, ?, ?, ?)
-            """, (order_id, book_id, quantity, unit_price, subtotal), fetch=False)
+            with self.transaction() as cursor:
+                cursor.execute("""
+                    SET NOCOUNT ON;
+                    SET XACT_ABORT ON;
 
-            if not sql_success:
+                    UPDATE Books
+                    SET quantity_in_stock = quantity_in_stock - ?
+                    WHERE book_id = ? AND quantity_in_stock >= ?;
+
+                    IF @@ROWCOUNT = 0
+                        THROW 50001, N'Không đủ tồn kho', 1;
+
+                    INSERT INTO OrderDetails (order_id, book_id, quantity, unit_price, subtotal)
+                    VALUES (?, ?, ?, ?, ?);
+                """, (quantity, book_id, quantity, order_id, book_id, quantity, unit_price, subtotal))
+
+            return True
+
+        except Exception as e:
+            self.last_error = e
+            return False
+
+    @invalidates('orders', 'books')
+    def add_order_items_bulk(self, order_id: int, items) -> bool:
+        """Thêm nhiều sách vào đơn hàng trong một giao dịch
+
+        items: danh sách (book_id, quantity, unit_price).
+        """
+        try:
+            rows = self._prepare_line_items(items)
+            if not rows:
                 return False
 
-            # Cập nhật tồn kho
-            self.execute_query(
-                "UPDATE Books SET quantity_in_stock = quantity_in_stock - ? WHERE book_id = ?",
-                (quantity, book_id),
-                fetch=False
-            )
+            with self.transaction() as cursor:
+                self._stage_line_items(cursor, rows)
+                cursor.execute(f"""
+                    SET NOCOUNT ON;
+                    SET XACT_ABORT ON;
+
+                    UPDATE b
+                    SET quantity_in_stock = b.quantity_in_stock - l.quantity
+                    FROM Books b
+                    JOIN (SELECT book_id, SUM(quantity) AS quantity FROM #line_items GROUP BY book_id) l
+                        ON b.book_id = l.book_id
+                    WHERE b.quantity_in_stock >= l.quantity;
+
+                    IF @@ROWCOUNT <> (SELECT COUNT(DISTINCT book_id) FROM #line_items)
+                        THROW 50001, N'Không đủ tồn kho', 1;
+
+                    UPDATE Orders
+                    SET total_amount = total_amount + (SELECT SUM(subtotal) FROM #line_items)
+                    WHERE order_id = ?;
+                    {mark_parent_written('order_written', '?')}
+
+                    INSERT INTO OrderDetails (order_id, book_id, quantity, unit_price, subtotal)
+                    SELECT ?, book_id, quantity, unit_price, subtotal
+                    FROM #line_items;
+
+                    DROP TABLE #line_items;
+                """, (order_id, order_id, order_id))
 
             return True
 
-        except Exception:
+        except Exception as e:
+            self.last_error = e
             return False
 
+    @invalidates('orders', 'books')
     def complete_order(self, order_id: int) -> bool:
-        """Hoàn thành đơn hàng"""
+        """Hoàn thành đơn hàng (trigger trên Orders cộng vào doanh thu tổng hợp trong cùng giao dịch)"""
         try:
-            # Kiểm tra trạng thái đơn hàng
-            check_result = self.execute_query(
-                "SELECT status, order_code FROM Orders WHERE order_id = ?",
-                (order_id,),
-                fetch=True
-            )
+            with self.transaction() as cursor:
+                cursor.execute(f"""
+                    SET NOCOUNT ON;
+                    SET XACT_ABORT ON;
 
-            if not check_result:
-                return False
+                    DECLARE @order_id INT = ?, @completed INT;
 
-            status, order_code = check_result[0]
-            if status == 'Completed':
-                return True
+                    UPDATE Orders
+                    SET total_amount = (SELECT SUM(quantity * unit_price) FROM OrderDetails WHERE order_id = @order_id),
+                        status = 'Completed'
+                    WHERE order_id = @order_id
+                        AND status = 'Pending'
+                        AND EXISTS (SELECT 1 FROM OrderDetails WHERE order_id = @order_id);
 
-            # Tính tổng tiền
-            total_result = self.execute_query("""
-                SELECT SUM(quantity * unit_price) 
-                FROM OrderDetails 
-                WHERE order_id = ?
-            """, (order_id,), fetch=True)
+                    SET @completed = @@ROWCOUNT;
 
-            if not total_result or total_result[0][0] is None:
+                    SELECT @completed, status FROM Orders WHERE order_id = @order_id;
+
+                    {self._completed_order_document_sql()}
+                """, (order_id,))
+                row = cursor.fetchone()
+                document_rows = self._next_rows(cursor)
+
+            if not row:
                 return False
 
-            total_amount = total_result[0][0]
-            if isinstance(total_amount, Decimal):
-                total_amount = float(total_amount)
+            completed, status = row
+            if completed and document_rows:
+                self._sync_completed_order(document_rows[0])
+            return status == 'Completed'
 
-            # Cập nhật đơn hàng
-            sql_success = self.execute_query("""
-                UPDATE Orders 
-                SET total_amount = ?, status = 'Completed'
-                WHERE order_id = ?
-            """, (total_amount, order_id), fetch=False)
+        except Exception:
+            return False
 
-            if not sql_success:
+    @invalidates('books')
+    def reserve_stock(self, cart_id: str, book_id: int, quantity: int) -> bool:
+        """Giữ chỗ quantity cuốn cho giỏ hàng; trừ kho có điều kiện nên hai quầy không bán trùng cuốn cuối
+
+        Giữ chỗ của cả giỏ được gia hạn STOCK_HOLD_TTL giây sau mỗi lần thêm.
+        """
+        try:
+            if quantity <= 0:
                 return False
 
-            # Lấy thông tin đơn hàng để đồng bộ MongoDB
-            order_info = self.execute_query("""
-                SELECT order_code, customer_id, order_date 
-                FROM Orders WHERE order_id = ?
-            """, (order_id,), fetch=True)
+            with self.transaction() as cursor:
+                cursor.execute(f"""
+                    SET NOCOUNT ON;
+                    SET XACT_ABORT ON;
 
-            if order_info:
-                order_code, customer_id, order_date = order_info[0]
+                    DECLARE @cart_id VARCHAR(36) = ?, @book_id INT = ?, @quantity INT = ?, @ttl INT = ?;
+                    DECLARE @reserved INT;
 
-                if isinstance(order_date, date) and not isinstance(order_date, datetime):
-                    order_date = datetime.combine(order_date, datetime.min.time())
+                    {RELEASE_EXPIRED_HOLDS_SQL}
 
-                # Đồng bộ lên MongoDB
-                mongo_data = {
-                    "order_id": int(order_id),
-                    "order_code": order_code,
-                    "customer_id": int(customer_id),
-                    "order_date": order_date,
-                    "total_amount": float(total_amount),
-                    "status": "Completed",
-                    "completed_at": datetime.now()
-                }
+                    UPDATE Books
+                    SET quantity_in_stock = quantity_in_stock - @quantity
+                    WHERE book_id = @book_id AND quantity_in_stock >= @quantity;
 
-                self.mongo_manager.update_to_mongodb(
-                    "orders",
-                    {"order_id": order_id},
-                    mongo_data
-                )
+                    SET @reserved = @@ROWCOUNT;
+                    IF @reserved = 1
+                    BEGIN
+                        UPDATE StockHolds SET quantity = quantity + @quantity
+                        WHERE cart_id = @cart_id AND book_id = @book_id;
 
-            return True
+                        IF @@ROWCOUNT = 0
+                            INSERT INTO StockHolds (cart_id, book_id, quantity, expires_at)
+                            VALUES (@cart_id, @book_id, @quantity, DATEADD(SECOND, @ttl, SYSUTCDATETIME()));
+
+                        UPDATE StockHolds SET expires_at = DATEADD(SECOND, @ttl, SYSUTCDATETIME())
+                        WHERE cart_id = @cart_id;
+                    END
+
+                    SELECT @reserved;
+                """, (cart_id, book_id, quantity, DatabaseConfig.STOCK_HOLD_TTL))
+                row = cursor.fetchone()
+
+            return bool(row and row[0])
+
+        except Exception as e:
+            self.last_error = e
+            return False
+
+    @invalidates('books')
+    def release_stock(self, cart_id: str):
+        """Hủy toàn bộ giữ chỗ của giỏ hàng, hoàn lại tồn kho; trả về các dòng sách đã thay đổi"""
+        try:
+            with self.transaction() as cursor:
+                cursor.execute(f"""
+                    SET NOCOUNT ON;
+                    SET XACT_ABORT ON;
+
+                    DECLARE @released TABLE (book_id INT, quantity INT);
+
+                    DELETE FROM StockHolds
+                    OUTPUT DELETED.book_id, DELETED.quantity INTO @released
+                    WHERE cart_id = ?;
+
+                    UPDATE b
+                    SET quantity_in_stock = b.quantity_in_stock + r.quantity
+                    FROM Books b
+                    JOIN (SELECT book_id, SUM(quantity) AS quantity FROM @released GROUP BY book_id) r
+                        ON b.book_id = r.book_id;
+
+                    {BOOK_ROW_SQL} WHERE book_id IN (SELECT book_id FROM @released);
+                """, (cart_id,))
+                book_rows = cursor.fetchall()
+
+            return {'books': {'updated': book_rows}}
+
+        except Exception as e:
+            self.last_error = e
+            return False
+
+    def release_expired_holds(self) -> int:
+        """Hoàn lại tồn kho của các giữ chỗ đã hết hạn
+
+        Chạy định kỳ nên chỉ hủy cache sách khi thật sự có giữ chỗ được hoàn lại.
+        """
+        try:
+            with self.pool.connection() as conn:
+                if conn is None:
+                    return 0
+                released = release_expired(conn)
+        except Exception as e:
+            self.last_error = e
+            return 0
+
+        if released > 0 and self.cache is not None:
+            self.cache.invalidate('books')
+        return released
+
+    @invalidates('orders', 'books')
+    def checkout(self, customer_id: int, items, order_code: str = None, order_date=None, cart_id: str = None):
+        """Tạo đơn hàng hoàn chỉnh trong một giao dịch
+
+        items: danh sách (book_id, quantity, unit_price).
+        cart_id: giỏ hàng đã giữ chỗ bằng reserve_stock; phần đã giữ được chuyển thành bán,
+        phần chênh lệch (giữ chỗ hết hạn, đổi số lượng) được trừ / hoàn kho có điều kiện.
+        Trả về (order_id, total_amount, changes) với changes là dòng đơn hàng mới và các dòng sách đã
+        đổi tồn kho, hoặc None nếu không đủ tồn kho / lỗi.
+        order_code None: sinh mã theo quầy, trùng mã thì thử lại với mã mới; mã truyền vào bị trùng thì
+        last_error là DuplicateCodeError.
+        """
+        try:
+            items = [(int(book_id), int(quantity), float(unit_price))
+                     for book_id, quantity, unit_price in items]
+            if not items or any(quantity <= 0 for _, quantity, _ in items):
+                return None
+
+            if order_date is None:
+                order_date = datetime.now()
+            elif isinstance(order_date, date) and not isinstance(order_date, datetime):
+                order_date = datetime.combine(order_date, datetime.min.time())
+
+            items_json = json.dumps([
+                {"book_id": book_id, "quantity": quantity, "unit_price": unit_price}
+                for book_id, quantity, unit_price in items
+            ])
+
+            generated = order_code is None
+            for _ in range(CODE_RETRIES):
+                if generated:
+                    order_code = self.next_document_code('DH')
+                try:
+                    row, order_rows, book_rows, document_rows = self._checkout_batch(
+                        items_json, cart_id, order_code, customer_id, order_date)
+                    break
+                except Exception as e:
+                    if not is_duplicate_key(e, order_code):
+                        raise
+                    if not generated:
+                        raise DuplicateCodeError(f"Mã đơn hàng {order_code} đã tồn tại") from e
+            else:
+                raise DuplicateCodeError(f"Mã đơn hàng tự sinh bị trùng {CODE_RETRIES} lần liên tiếp")
+
+            if not row or row[0] is None:
+                return None
+
+            order_id, total_amount = int(row[0]), float(row[1])
+
+            if document_rows:
+                self._sync_completed_order(document_rows[0])
+            return order_id, total_amount, {
+                'orders': {'inserted': order_rows},
+                'books': {'updated': book_rows}
+            }
+
+        except Exception as e:
+            self.last_error = e
+            return None
+
+    def _checkout_batch(self, items_json, cart_id, order_code, customer_id, order_date):
+        """Batch thanh toán của checkout; trả về (dòng kết quả, dòng đơn hàng, dòng sách, dòng document)"""
+        # Trừ kho có điều kiện cho cả giỏ hàng, thiếu một dòng thì THROW để rollback toàn bộ đơn
+        with self.transaction() as cursor:
+            cursor.execute(f"""
+                SET NOCOUNT ON;
+                SET XACT_ABORT ON;
+
+                DECLARE @items TABLE (book_id INT NOT NULL, quantity INT NOT NULL, unit_price DECIMAL(10,2) NOT NULL);
+                DECLARE @new_order TABLE (order_id INT);
+                DECLARE @order_id INT, @total DECIMAL(12,2), @book_count INT;
+
+                INSERT INTO @items (book_id, quantity, unit_price)
+                SELECT book_id, quantity, unit_price
+                FROM OPENJSON(?) WITH (book_id INT, quantity INT, unit_price DECIMAL(10,2));
+
+                SELECT @total = SUM(quantity * unit_price) FROM @items;
+
+                {RELEASE_EXPIRED_HOLDS_SQL}
+
+                -- Giữ chỗ của giỏ đã trừ kho sẵn, chỉ trừ / hoàn phần chênh lệch
+                DECLARE @held TABLE (book_id INT, quantity INT);
+                DECLARE @delta TABLE (book_id INT PRIMARY KEY, quantity INT);
+
+                DELETE FROM StockHolds
+                OUTPUT DELETED.book_id, DELETED.quantity INTO @held
+                WHERE cart_id = ?;
+
+                INSERT INTO @delta (book_id, quantity)
+                SELECT COALESCE(i.book_id, h.book_id), ISNULL(i.quantity, 0) - ISNULL(h.quantity, 0)
+                FROM (SELECT book_id, SUM(quantity) AS quantity FROM @items GROUP BY book_id) i
+                FULL JOIN (SELECT book_id, SUM(quantity) AS quantity FROM @held GROUP BY book_id) h
+                    ON h.book_id = i.book_id
+                WHERE ISNULL(i.quantity, 0) <> ISNULL(h.quantity, 0);
+
+                SELECT @book_count = COUNT(*) FROM @delta;
+
+                UPDATE b
+                SET quantity_in_stock = b.quantity_in_stock - d.quantity
+                FROM Books b
+                JOIN @delta d ON b.book_id = d.book_id
+                WHERE d.quantity < 0 OR b.quantity_in_stock >= d.quantity;
+
+                IF @@ROWCOUNT <> @book_count
+                    THROW 50001, N'Không đủ tồn kho', 1;
+
+                INSERT INTO Orders (order_code, customer_id, order_date, total_amount, status)
+                OUTPUT INSERTED.order_id INTO @new_order
+                VALUES (?, ?, ?, @total, 'Completed');
+
+                SELECT @order_id = order_id FROM @new_order;
+                {mark_parent_written('order_written', '@order_id')}
+
+                INSERT INTO OrderDetails (order_id, book_id, quantity, unit_price, subtotal)
+                SELECT @order_id, book_id, quantity, unit_price, quantity * unit_price
+                FROM @items;
+
+                SELECT @order_id AS order_id, @total AS total_amount;
+
+                {ORDER_ROW_SQL} WHERE o.order_id = @order_id;
+
+                {BOOK_ROW_SQL}
+                WHERE book_id IN (SELECT book_id FROM @items UNION SELECT book_id FROM @delta);
+
+                {self._completed_order_document_sql()}
+            """, (items_json, cart_id, order_code, customer_id, order_date))
+            row = cursor.fetchone()
+            order_rows = self._next_rows(cursor)
+            book_rows = self._next_rows(cursor)
+            document_rows = self._next_rows(cursor)
+
+        return row, order_rows, book_rows, document_rows
+
+    @invalidates('orders', 'books')
+    def cancel_order(self, order_id: int):
+        """Hủy đơn hàng: hoàn lại tồn kho, trừ khỏi doanh thu tổng hợp nếu đơn đã hoàn thành
+
+        Trả về các dòng đơn hàng / sách đã thay đổi, hoặc False nếu đơn không tồn tại, đã hủy hoặc lỗi.
+        """
+        try:
+            with self.transaction() as cursor:
+                cursor.execute(f"""
+                    SET NOCOUNT ON;
+                    SET XACT_ABORT ON;
+
+                    DECLARE @order_id INT = ?, @previous NVARCHAR(20);
+
+                    SELECT @previous = status FROM Orders WITH (UPDLOCK) WHERE order_id = @order_id;
+
+                    IF @previous IN ('Pending', 'Completed')
+                    BEGIN
+                        UPDATE Orders SET status = 'Cancelled' WHERE order_id = @order_id;
+
+                        UPDATE b
+                        SET quantity_in_stock = b.quantity_in_stock + d.quantity
+                        FROM Books b
+                        JOIN (SELECT book_id, SUM(quantity) AS quantity
+                              FROM OrderDetails WHERE order_id = @order_id GROUP BY book_id) d
+                            ON b.book_id = d.book_id;
+                    END
+
+                    SELECT @previous;
+
+                    {ORDER_ROW_SQL} WHERE o.order_id = @order_id;
+
+                    {BOOK_ROW_SQL}
+                    WHERE book_id IN (SELECT book_id FROM OrderDetails WHERE order_id = @order_id);
+                """, (order_id,))
+                row = cursor.fetchone()
+                order_rows = self._next_rows(cursor)
+                book_rows = self._next_rows(cursor)
+
+            previous = row[0] if row else None
+            if previous not in ('Pending', 'Completed'):
+                return False
+
+            if previous == 'Completed':
+                self.mongo_manager.update_to_mongodb("orders", {"order_id": order_id}, {"status": "Cancelled"})
+            return {'orders': {'updated': order_rows}, 'books': {'updated': book_rows}}
+
+        except Exception as e:
+            self.last_error = e
+            return False
+
+    def _completed_order_document_sql(self) -> str:
+        """SELECT document đơn hàng gắn vào batch hoàn thành đơn (rỗng nếu không ghi trực tiếp lên MongoDB)"""
+        if self.mongo_manager.db is None or self.mongo_manager.via_outbox:
+            return ""
+        _, _, columns, _ = SYNC_TABLES['Orders']
+        return f"SELECT {columns} FROM Orders WHERE order_id = @order_id;"
 
+    def _sync_completed_order(self, row):
+        """Ghi document đơn hàng hoàn thành lên MongoDB từ dòng do _completed_order_document_sql trả về"""
+        if self.mongo_manager.db is None or self.mongo_manager.via_outbox:
+            return False
+
+        try:
+            _, _, _, to_document = SYNC_TABLES['Orders']
+            document = to_document(row)
+            document['completed_at'] = datetime.now()
+            return self.mongo_manager.replace_in_mongodb("orders", {"order_id": document['order_id']}, document)
         except Exception:
             return False
 
+    @cached('orders', 'customers')
     def get_all_orders(self):
         """Lấy tất cả đơn hàng"""
         try:
-            result = self.execute_query("""
-                SELECT o.order_id, o.order_code, o.order_date, 
-                       c.full_name as customer_name,
-                       o.total_amount, o.status 
-                FROM Orders o
-                LEFT JOIN Customers c ON o.customer_id = c.customer_id
-                ORDER BY o.order_date DESC
-            """)
-            return result if result else []
-        except Exception:
+            return list(self.iter_all_orders())
+        except Exception as e:
+            self.last_error = e
             return []
 
+    def iter_all_orders(self, batch_size: int = 500):
+        """Duyệt đơn hàng theo từng lô"""
+        return self.iter_query("""
+            SELECT o.order_id, o.order_code, o.order_date, 
+                   c.full_name as customer_name,
+                   o.total_amount, o.status 
+            FROM Orders o
+            LEFT JOIN Customers c ON o.customer_id = c.customer_id
+            ORDER BY o.order_date DESC
+        """, batch_size=batch_size)
+
+    def get_orders_page(self, after_key=None, page_size: int = 100):
+        """Lấy một trang đơn hàng theo (order_date, order_id) giảm dần; trả về (rows, next_key)"""
+        try:
+            if after_key is None:
+                rows = self.execute_query("""
+                    SELECT TOP (?) o.order_id, o.order_code, o.order_date,
+                           c.full_name as customer_name,
+                           o.total_amount, o.status
+                    FROM Orders o
+                    LEFT JOIN Customers c ON o.customer_id = c.customer_id
+                    ORDER BY o.order_date DESC, o.order_id DESC
+                """, (page_size,))
+            else:
+                last_date, last_id = after_key
+                rows = self.execute_query("""
+                    SELECT TOP (?) o.order_id, o.order_code, o.order_date,
+                           c.full_name as customer_name,
+                           o.total_amount, o.status
+                    FROM Orders o
+                    LEFT JOIN Customers c ON o.customer_id = c.customer_id
+                    WHERE o.order_date < ?
+                       OR (o.order_date = ? AND o.order_id < ?)
+                    ORDER BY o.order_date DESC, o.order_id DESC
+                """, (page_size, last_date, last_date, last_id))
+
+            return self._page_result(rows, page_size, lambda row: (row[2], row[0]))
+        except Exception:
+            return [], None
+
+    @cached('orders')
     def get_order_statistics_by_date(self, start_date, end_date):
         """Thống kê đơn hàng theo khoảng thời gian"""
         try:
@@ -636,6 +1398,18 @@ class DatabaseManager:
             if isinstance(end_date, date) and not isinstance(end_date, datetime):
                 end_date = datetime.combine(end_date, datetime.max.time())
 
+            result = self._mongo_report('order_statistics_by_date', start_date, end_date)
+            if result is not None:
+                return result
+
+            # Khoảng gồm trọn các ngày: đọc vài dòng tổng hợp thay vì quét Orders
+            days = whole_day_range(start_date, end_date)
+            if days is not None:
+                result = self.execute_query(RANGE_TOTALS_SQL, range_totals_params(*days), fetch=True)
+                if result:
+                    total_orders, total_revenue, _ = result[0]
+                    return total_orders, total_revenue
+
             result = self.execute_query("""
                 SELECT 
                     COUNT(*) as total_orders,
@@ -649,10 +1423,12 @@ class DatabaseManager:
             if result and result[0]:
                 return result[0]
             return (0, 0)
-        except Exception:
+        except Exception as e:
+            self.last_error = e
             return (0, 0)
 
     # ========== QUẢN LÝ NHẬP SÁCH ==========
+    @invalidates('imports')
     def create_import(self, import_code: str, import_date=None, supplier=""):
         """Tạo phiếu nhập sách"""
         try:
@@ -661,27 +1437,17 @@ class DatabaseManager:
             elif isinstance(import_date, date) and not isinstance(import_date, datetime):
                 import_date = datetime.combine(import_date, datetime.min.time())
 
-            # Thêm phiếu nhập vào SQL
-            sql_success = self.execute_query("""
-                INSERT INTO ImportBooks (import_code, import_date, supplier, total_amount)
-                VALUES (?, ?, ?, 0)
-            """, (import_code, import_date, supplier), fetch=False)
-
-            if not sql_success:
-                return None
-
-            # Lấy ID phiếu nhập vừa tạo
-            result = self.execute_query(
-                "SELECT import_id FROM ImportBooks WHERE import_code = ?",
-                (import_code,),
-                fetch=True
-            )
+            # Thêm phiếu nhập vào SQL, trả về ID trong cùng câu lệnh
+            import_id = self.insert_returning("ImportBooks", {
+                "import_code": import_code,
+                "import_date": import_date,
+                "supplier": supplier,
+                "total_amount": 0
+            }, "import_id", unique_column="import_code")
 
-            if not result or not result[0]:
+            if import_id is None:
                 return None
 
-            import_id = result[0][0]
-
             # Đồng bộ lên MongoDB
             mongo_data = {
                 "import_id": int(import_id),
@@ -697,6 +1463,7 @@ class DatabaseManager:
         except Exception:
             return None
 
+    @invalidates('imports', 'books')
     def add_import_item(self, import_id: int, book_id: int, quantity: int, unit_price: float) -> bool:
         """Thêm sách vào phiếu nhập"""
         try:
@@ -730,18 +1497,175 @@ class DatabaseManager:
         except Exception:
             return False
 
+    @invalidates('imports', 'books')
+    def add_import_items_bulk(self, import_id: int, items):
+        """Thêm nhiều sách vào phiếu nhập trong một giao dịch
+
+        items: danh sách (book_id, quantity, unit_price).
+        Trả về dòng phiếu nhập và các dòng sách đã đổi tồn kho, hoặc False nếu lỗi.
+        """
+        try:
+            rows = self._prepare_line_items(items)
+            if not rows:
+                return False
+
+            with self.transaction() as cursor:
+                self._stage_line_items(cursor, rows)
+                cursor.execute(f"""
+                    SET NOCOUNT ON;
+
+                    UPDATE ImportBooks
+                    SET total_amount = total_amount + (SELECT SUM(subtotal) FROM #line_items)
+                    WHERE import_id = ?;
+                    {mark_parent_written('import_written', '?')}
+
+                    INSERT INTO ImportDetails (import_id, book_id, quantity, unit_price, subtotal)
+                    SELECT ?, book_id, quantity, unit_price, subtotal
+                    FROM #line_items;
+
+                    UPDATE b
+                    SET quantity_in_stock = b.quantity_in_stock + l.quantity
+                    FROM Books b
+                    JOIN (SELECT book_id, SUM(quantity) AS quantity FROM #line_items GROUP BY book_id) l
+                        ON b.book_id = l.book_id;
+
+                    {IMPORT_ROW_SQL} WHERE import_id = ?;
+
+                    {BOOK_ROW_SQL} WHERE book_id IN (SELECT book_id FROM #line_items);
+
+                    DROP TABLE #line_items;
+                """, (import_id, import_id, import_id, import_id))
+                import_rows = cursor.fetchall()
+                book_rows = self._next_rows(cursor)
+
+            return {'imports': {'inserted': import_rows}, 'books': {'updated': book_rows}}
+
+        except Exception as e:
+            self.last_error = e
+            return False
+
+    @invalidates('imports', 'books')
+    def create_import_with_items(self, import_code: str, import_date, supplier, items):
+        """Tạo phiếu nhập kèm chi tiết; xóa phiếu vừa tạo nếu thêm chi tiết lỗi
+
+        Trả về các dòng đã thay đổi như add_import_items_bulk, None nếu không tạo được phiếu,
+        False nếu không thêm được chi tiết. import_code None: sinh mã theo quầy, trùng thì thử lại với mã mới.
+        """
+        generated = import_code is None
+        for _ in range(CODE_RETRIES):
+            if generated:
+                import_code = self.next_document_code('PN')
+            import_id = self.create_import(import_code, import_date, supplier)
+            if import_id or not (generated and isinstance(self.last_error, DuplicateCodeError)):
+                break
+        if not import_id:
+            return None
+
+        changes = self.add_import_items_bulk(import_id, items)
+        if not changes:
+            self.execute_query("DELETE FROM ImportBooks WHERE import_id = ?", (import_id,), fetch=False)
+            self.mongo_manager.delete_from_mongodb("imports", {"import_id": int(import_id)})
+            return False
+        return changes
+
+    @staticmethod
+    def _prepare_line_items(items):
+        """Chuẩn hóa (book_id, quantity, unit_price) thành dòng có subtotal"""
+        rows = []
+        for book_id, quantity, unit_price in items:
+            quantity, unit_price = int(quantity), float(unit_price)
+            if quantity <= 0:
+                return []
+            rows.append((int(book_id), quantity, unit_price, quantity * unit_price))
+        return rows
+
+    @staticmethod
+    def _stage_line_items(cursor, rows):
+        """Đẩy các dòng chi tiết vào bảng tạm #line_items bằng một lần executemany"""
+        cursor.execute("""
+            IF OBJECT_ID('tempdb..#line_items') IS NOT NULL DROP TABLE #line_items;
+            CREATE TABLE #line_items (
+                book_id INT NOT NULL,
+                quantity INT NOT NULL,
+                unit_price DECIMAL(10,2) NOT NULL,
+                subtotal DECIMAL(10,2) NOT NULL
+            );
+        """)
+        cursor.fast_executemany = True
+        cursor.executemany("""
+            INSERT INTO #line_items (book_id, quantity, unit_price, subtotal)
+            VALUES (?, ?, ?, ?)
+        """, rows)
+
+    @cached('imports')
     def get_all_imports(self):
         """Lấy tất cả phiếu nhập"""
+        try:
+            return list(self.iter_all_imports())
+        except Exception as e:
+            self.last_error = e
+            return []
+
+    def iter_all_imports(self, batch_size: int = 500):
+        """Duyệt phiếu nhập theo từng lô"""
+        return self.iter_query("""
+            SELECT import_id, import_code, import_date, supplier, total_amount
+            FROM ImportBooks ORDER BY import_date DESC
+        """, batch_size=batch_size)
+
+    def get_imports_page(self, after_key=None, page_size: int = 100):
+        """Lấy một trang phiếu nhập theo (import_date, import_id) giảm dần; trả về (rows, next_key)"""
+        try:
+            if after_key is None:
+                rows = self.execute_query("""
+                    SELECT TOP (?) import_id, import_code, import_date, supplier, total_amount
+                    FROM ImportBooks
+                    ORDER BY import_date DESC, import_id DESC
+                """, (page_size,))
+            else:
+                last_date, last_id = after_key
+                rows = self.execute_query("""
+                    SELECT TOP (?) import_id, import_code, import_date, supplier, total_amount
+                    FROM ImportBooks
+                    WHERE import_date < ?
+                       OR (import_date = ? AND import_id < ?)
+                    ORDER BY import_date DESC, import_id DESC
+                """, (page_size, last_date, last_date, last_id))
+
+            return self._page_result(rows, page_size, lambda row: (row[2], row[0]))
+        except Exception:
+            return [], None
+
+    @staticmethod
+    def _page_result(rows, page_size: int, key_of):
+        """Trả về (rows, next_key); next_key là None khi đã hết dữ liệu"""
+        rows = rows if rows else []
+        next_key = key_of(rows[-1]) if len(rows) == page_size else None
+        return rows, next_key
+
+    def get_count_hint(self, table: str) -> int:
+        """Số dòng ước lượng của bảng từ metadata, không quét bảng"""
+        if table not in ('Books', 'Customers', 'Orders', 'ImportBooks'):
+            return 0
+
         try:
             result = self.execute_query("""
-                SELECT import_id, import_code, import_date, supplier, total_amount
-                FROM ImportBooks ORDER BY import_date DESC
-            """)
-            return result if result else []
+                SELECT SUM(row_count)
+                FROM sys.dm_db_partition_stats
+                WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1)
+            """, (table,))
+
+            if result and result[0][0] is not None:
+                return int(result[0][0])
+
+            # Không có quyền VIEW DATABASE STATE thì đếm trực tiếp
+            result = self.execute_query(f"SELECT COUNT_BIG(*) FROM {table}")
+            return int(result[0][0]) if result else 0
         except Exception:
-            return []
+            return 0
 
     # ========== BÁO CÁO VÀ THỐNG KÊ ==========
+    @cached('orders', 'books')
     def get_best_selling_books(self, year: int = None, month: int = None, limit: int = 10):
         """Lấy sách bán chạy"""
         try:
@@ -759,6 +1683,10 @@ class DatabaseManager:
             else:
                 end_date = f"{year}-{month + 1:02d}-01"
 
+            result = self._mongo_report('best_selling_books', year, month, limit)
+            if result is not None:
+                return result
+
             return self.execute_query(f"""
                 SELECT TOP {limit} 
                     b.book_code, b.title, b.author, b.publisher,
@@ -773,7 +1701,8 @@ class DatabaseManager:
                 GROUP BY b.book_id, b.book_code, b.title, b.author, b.publisher
                 ORDER BY total_sold DESC
             """)
-        except Exception:
+        except Exception as e:
+            self.last_error = e
             return self.execute_query(f"""
                 SELECT TOP {limit} 
                     b.book_code, b.title, b.author, b.publisher,
@@ -787,6 +1716,86 @@ class DatabaseManager:
                 ORDER BY total_sold DESC
             """)
 
+    @cached('orders', 'books')
+    def get_monthly_top_sellers(self, top_n: int = 1, start_date=None, end_date=None):
+        """Top N sách bán chạy của từng tháng trong một truy vấn
+
+        Trả về các dòng (year, month, rank, book_code, title, author, publisher, total_sold, total_revenue),
+        sắp theo năm giảm dần, tháng tăng dần.
+        """
+        try:
+            conditions = ["o.status = 'Completed'"]
+            params = []
+            if start_date is not None:
+                if isinstance(start_date, date) and not isinstance(start_date, datetime):
+                    start_date = datetime.combine(start_date, datetime.min.time())
+                conditions.append("o.order_date >= ?")
+                params.append(start_date)
+            if end_date is not None:
+                if isinstance(end_date, date) and not isinstance(end_date, datetime):
+                    end_date = datetime.combine(end_date, datetime.max.time())
+                conditions.append("o.order_date <= ?")
+                params.append(end_date)
+            params.append(int(top_n))
+
+            result = self.execute_query(f"""
+                WITH monthly AS (
+                    SELECT YEAR(o.order_date) AS sales_year, MONTH(o.order_date) AS sales_month, od.book_id,
+                           SUM(od.quantity) AS total_sold, SUM(od.subtotal) AS total_revenue
+                    FROM Orders o
+                    JOIN OrderDetails od ON od.order_id = o.order_id
+                    WHERE {' AND '.join(conditions)}
+                    GROUP BY YEAR(o.order_date), MONTH(o.order_date), od.book_id
+                ), ranked AS (
+                    SELECT sales_year, sales_month, book_id, total_sold, total_revenue,
+                           ROW_NUMBER() OVER (PARTITION BY sales_year, sales_month
+                                              ORDER BY total_sold DESC, total_revenue DESC, book_id) AS sales_rank
+                    FROM monthly
+                )
+                SELECT r.sales_year, r.sales_month, r.sales_rank,
+                       b.book_code, b.title, b.author, b.publisher, r.total_sold, r.total_revenue
+                FROM ranked r
+                JOIN Books b ON b.book_id = r.book_id
+                WHERE r.sales_rank <= ?
+                ORDER BY r.sales_year DESC, r.sales_month, r.sales_rank
+            """, tuple(params), fetch=True)
+
+            return result if result else []
+        except Exception as e:
+            self.last_error = e
+            return []
+
+    @cached('books', 'customers', 'orders', ttl=10)
+    def get_dashboard_summary(self):
+        """Các chỉ số dashboard trong một truy vấn; doanh thu và số đơn hoàn thành đọc từ bảng tổng hợp"""
+        try:
+            result = self.execute_query("""
+                SELECT
+                    (SELECT COUNT_BIG(*) FROM Books) AS total_books,
+                    (SELECT COUNT_BIG(*) FROM Customers) AS total_customers,
+                    (SELECT ISNULL(SUM(order_count), 0) FROM RevenueMonthly) AS completed_orders,
+                    (SELECT ISNULL(SUM(revenue), 0) FROM RevenueMonthly) AS total_revenue,
+                    (SELECT COUNT_BIG(*) FROM Books WHERE quantity_in_stock < ?) AS low_stock_books,
+                    (SELECT COUNT_BIG(*) FROM Orders WHERE status = 'Pending') AS pending_orders
+            """, (DatabaseConfig.LOW_STOCK_THRESHOLD,), fetch=True)
+
+            if not result:
+                return None
+
+            total_books, total_customers, completed_orders, total_revenue, low_stock_books, pending_orders = result[0]
+            return {
+                'total_books': int(total_books),
+                'total_customers': int(total_customers),
+                'completed_orders': int(completed_orders),
+                'total_revenue': float(total_revenue),
+                'low_stock_books': int(low_stock_books),
+                'pending_orders': int(pending_orders)
+            }
+        except Exception as e:
+            self.last_error = e
+            return None
+
+    @cached('books')
     def get_inventory_by_publisher(self):
         """Lấy tồn kho theo nhà xuất bản"""
         try:
@@ -803,9 +1812,11 @@ class DatabaseManager:
             """, fetch=True)
 
             return result if result else []
-        except Exception:
+        except Exception as e:
+            self.last_error = e
             return []
 
+    @cached('orders', 'customers')
     def get_regular_customers(self, min_orders=2):
         """Lấy khách hàng thường xuyên"""
         try:
@@ -823,33 +1834,43 @@ class DatabaseManager:
             """, fetch=True)
 
             return result if result else []
-        except Exception:
+        except Exception as e:
+            self.last_error = e
             return []
 
+    @cached('orders', 'books')
     def get_revenue_by_book(self):
         """Lấy doanh thu theo từng sách"""
         try:
-            result = self.execute_query("""
-                SELECT 
-                    b.book_code, b.title, b.author, b.publisher,
-                    COUNT(DISTINCT o.order_id) as order_count,
-                    SUM(od.quantity) as total_sold,
-                    SUM(od.subtotal) as total_revenue
-                FROM Books b
-                LEFT JOIN OrderDetails od ON b.book_id = od.book_id
-                LEFT JOIN Orders o ON od.order_id = o.order_id AND o.status = 'Completed'
-                WHERE od.quantity IS NOT NULL
-                GROUP BY b.book_id, b.book_code, b.title, b.author, b.publisher 
-                ORDER BY total_revenue DESC
-            """, fetch=True)
-
-            return result if result else []
-        except Exception:
+            return list(self.iter_revenue_by_book())
+        except Exception as e:
+            self.last_error = e
             return []
 
+    def iter_revenue_by_book(self, batch_size: int = 500):
+        """Duyệt doanh thu theo từng sách theo từng lô"""
+        return self.iter_query("""
+            SELECT 
+                b.book_code, b.title, b.author, b.publisher,
+                COUNT(DISTINCT o.order_id) as order_count,
+                SUM(od.quantity) as total_sold,
+                SUM(od.subtotal) as total_revenue
+            FROM Books b
+            LEFT JOIN OrderDetails od ON b.book_id = od.book_id
+            LEFT JOIN Orders o ON od.order_id = o.order_id AND o.status = 'Completed'
+            WHERE od.quantity IS NOT NULL
+            GROUP BY b.book_id, b.book_code, b.title, b.author, b.publisher 
+            ORDER BY total_revenue DESC
+        """, batch_size=batch_size)
+
+    @cached('orders', 'customers')
     def get_customers_by_purchases(self, limit: int = 10):
         """Lấy khách hàng mua nhiều nhất"""
         try:
+            result = self._mongo_report('customers_by_purchases', limit)
+            if result is not None:
+                return result
+
             result = self.execute_query(f"""
                 SELECT TOP ({limit}) 
                     c.customer_code, c.full_name, c.phone_number,
@@ -864,19 +1885,26 @@ class DatabaseManager:
             """, fetch=True)
 
             return result if result else []
-        except Exception:
+        except Exception as e:
+            self.last_error = e
             return []
 
+    def _mongo_report(self, name, *args):
+        """Chạy báo cáo trên MongoDB nếu được bật trong MONGO_REPORTS; None nếu không dùng được"""
+        if not DatabaseConfig.MONGO_REPORTS.get(name) or self.mongo_manager.reports is None:
+            return None
+        return getattr(self.mongo_manager.reports, name)(*args)
+
+    def get_cache_stats(self):
+        """Thống kê hit/miss của cache truy vấn"""
+        return self.cache.stats()
+
     def close(self):
         """Đóng kết nối database"""
         try:
-            if self.connection:
-                self.connection.close()
+            if self.pool:
+                self.pool.close()
         except Exception:
             pass
 
-        try:
-            if self.mongo_manager.client:
-                self.mongo_manager.client.close()
-        except Exception:
-            pass
+        self.mongo_manager.close()
@@ -0,0 +1,154 @@
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+
+# Mốc thời gian của mã chứng từ; 12 chữ số mili giây đủ dùng khoảng 31 năm kể từ mốc
+CODE_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+# Số lần thử lại với mã mới khi mã tự sinh bị trùng (hai máy cùng mã quầy, đồng hồ lùi qua lần chạy trước)
+CODE_RETRIES = 3
+
+# Đăng ký mã quầy cho máy đang chạy trong bảng Terminals (BSM_Create.sql).
+# Tham số: tên máy, mã quầy muốn dùng (NULL: dùng mã đã đăng ký của máy hoặc cấp mã trống nhỏ nhất), mã lớn nhất.
+REGISTER_TERMINAL_SQL = """
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    DECLARE @machine NVARCHAR(128) = ?, @wanted INT = ?, @max_id INT = ?;
+    DECLARE @terminal_id INT, @owner NVARCHAR(128), @message NVARCHAR(300);
+
+    -- Khóa cả bảng: hai máy khởi động cùng lúc không nhận cùng một mã
+    SELECT TOP (1) @terminal_id = terminal_id
+    FROM Terminals WITH (TABLOCKX, HOLDLOCK)
+    WHERE machine_name = @machine AND (@wanted IS NULL OR terminal_id = @wanted)
+    ORDER BY terminal_id;
+
+    IF @terminal_id IS NULL AND @wanted IS NOT NULL
+    BEGIN
+        SELECT @owner = machine_name FROM Terminals WHERE terminal_id = @wanted;
+        IF @owner IS NOT NULL
+        BEGIN
+            SET @message = CONCAT(N'Mã quầy ', @wanted, N' đã được máy ', @owner, N' đăng ký');
+            THROW 50020, @message, 1;
+        END
+        SET @terminal_id = @wanted;
+        INSERT INTO Terminals (terminal_id, machine_name) VALUES (@terminal_id, @machine);
+    END
+    ELSE IF @terminal_id IS NULL
+    BEGIN
+        SELECT @terminal_id = MIN(n.terminal_id)
+        FROM (SELECT 1 AS terminal_id UNION ALL SELECT terminal_id + 1 FROM Terminals) n
+        WHERE n.terminal_id <= @max_id
+          AND NOT EXISTS (SELECT 1 FROM Terminals t WHERE t.terminal_id = n.terminal_id);
+
+        IF @terminal_id IS NULL
+            THROW 50021, N'Đã hết mã quầy trống trong bảng Terminals', 1;
+        INSERT INTO Terminals (terminal_id, machine_name) VALUES (@terminal_id, @machine);
+    END
+
+    UPDATE Terminals SET last_seen_at = SYSUTCDATETIME() WHERE terminal_id = @terminal_id;
+    SELECT @terminal_id;
+"""
+
+
+class TerminalConflictError(Exception):
+    """Mã quầy cấu hình cho máy này đã được máy khác đăng ký"""
+
+
+class DuplicateCodeError(Exception):
+    """Mã (chứng từ, sách, khách hàng) đã tồn tại"""
+
+
+def is_duplicate_key(error, value) -> bool:
+    """Lỗi vi phạm UNIQUE của SQL Server (2627 / 2601) trên đúng giá trị value"""
+    message = str(error)
+    return "duplicate key" in message.lower() and str(value) in message
+
+
+def register_terminal(conn, terminal_id=None, machine_name=None) -> int:
+    """Đăng ký máy đang chạy trong bảng Terminals, trả về mã quầy dùng cho DocumentCodeGenerator
+
+    terminal_id None: dùng mã máy này đã đăng ký, chưa có thì cấp mã trống nhỏ nhất.
+    Ném TerminalConflictError nếu terminal_id đã thuộc về máy khác.
+    """
+    machine_name = machine_name or socket.gethostname()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(REGISTER_TERMINAL_SQL, (machine_name, terminal_id, DocumentCodeGenerator.MAX_TERMINAL_ID))
+        registered = int(cursor.fetchone()[0])
+        conn.commit()
+        return registered
+    except Exception as e:
+        conn.rollback()
+        if "50020" in str(e):
+            raise TerminalConflictError(
+                f"Mã quầy {terminal_id} đã được máy khác đăng ký; đặt BSM_TERMINAL_ID khác cho máy "
+                f"{machine_name} hoặc bỏ trống để tự cấp") from e
+        raise
+    finally:
+        cursor.close()
+
+
+class DocumentCodeGenerator:
+    """Sinh mã chứng từ kiểu snowflake, không cần truy vấn CSDL
+
+    Mã = tiền tố 2 ký tự + 12 chữ số mili giây từ CODE_EPOCH + 3 chữ số mã quầy + 3 chữ số thứ tự,
+    ví dụ DH024512345678901002 (20 ký tự, vừa VARCHAR(20)). Mã cùng tiền tố tăng dần theo thời gian
+    nên sắp xếp chuỗi cũng là sắp theo thứ tự tạo. Mỗi quầy tạo được 1000 mã mỗi mili giây; khi hết
+    thứ tự thì chờ sang mili giây kế tiếp; khi đồng hồ chạy lùi thì chờ đồng hồ vượt mili giây đã cấp
+    gần nhất (lùi quá MAX_CLOCK_WAIT giây thì báo lỗi), nên không bao giờ trùng với mã đã cấp trong cùng
+    tiến trình. Hai quầy chỉ không trùng mã khi có terminal_id khác nhau (register_terminal).
+    """
+
+    MAX_TERMINAL_ID = 999
+    MAX_SEQUENCE = 999
+    MAX_CLOCK_WAIT = 5.0
+
+    def __init__(self, terminal_id: int, epoch: datetime = CODE_EPOCH):
+        if not 0 <= terminal_id <= self.MAX_TERMINAL_ID:
+            raise ValueError(f"terminal_id phải nằm trong khoảng 0..{self.MAX_TERMINAL_ID}")
+
+        self.terminal_id = terminal_id
+        self._epoch_ms = int(epoch.timestamp() * 1000)
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _now_ms(self):
+        return int(time.time() * 1000) - self._epoch_ms
+
+    def _wait_until(self, target_ms):
+        """Chờ đồng hồ tới target_ms, trả về mili giây hiện tại"""
+        now_ms = self._now_ms()
+        while now_ms < target_ms:
+            time.sleep((target_ms - now_ms) / 1000)
+            now_ms = self._now_ms()
+        return now_ms
+
+    def _next_id(self):
+        with self._lock:
+            now_ms = self._now_ms()
+            if now_ms < self._last_ms:
+                behind = (self._last_ms - now_ms) / 1000
+                if behind > self.MAX_CLOCK_WAIT:
+                    raise RuntimeError(f"Đồng hồ hệ thống chạy lùi {behind:.1f}s, không sinh được mã chứng từ")
+                now_ms = self._wait_until(self._last_ms)
+
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            elif self._sequence < self.MAX_SEQUENCE:
+                self._sequence += 1
+            else:
+                self._last_ms = self._wait_until(self._last_ms + 1)
+                self._sequence = 0
+            return self._last_ms, self._sequence
+
+    def next_code(self, prefix: str) -> str:
+        """Sinh mã mới, ví dụ next_code('DH') cho đơn hàng, next_code('PN') cho phiếu nhập"""
+        if len(prefix) != 2:
+            raise ValueError("Tiền tố mã chứng từ phải có đúng 2 ký tự")
+
+        timestamp, sequence = self._next_id()
+        return f"{prefix}{timestamp:012d}{self.terminal_id:03d}{sequence:03d}"
@@ -1,7 +1,13 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from database_manager import DatabaseManager
-import random
+from document_codes import TerminalConflictError
+from widgets import PagedTreeLoader, TypeaheadCombobox, VirtualTreeview
+from background_worker import BackgroundWorker
+from config import DatabaseConfig
+import threading
+import traceback
+import uuid
 from datetime import datetime, timedelta
 
 class ModernBookStoreSystem:
@@ -13,19 +19,57 @@ class ModernBookStoreSystem:
 
         self.center_window()
         self.setup_styles()
-        self.db = DatabaseManager()
+        try:
+            self.db = DatabaseManager()
+        except TerminalConflictError as e:
+            messagebox.showerror("Lỗi", str(e))
+            raise SystemExit(1)
+        # Dựng chỉ mục tìm kiếm sách / khách hàng ở luồng nền
+        self.db.get_book_index()
+        self.db.get_customer_index()
+        self.worker = BackgroundWorker(self.root)
+        self.root.report_callback_exception = self.report_callback_exception
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # Khởi tạo dữ liệu
         self.current_order_items = []
         self.current_import_items = []
-        self.books_data = []
-        self.customers_data = []
+        self.cart_id = uuid.uuid4().hex
 
         self.create_header()
         self.create_main_interface()
         self.update_clock()
+        self.auto_refresh_sync_mode()
         self.books_notebook = None
 
+    def on_close(self):
+        """Dừng luồng nền, trả lại tồn kho đang giữ, đóng kết nối và thoát"""
+        self.worker.shutdown()
+        if self.current_order_items:
+            # Chỉ chờ trả kho trong thời gian ngắn: database chậm / mất kết nối không được treo cửa sổ,
+            # giữ chỗ chưa trả được sẽ tự hết hạn sau STOCK_HOLD_TTL (release_expired_holds)
+            releaser = threading.Thread(target=self.release_cart_on_close, daemon=True)
+            releaser.start()
+            releaser.join(DatabaseConfig.CLOSE_RELEASE_TIMEOUT)
+            if releaser.is_alive():
+                print(f"Chưa trả được tồn kho của giỏ {self.cart_id} sau "
+                      f"{DatabaseConfig.CLOSE_RELEASE_TIMEOUT}s, giữ chỗ sẽ tự hết hạn")
+        self.db.close()
+        self.root.destroy()
+
+    def release_cart_on_close(self):
+        """Trả tồn kho của giỏ hàng khi đóng ứng dụng; lỗi chỉ được ghi lại vì giữ chỗ sẽ tự hết hạn"""
+        try:
+            if self.db.release_stock(self.cart_id) is False:
+                print(f"Không trả được tồn kho của giỏ {self.cart_id}: {self.db.last_error}")
+        except Exception as e:
+            print(f"Không trả được tồn kho của giỏ {self.cart_id}: {e}")
+
+    def report_callback_exception(self, exc_type, exc_value, exc_traceback):
+        """Lỗi trong callback giao diện (kể cả kết quả từ luồng nền): in traceback và báo cho người dùng"""
+        traceback.print_exception(exc_type, exc_value, exc_traceback)
+        messagebox.showerror("Lỗi", f"Lỗi giao diện: {exc_value}")
+
     # ========== STYLE ==========
     def center_window(self):
         """Căn giữa cửa sổ"""
@@ -127,6 +171,7 @@ class ModernBookStoreSystem:
 
         value_label = tk.Label(value_frame, text=value, font=('Segoe UI', 18, 'bold'), bg='white', fg='#2C5282')
         value_label.pack(side='left')
+        card.value_label = value_label
 
         return card
 
@@ -140,26 +185,26 @@ class ModernBookStoreSystem:
         stats_frame = ttk.Frame(dashboard_tab, style='Modern.TFrame')
         stats_frame.pack(fill='x', padx=10, pady=10)
 
-        try:
-            total_books = len(self.db.get_all_books() or [])
-            total_customers = len(self.db.get_all_customers() or [])
-            total_orders = len(self.db.get_all_orders() or [])
-            revenue_data = self.db.get_revenue_by_book()
-            total_revenue = sum(row[-1] for row in revenue_data) if revenue_data else 0
-        except:
-            total_books = total_customers = total_orders = total_revenue = 0
-
         stats = [
-            ("📊 Tổng sách", f"{total_books:,}", '#4A90E2'),
-            ("👥 Khách hàng", f"{total_customers:,}", '#7BAAF7'),
-            ("🛒 Đơn hàng", f"{total_orders:,}", '#A8D1FF'),
-            ("💰 Doanh thu", f"{total_revenue:,.0f} đ", '#63B3ED')
+            ("📊 Tổng sách", '#4A90E2'),
+            ("👥 Khách hàng", '#7BAAF7'),
+            ("🛒 Đơn hoàn thành", '#A8D1FF'),
+            ("💰 Doanh thu", '#63B3ED'),
+            ("⚠️ Sắp hết hàng", '#F6AD55'),
+            ("⏳ Đơn chờ xử lý", '#90CDF4')
         ]
 
-        for i, (title, value, color) in enumerate(stats):
-            card = self.create_stat_card(stats_frame, title, value, color)
+        self.dashboard_cards = []
+        for i, (title, color) in enumerate(stats):
+            card = self.create_stat_card(stats_frame, title, "...", color)
             card.grid(row=0, column=i, padx=10, pady=10, sticky='nsew')
             stats_frame.columnconfigure(i, weight=1)
+            self.dashboard_cards.append(card)
+
+        self.mongo_status = tk.Label(dashboard_tab, text="", font=('Segoe UI', 10), bg='#F0F8FF', fg='#C53030')
+        self.mongo_status.pack(anchor='e', padx=15)
+
+        self.auto_refresh_dashboard()
 
         # Thao tác nhanh
         actions_frame = ttk.LabelFrame(dashboard_tab, text="🚀 Thao tác nhanh", style='Card.TFrame')
@@ -178,6 +223,64 @@ class ModernBookStoreSystem:
             btn.grid(row=0, column=i, padx=10, pady=15, sticky='ew')
             actions_frame.columnconfigure(i, weight=1)
 
+    def refresh_dashboard(self):
+        """Tính số liệu dashboard trên luồng nền"""
+        self.worker.submit('dashboard', self.db.get_dashboard_summary,
+                           on_success=self.display_dashboard_stats)
+
+    def auto_refresh_dashboard(self):
+        """Cập nhật dashboard định kỳ, bỏ qua lượt này nếu lần trước chưa xong"""
+        if not self.worker.is_pending('dashboard'):
+            self.refresh_dashboard()
+        self.worker.submit('release_expired_holds', self.db.release_expired_holds)
+        self.update_mongo_status()
+        self.root.after(DatabaseConfig.DASHBOARD_REFRESH_INTERVAL * 1000, self.auto_refresh_dashboard)
+
+    def auto_refresh_sync_mode(self):
+        """Đọc lại định kỳ chế độ đồng bộ MongoDB (ghi trực tiếp / qua outbox) do mongo_replicator.py đặt"""
+        self.worker.submit('sync_mode', self.db.refresh_sync_mode)
+        self.root.after(DatabaseConfig.SYNC_MODE_REFRESH_INTERVAL * 1000, self.auto_refresh_sync_mode)
+
+    def update_mongo_status(self):
+        """Cảnh báo trên dashboard khi thiếu collection / index MongoDB, hoặc hàng đợi ghi đang thử lại
+        hay đã bỏ thao tác"""
+        lines = []
+
+        setup_errors = self.db.mongo_manager.setup_errors
+        if setup_errors:
+            error = next(iter(setup_errors.values()))
+            lines.append(f"⚠️ MongoDB: không tạo được collection / index {', '.join(setup_errors)} "
+                         f"(lỗi: {str(error)[:80]})")
+
+        stats = self.db.mongo_manager.write_stats()
+        if stats and (stats['dropped'] or stats['failed'] or stats['retrying']):
+            text = (f"⚠️ Đồng bộ MongoDB: {stats['retrying']:,} thao tác đang thử lại, "
+                    f"{stats['dropped']:,} bị bỏ do hàng đợi đầy, {stats['failed']:,} lỗi")
+            if stats['dropped'] or stats['failed']:
+                text += " - chạy mongo_incremental_sync.py để đồng bộ lại"
+            if stats['last_error']:
+                text += f" (lỗi gần nhất: {stats['last_error'][:80]})"
+            lines.append(text)
+
+        self.mongo_status.configure(text="\n".join(lines))
+
+    def display_dashboard_stats(self, summary):
+        """Cập nhật giá trị các card dashboard tại chỗ"""
+        if not summary:
+            return
+
+        values = [
+            f"{summary['total_books']:,}",
+            f"{summary['total_customers']:,}",
+            f"{summary['completed_orders']:,}",
+            f"{summary['total_revenue']:,.0f} đ",
+            f"{summary['low_stock_books']:,}",
+            f"{summary['pending_orders']:,}"
+        ]
+
+        for card, value in zip(self.dashboard_cards, values):
+            card.value_label.configure(text=value)
+
     # ========== QUẢN LÝ SÁCH ==========
     def create_books_tab(self):
         """Tab quản lý sách"""
@@ -211,7 +314,8 @@ class ModernBookStoreSystem:
             ("💾 Thêm sách", self.add_book),
             ("✏️ Cập nhật", self.update_book),
             ("🗑️ Xóa", self.delete_book),
-            ("🔄 Làm mới", self.clear_book_form)
+            ("🔄 Làm mới", self.clear_book_form),
+            ("📥 Tải lại", self.load_books)
         ]
 
         for i, (text, command) in enumerate(buttons):
@@ -285,15 +389,22 @@ class ModernBookStoreSystem:
             self.books_tree.heading(col, text=col)
             self.books_tree.column(col, width=width, anchor=anchor)
 
-        v_scroll = ttk.Scrollbar(table_frame, orient='vertical', command=self.books_tree.yview)
+        v_scroll = ttk.Scrollbar(table_frame, orient='vertical')
         h_scroll = ttk.Scrollbar(table_frame, orient='horizontal', command=self.books_tree.xview)
-        self.books_tree.configure(yscrollcommand=v_scroll.set, xscrollcommand=h_scroll.set)
+        self.books_tree.configure(xscrollcommand=h_scroll.set)
 
         self.books_tree.pack(side='left', fill='both', expand=True)
         v_scroll.pack(side='right', fill='y')
         h_scroll.pack(side='bottom', fill='x')
 
-        self.books_tree.bind('<<TreeviewSelect>>', self.on_book_select)
+        self.books_status = tk.Label(parent, text="", font=('Segoe UI', 10), bg='#F0F8FF', fg='#64748B')
+        self.books_status.pack(anchor='e', padx=15)
+
+        self.books_loader = PagedTreeLoader(self.books_tree, v_scroll, self.db.get_books_page, self.format_book_row,
+                                            worker=self.worker, key='load_books',
+                                            count_hint=lambda: self.db.get_count_hint('Books'),
+                                            status_label=self.books_status)
+        self.books_loader.view.bind_select(self.on_book_select)
         self.load_books()
 
     def create_book_search(self, parent):
@@ -385,55 +496,87 @@ class ModernBookStoreSystem:
             self.search_books_tree.heading(col, text=col)
             self.search_books_tree.column(col, width=width, anchor=anchor)
 
-        v_scroll = ttk.Scrollbar(result_frame, orient='vertical', command=self.search_books_tree.yview)
+        v_scroll = ttk.Scrollbar(result_frame, orient='vertical')
         h_scroll = ttk.Scrollbar(result_frame, orient='horizontal', command=self.search_books_tree.xview)
-        self.search_books_tree.configure(yscrollcommand=v_scroll.set, xscrollcommand=h_scroll.set)
+        self.search_books_tree.configure(xscrollcommand=h_scroll.set)
 
         self.search_books_tree.pack(side='left', fill='both', expand=True)
         v_scroll.pack(side='right', fill='y')
         h_scroll.pack(side='bottom', fill='x')
 
-        self.search_books_tree.bind('<<TreeviewSelect>>', self.on_search_book_select)
+        self.search_books_view = VirtualTreeview(self.search_books_tree, v_scroll, self.format_book_row,
+                                                 row_key=lambda book: book[0])
+        self.search_books_view.bind_select(self.on_search_book_select)
 
     def load_books(self):
-        """Tải danh sách sách"""
-        for item in self.books_tree.get_children():
-            self.books_tree.delete(item)
-
+        """Tải danh sách sách (trang đầu, các trang sau tải khi cuộn)"""
         try:
-            books = self.db.get_all_books()
-            if books:
-                for i, book in enumerate(books):
-                    if len(book) >= 8:
-                        formatted_book = list(book)
-
-                        try:
-                            price = float(book[7])
-                            formatted_book[7] = f"{price:,.0f}₫"
-                        except:
-                            formatted_book[7] = "0₫"
-
-                        try:
-                            quantity = int(book[6])
-                            formatted_book[6] = f"{quantity:,}"
-                        except:
-                            formatted_book[6] = "0"
-
-                        tag = 'even' if i % 2 == 0 else 'odd'
-                        self.books_tree.insert('', 'end', values=formatted_book, tags=(tag,))
-
-                self.books_tree.tag_configure('even', background='#FFFFFF')
-                self.books_tree.tag_configure('odd', background='#F8FAFC')
+            self.books_loader.reload()
         except Exception:
             pass
 
-    def load_books_to_search_table(self):
-        """Tải tất cả sách vào bảng tìm kiếm"""
+    def apply_row_changes(self, changes):
+        """Cập nhật tại chỗ các bảng danh sách theo dòng thay đổi do thao tác ghi trả về"""
+        if not isinstance(changes, dict):
+            return
+
+        loaders = {
+            'books': self.books_loader,
+            'customers': self.customers_loader,
+            'orders': self.orders_loader,
+            'imports': self.imports_loader
+        }
+        for table, change in changes.items():
+            loader = loaders.get(table)
+            if loader is not None:
+                try:
+                    loader.apply_changes(**change)
+                except Exception:
+                    loader.reload()
+
+    def format_book_row(self, book):
+        """Định dạng một dòng sách để hiển thị"""
+        if len(book) < 8:
+            return None
+
+        formatted_book = list(book)
+
         try:
-            books = self.db.get_all_books()
-            self.display_search_results(books)
-        except Exception:
-            pass
+            price = float(book[7])
+            formatted_book[7] = f"{price:,.0f}₫"
+        except:
+            formatted_book[7] = "0₫"
+
+        try:
+            quantity = int(book[6])
+            formatted_book[6] = f"{quantity:,}"
+        except:
+            formatted_book[6] = "0"
+
+        return formatted_book
+
+    def load_books_to_search_table(self):
+        """Tải tất cả sách vào bảng tìm kiếm (trên luồng nền)"""
+        self.worker.submit('search_books', self.db.get_all_books, on_success=self.display_search_results,
+                           on_error=lambda e: messagebox.showerror("Lỗi", "Lỗi khi tải danh sách sách!"))
+
+    def submit_write(self, key, func, *args, success_message, failure_message, error_message, on_done=None):
+        """Chạy thao tác ghi trên luồng nền; báo kết quả và cập nhật các bảng trên luồng giao diện"""
+        if self.worker.is_pending(key):
+            return
+
+        def done(result):
+            if not result:
+                messagebox.showerror("Lỗi", failure_message)
+                return
+            messagebox.showinfo("Thành công", success_message)
+            if on_done:
+                on_done()
+            self.apply_row_changes(result)
+            self.load_combo_data()
+
+        self.worker.submit(key, func, *args, on_success=done,
+                           on_error=lambda e: messagebox.showerror("Lỗi", error_message))
 
     def add_book(self):
         """Thêm sách mới"""
@@ -452,14 +595,11 @@ class ModernBookStoreSystem:
                 messagebox.showerror("Lỗi", "Vui lòng điền đầy đủ thông tin bắt buộc!")
                 return
 
-            result = self.db.add_book(book_data)
-            if result:
-                messagebox.showinfo("Thành công", "Thêm sách thành công!")
-                self.clear_book_form()
-                self.load_books()
-                self.load_combo_data()
-            else:
-                messagebox.showerror("Lỗi", "Không thể thêm sách! Có thể mã sách đã tồn tại.")
+            self.submit_write('save_book', self.db.add_book, book_data,
+                              success_message="Thêm sách thành công!",
+                              failure_message="Không thể thêm sách! Có thể mã sách đã tồn tại.",
+                              error_message="Lỗi khi thêm sách!",
+                              on_done=self.clear_book_form)
         except ValueError:
             messagebox.showerror("Lỗi", "Số lượng và giá phải là số!")
         except Exception:
@@ -477,13 +617,10 @@ class ModernBookStoreSystem:
                 float(self.book_price.get()),
                 self.book_code.get()
             )
-            result = self.db.update_book(book_data)
-            if result:
-                messagebox.showinfo("Thành công", "Cập nhật sách thành công!")
-                self.load_books()
-                self.load_combo_data()
-            else:
-                messagebox.showerror("Lỗi", "Không thể cập nhật sách!")
+            self.submit_write('save_book', self.db.update_book, book_data,
+                              success_message="Cập nhật sách thành công!",
+                              failure_message="Không thể cập nhật sách!",
+                              error_message="Lỗi khi cập nhật sách!")
         except ValueError:
             messagebox.showerror("Lỗi", "Số lượng và giá phải là số!")
         except Exception:
@@ -492,14 +629,11 @@ class ModernBookStoreSystem:
     def delete_book(self):
         """Xóa sách"""
         if messagebox.askyesno("Xác nhận", "Bạn có chắc chắn muốn xóa sách này?"):
-            result = self.db.delete_book(self.book_code.get())
-            if result:
-                messagebox.showinfo("Thành công", "Xóa sách thành công!")
-                self.clear_book_form()
-                self.load_books()
-                self.load_combo_data()
-            else:
-                messagebox.showerror("Lỗi", "Không thể xóa sách!")
+            self.submit_write('save_book', self.db.delete_book, self.book_code.get(),
+                              success_message="Xóa sách thành công!",
+                              failure_message="Không thể xóa sách!",
+                              error_message="Lỗi khi xóa sách!",
+                              on_done=self.clear_book_form)
 
     def clear_book_form(self):
         """Làm mới form sách"""
@@ -521,53 +655,33 @@ class ModernBookStoreSystem:
             min_price = self.search_min_price.get().strip()
             max_price = self.search_max_price.get().strip()
 
-            result = self.db.search_books(
-                title=book_name,
-                book_code=book_code,
-                author=author,
-                publisher=publisher,
-                publish_year=year_str,
-                min_price=min_price,
-                max_price=max_price
-            )
-
-            self.display_search_results(result)
-
-            if not result:
-                messagebox.showinfo("Thông báo", "Không tìm thấy sách phù hợp!")
+            self.worker.submit('search_books', self.db.search_books,
+                               title=book_name,
+                               book_code=book_code,
+                               author=author,
+                               publisher=publisher,
+                               publish_year=year_str,
+                               min_price=min_price,
+                               max_price=max_price,
+                               on_success=self.on_books_searched,
+                               on_error=lambda e: messagebox.showerror("Lỗi", "Lỗi khi tìm kiếm!"))
         except ValueError:
             messagebox.showerror("Lỗi", "Vui lòng nhập đúng định dạng số!")
         except Exception:
             messagebox.showerror("Lỗi", "Lỗi khi tìm kiếm!")
 
+    def on_books_searched(self, result):
+        """Hiển thị kết quả tìm kiếm sách trả về từ luồng nền"""
+        self.display_search_results(result)
+
+        if not result:
+            messagebox.showinfo("Thông báo", "Không tìm thấy sách phù hợp!")
+
     def display_search_results(self, books):
         """Hiển thị kết quả tìm kiếm"""
-        for item in self.search_books_tree.get_children():
-            self.search_books_tree.delete(item)
+        self.search_books_view.set_rows([book for book in books or [] if len(book) >= 8])
 
         if books:
-            for i, book in enumerate(books):
-                if len(book) >= 8:
-                    formatted_book = list(book)
-
-                    try:
-                        price = float(book[7])
-                        formatted_book[7] = f"{price:,.0f}₫"
-                    except:
-                        formatted_book[7] = "0₫"
-
-                    try:
-                        quantity = int(book[6])
-                        formatted_book[6] = f"{quantity:,}"
-                    except:
-                        formatted_book[6] = "0"
-
-                    tag = 'even' if i % 2 == 0 else 'odd'
-                    self.search_books_tree.insert('', 'end', values=formatted_book, tags=(tag,))
-
-            self.search_books_tree.tag_configure('even', background='#FFFFFF')
-            self.search_books_tree.tag_configure('odd', background='#F8FAFC')
-
             messagebox.showinfo("Thông báo", f"Tìm thấy {len(books)} sách phù hợp!")
 
     def clear_search_books(self):
@@ -580,8 +694,7 @@ class ModernBookStoreSystem:
         self.search_min_price.delete(0, tk.END)
         self.search_max_price.delete(0, tk.END)
 
-        for item in self.search_books_tree.get_children():
-            self.search_books_tree.delete(item)
+        self.search_books_view.clear()
 
     def show_all_books(self):
         """Hiển thị tất cả sách"""
@@ -705,36 +818,29 @@ class ModernBookStoreSystem:
             self.customers_tree.heading(col, text=col)
             self.customers_tree.column(col, width=width, anchor=anchor)
 
-        v_scroll = ttk.Scrollbar(table_frame, orient='vertical', command=self.customers_tree.yview)
+        v_scroll = ttk.Scrollbar(table_frame, orient='vertical')
         h_scroll = ttk.Scrollbar(table_frame, orient='horizontal', command=self.customers_tree.xview)
-        self.customers_tree.configure(yscrollcommand=v_scroll.set, xscrollcommand=h_scroll.set)
+        self.customers_tree.configure(xscrollcommand=h_scroll.set)
 
         self.customers_tree.pack(side='left', fill='both', expand=True)
         v_scroll.pack(side='right', fill='y')
         h_scroll.pack(side='bottom', fill='x')
 
-        self.customers_tree.bind('<<TreeviewSelect>>', self.on_customer_select)
+        self.customers_status = tk.Label(parent, text="", font=('Segoe UI', 10), bg='#F0F8FF', fg='#64748B')
+        self.customers_status.pack(anchor='e', padx=15)
+
+        self.customers_loader = PagedTreeLoader(self.customers_tree, v_scroll, self.db.get_customers_page,
+                                                lambda customer: list(customer)[:5] if len(customer) >= 5 else None,
+                                                worker=self.worker, key='load_customers',
+                                                count_hint=lambda: self.db.get_count_hint('Customers'),
+                                                status_label=self.customers_status)
+        self.customers_loader.view.bind_select(self.on_customer_select)
         self.load_customers()
 
     def load_customers(self):
-        """Tải danh sách khách hàng"""
-        for item in self.customers_tree.get_children():
-            self.customers_tree.delete(item)
-
+        """Tải danh sách khách hàng (trang đầu, các trang sau tải khi cuộn)"""
         try:
-            customers = self.db.get_all_customers()
-            if customers:
-                for i, customer in enumerate(customers):
-                    if len(customer) >= 5:
-                        formatted_customer = list(customer)
-                        if len(formatted_customer) > 5:
-                            formatted_customer = formatted_customer[:5]
-
-                        tag = 'even' if i % 2 == 0 else 'odd'
-                        self.customers_tree.insert('', 'end', values=formatted_customer, tags=(tag,))
-
-                self.customers_tree.tag_configure('even', background='#FFFFFF')
-                self.customers_tree.tag_configure('odd', background='#F8FAFC')
+            self.customers_loader.reload()
         except Exception:
             pass
 
@@ -752,14 +858,11 @@ class ModernBookStoreSystem:
                 messagebox.showerror("Lỗi", "Vui lòng điền mã KH và họ tên!")
                 return
 
-            result = self.db.add_customer(customer_data)
-            if result:
-                messagebox.showinfo("Thành công", "Thêm khách hàng thành công!")
-                self.clear_customer_form()
-                self.load_customers()
-                self.load_combo_data()
-            else:
-                messagebox.showerror("Lỗi", "Không thể thêm khách hàng!")
+            self.submit_write('save_customer', self.db.add_customer, customer_data,
+                              success_message="Thêm khách hàng thành công!",
+                              failure_message="Không thể thêm khách hàng! Có thể mã khách hàng đã tồn tại.",
+                              error_message="Lỗi khi thêm khách hàng!",
+                              on_done=self.clear_customer_form)
         except Exception:
             messagebox.showerror("Lỗi", "Lỗi khi thêm khách hàng!")
 
@@ -772,27 +875,21 @@ class ModernBookStoreSystem:
                 self.customer_phone.get(),
                 self.customer_code.get()
             )
-            result = self.db.update_customer(customer_data)
-            if result:
-                messagebox.showinfo("Thành công", "Cập nhật khách hàng thành công!")
-                self.load_customers()
-                self.load_combo_data()
-            else:
-                messagebox.showerror("Lỗi", "Không thể cập nhật khách hàng!")
+            self.submit_write('save_customer', self.db.update_customer, customer_data,
+                              success_message="Cập nhật khách hàng thành công!",
+                              failure_message="Không thể cập nhật khách hàng!",
+                              error_message="Lỗi khi cập nhật khách hàng!")
         except Exception:
             messagebox.showerror("Lỗi", "Lỗi khi cập nhật khách hàng!")
 
     def delete_customer(self):
         """Xóa khách hàng"""
         if messagebox.askyesno("Xác nhận", "Bạn có chắc chắn muốn xóa khách hàng này?"):
-            result = self.db.delete_customer(self.customer_code.get())
-            if result:
-                messagebox.showinfo("Thành công", "Xóa khách hàng thành công!")
-                self.clear_customer_form()
-                self.load_customers()
-                self.load_combo_data()
-            else:
-                messagebox.showerror("Lỗi", "Không thể xóa khách hàng!")
+            self.submit_write('save_customer', self.db.delete_customer, self.customer_code.get(),
+                              success_message="Xóa khách hàng thành công!",
+                              failure_message="Không thể xóa khách hàng!",
+                              error_message="Lỗi khi xóa khách hàng!",
+                              on_done=self.clear_customer_form)
 
     def clear_customer_form(self):
         """Làm mới form khách hàng"""
@@ -917,11 +1014,15 @@ class ModernBookStoreSystem:
         label_config = {'font': ('Segoe UI', 11), 'bg': 'white', 'fg': '#1E3A8A'}
 
         tk.Label(parent, text="👤 Khách hàng:", **label_config).grid(row=0, column=0, padx=10, pady=8, sticky='e')
-        self.customer_combo = ttk.Combobox(parent, width=25, state='readonly', font=('Segoe UI', 11))
+        self.customer_combo = TypeaheadCombobox(parent, self.db.search_customers, self.format_customer_item,
+                                                worker=self.worker, key='customer_lookup',
+                                                width=25, font=('Segoe UI', 11))
         self.customer_combo.grid(row=0, column=1, padx=10, pady=8, sticky='w')
 
         tk.Label(parent, text="📚 Chọn sách:", **label_config).grid(row=1, column=0, padx=10, pady=8, sticky='e')
-        self.book_combo = ttk.Combobox(parent, width=25, state='readonly', font=('Segoe UI', 11))
+        self.book_combo = TypeaheadCombobox(parent, self.lookup_books, self.format_book_item,
+                                            worker=self.worker, key='book_lookup',
+                                            width=25, font=('Segoe UI', 11))
         self.book_combo.grid(row=1, column=1, padx=10, pady=8, sticky='w')
 
         tk.Label(parent, text="🔢 Số lượng:", **label_config).grid(row=1, column=2, padx=10, pady=8, sticky='e')
@@ -929,10 +1030,9 @@ class ModernBookStoreSystem:
         self.order_quantity.grid(row=1, column=3, padx=10, pady=8, sticky='w')
         self.order_quantity.set(1)
 
-        ttk.Button(parent, text="➕ Thêm vào đơn", command=self.add_to_order, style='Primary.TButton').grid(row=1,
-                                                                                                           column=4,
-                                                                                                           padx=10,
-                                                                                                           pady=8)
+        self.add_to_order_button = ttk.Button(parent, text="➕ Thêm vào đơn", command=self.add_to_order,
+                                              style='Primary.TButton')
+        self.add_to_order_button.grid(row=1, column=4, padx=10, pady=8)
 
         self.order_summary = tk.Label(parent, text="Tổng tiền: 0₫", font=('Segoe UI', 14, 'bold'), bg='white',
                                       fg='#1E3A8A')
@@ -980,6 +1080,15 @@ class ModernBookStoreSystem:
 
     def create_orders_list_table(self, parent):
         """Bảng danh sách đơn hàng"""
+        actions_frame = ttk.Frame(parent, style='Modern.TFrame')
+        actions_frame.pack(fill='x', padx=5, pady=(5, 0))
+        ttk.Button(actions_frame, text="❌ Hủy đơn đã chọn", command=self.cancel_selected_order,
+                   style='Primary.TButton').pack(side='right', padx=5)
+        ttk.Button(actions_frame, text="📥 Tải lại", command=self.load_orders,
+                   style='Primary.TButton').pack(side='right', padx=5)
+        self.orders_status = tk.Label(actions_frame, text="", font=('Segoe UI', 10), bg='#F0F8FF', fg='#64748B')
+        self.orders_status.pack(side='left', padx=5)
+
         table_frame = ttk.Frame(parent)
         table_frame.pack(fill='both', expand=True, padx=5, pady=5)
 
@@ -1000,61 +1109,92 @@ class ModernBookStoreSystem:
             self.orders_tree.heading(col, text=col)
             self.orders_tree.column(col, width=width, anchor=anchor)
 
-        v_scroll = ttk.Scrollbar(table_frame, orient='vertical', command=self.orders_tree.yview)
+        v_scroll = ttk.Scrollbar(table_frame, orient='vertical')
         h_scroll = ttk.Scrollbar(table_frame, orient='horizontal', command=self.orders_tree.xview)
-        self.orders_tree.configure(yscrollcommand=v_scroll.set, xscrollcommand=h_scroll.set)
+        self.orders_tree.configure(xscrollcommand=h_scroll.set)
 
         self.orders_tree.pack(side='left', fill='both', expand=True)
         v_scroll.pack(side='right', fill='y')
         h_scroll.pack(side='bottom', fill='x')
 
+        self.orders_loader = PagedTreeLoader(self.orders_tree, v_scroll, self.db.get_orders_page,
+                                             self.format_order_row, striped=False,
+                                             worker=self.worker, key='load_orders', newest_first=True,
+                                             count_hint=lambda: self.db.get_count_hint('Orders'),
+                                             status_label=self.orders_status)
         self.load_orders()
 
     def load_orders(self):
-        """Tải danh sách đơn hàng"""
-        for item in self.orders_tree.get_children():
-            self.orders_tree.delete(item)
-
+        """Tải danh sách đơn hàng (trang đầu, các trang sau tải khi cuộn)"""
         try:
-            orders = self.db.get_all_orders()
-            if orders:
-                for order in orders:
-                    formatted_order = list(order)
-
-                    if isinstance(formatted_order[2], datetime):
-                        formatted_order[2] = formatted_order[2].strftime("%d/%m/%Y %H:%M")
-                    elif formatted_order[2]:
-                        try:
-                            if isinstance(formatted_order[2], str):
-                                formatted_order[2] = formatted_order[2][:10]
-                        except:
-                            formatted_order[2] = str(formatted_order[2])
-
-                    try:
-                        total = float(formatted_order[4] or 0)
-                        formatted_order[4] = f"{total:,.0f}₫"
-                    except:
-                        formatted_order[4] = "0₫"
-
-                    status = formatted_order[5]
-                    if status == 'Completed':
-                        formatted_order[5] = "✅ Hoàn thành"
-                    elif status == 'Pending':
-                        formatted_order[5] = "⏳ Chờ xử lý"
-                    elif status == 'Cancelled':
-                        formatted_order[5] = "❌ Đã hủy"
-                    elif status == 'Processing':
-                        formatted_order[5] = "🔄 Đang xử lý"
-                    else:
-                        formatted_order[5] = "📋 Mới"
-
-                    if len(formatted_order) > 6:
-                        formatted_order = formatted_order[:6]
-
-                    self.orders_tree.insert('', 'end', values=formatted_order)
+            self.orders_loader.reload()
         except Exception:
             pass
 
+    def cancel_selected_order(self):
+        """Hủy đơn hàng đang chọn trong danh sách"""
+        selection = self.orders_tree.selection()
+        if not selection:
+            messagebox.showwarning("Cảnh báo", "Vui lòng chọn đơn hàng cần hủy!")
+            return
+
+        values = self.orders_tree.item(selection[0], 'values')
+        if not messagebox.askyesno("Xác nhận", f"Bạn có chắc chắn muốn hủy đơn hàng {values[1]}?"):
+            return
+
+        if self.worker.is_pending('cancel_order'):
+            return
+
+        order_code = values[1]
+        self.worker.submit('cancel_order', self.db.cancel_order, int(values[0]),
+                           on_success=lambda changes: self.on_order_cancelled(order_code, changes),
+                           on_error=lambda e: messagebox.showerror("Lỗi", "Lỗi khi hủy đơn hàng!"))
+
+    def on_order_cancelled(self, order_code, changes):
+        """Xử lý kết quả hủy đơn hàng trên luồng giao diện"""
+        if changes:
+            messagebox.showinfo("Thành công", f"Đã hủy đơn hàng {order_code}!")
+            self.apply_row_changes(changes)
+            self.refresh_dashboard()
+        else:
+            messagebox.showerror("Lỗi", "Không thể hủy đơn hàng (đơn không tồn tại hoặc đã hủy)!")
+
+    def format_order_row(self, order):
+        """Định dạng một dòng đơn hàng để hiển thị"""
+        formatted_order = list(order)
+
+        if isinstance(formatted_order[2], datetime):
+            formatted_order[2] = formatted_order[2].strftime("%d/%m/%Y %H:%M")
+        elif formatted_order[2]:
+            try:
+                if isinstance(formatted_order[2], str):
+                    formatted_order[2] = formatted_order[2][:10]
+            except:
+                formatted_order[2] = str(formatted_order[2])
+
+        try:
+            total = float(formatted_order[4] or 0)
+            formatted_order[4] = f"{total:,.0f}₫"
+        except:
+            formatted_order[4] = "0₫"
+
+        status = formatted_order[5]
+        if status == 'Completed':
+            formatted_order[5] = "✅ Hoàn thành"
+        elif status == 'Pending':
+            formatted_order[5] = "⏳ Chờ xử lý"
+        elif status == 'Cancelled':
+            formatted_order[5] = "❌ Đã hủy"
+        elif status == 'Processing':
+            formatted_order[5] = "🔄 Đang xử lý"
+        else:
+            formatted_order[5] = "📋 Mới"
+
+        if len(formatted_order) > 6:
+            formatted_order = formatted_order[:6]
+
+        return formatted_order
+
     def load_order_stats_combobox_data(self):
         """Tải dữ liệu cho combobox thống kê"""
         try:
@@ -1072,37 +1212,66 @@ class ModernBookStoreSystem:
     def add_to_order(self):
         """Thêm sách vào đơn hàng"""
         try:
-            customer_idx = self.customer_combo.current()
-            book_idx = self.book_combo.current()
+            customer = self.customer_combo.selected_row()
+            book = self.book_combo.selected_row()
             quantity = int(self.order_quantity.get())
 
-            if customer_idx == -1:
+            if customer is None:
                 messagebox.showwarning("Cảnh báo", "Vui lòng chọn khách hàng!")
                 return
 
-            if book_idx == -1:
+            if book is None:
                 messagebox.showwarning("Cảnh báo", "Vui lòng chọn sách!")
                 return
 
-            book = self.books_data[book_idx]
-            if quantity > book[6]:
-                messagebox.showwarning("Cảnh báo", f"Số lượng vượt quá tồn kho! Chỉ còn {book[6]} cuốn")
+            if quantity <= 0:
+                messagebox.showwarning("Cảnh báo", "Số lượng vượt quá tồn kho hiện có!")
                 return
 
-            order_item = {
-                'book_id': book[0],
-                'book_code': book[1],
-                'book_name': book[2],
-                'quantity': quantity,
-                'price': book[7],
-                'total': quantity * book[7]
-            }
+            if self.worker.is_pending('reserve_stock'):
+                return
 
-            self.current_order_items.append(order_item)
-            self.update_order_display()
+            # Giữ chỗ trên CSDL (trên worker) thay vì so với tồn kho đã tải (có thể đã cũ);
+            # khóa nút thêm cho tới khi có kết quả để không giữ chỗ hai lần
+            cart_id = self.cart_id
+            self.add_to_order_button.state(['disabled'])
+            self.worker.submit('reserve_stock', self.db.reserve_stock, cart_id, book[0], quantity,
+                               on_success=lambda reserved: self.on_stock_reserved(cart_id, book, quantity, reserved),
+                               on_error=self.on_stock_reserve_failed)
         except ValueError:
             messagebox.showerror("Lỗi", "Số lượng không hợp lệ!")
 
+    def on_stock_reserved(self, cart_id, book, quantity, reserved):
+        """Xử lý kết quả giữ chỗ tồn kho trên luồng giao diện"""
+        self.add_to_order_button.state(['!disabled'])
+
+        if not reserved:
+            messagebox.showwarning("Cảnh báo", "Số lượng vượt quá tồn kho hiện có!")
+            return
+
+        # Giỏ hàng đã bị hủy / thanh toán trong lúc chờ: trả lại phần vừa giữ
+        if cart_id != self.cart_id:
+            self.worker.submit(f'release_stock:{cart_id}', self.db.release_stock, cart_id,
+                               on_success=self.apply_row_changes)
+            return
+
+        order_item = {
+            'book_id': book[0],
+            'book_code': book[1],
+            'book_name': book[2],
+            'quantity': quantity,
+            'price': book[7],
+            'total': quantity * book[7]
+        }
+
+        self.current_order_items.append(order_item)
+        self.update_order_display()
+
+    def on_stock_reserve_failed(self, error):
+        """Mở lại nút thêm khi giữ chỗ lỗi"""
+        self.add_to_order_button.state(['!disabled'])
+        messagebox.showerror("Lỗi", "Lỗi khi giữ chỗ tồn kho!")
+
     def update_order_display(self):
         """Cập nhật hiển thị đơn hàng"""
         for item in self.order_items_tree.get_children():
@@ -1124,59 +1293,56 @@ class ModernBookStoreSystem:
             messagebox.showwarning("Cảnh báo", "Đơn hàng trống!")
             return
 
-        customer_idx = self.customer_combo.current()
-        if customer_idx == -1:
+        customer_id = self.customer_combo.selected_id()
+        if customer_id is None:
             messagebox.showwarning("Cảnh báo", "Vui lòng chọn khách hàng!")
             return
 
-        try:
-            customer = self.customers_data[customer_idx]
-            order_code = f"DH{datetime.now().strftime('%Y%m%d%H%M%S')}{random.randint(100, 999)}"
-
-            order_id = self.db.create_order(order_code, customer[0], datetime.now())
-
-            if not order_id:
-                messagebox.showerror("Lỗi", "Không thể tạo đơn hàng!")
-                return
+        # Không gửi lại khi đơn trước còn đang xử lý (tránh tạo đơn trùng) hoặc sách vừa thêm chưa giữ chỗ xong
+        if self.worker.is_pending('confirm_order') or self.worker.is_pending('reserve_stock'):
+            return
 
-            success_count = 0
-            for item in self.current_order_items:
-                book_stock = self.db.execute_query(
-                    "SELECT quantity_in_stock FROM Books WHERE book_id = ?",
-                    (item['book_id'],)
-                )
-
-                if book_stock and book_stock[0][0] >= item['quantity']:
-                    result = self.db.add_order_item(order_id, item['book_id'], item['quantity'], item['price'])
-                    if result:
-                        success_count += 1
-
-            if success_count > 0:
-                complete_result = self.db.complete_order(order_id)
-
-                if complete_result:
-                    total_amount = sum(item['total'] for item in self.current_order_items)
-                    messagebox.showinfo("Thành công",
-                                        f"Tạo đơn hàng thành công!\nMã đơn: {order_code}\nTổng tiền: {total_amount:,.0f}₫")
-                    self.clear_order()
-                    self.load_books()
-                    self.load_combo_data()
-                    self.load_orders()
-                else:
-                    messagebox.showwarning("Cảnh báo", "Đơn hàng được tạo nhưng có lỗi khi hoàn thành!")
-            else:
-                self.db.execute_query("DELETE FROM Orders WHERE order_id = ?", (order_id,))
-                messagebox.showerror("Lỗi", "Không thể thêm sách vào đơn hàng!")
+        try:
+            # Mã đơn sinh trên luồng nền trong checkout (trùng mã thì tự thử lại với mã mới)
+            items = [(item['book_id'], item['quantity'], item['price']) for item in self.current_order_items]
+            self.worker.submit('confirm_order', self.db.checkout, customer_id, items, None, datetime.now(),
+                               self.cart_id,
+                               on_success=self.on_order_confirmed,
+                               on_error=lambda e: messagebox.showerror("Lỗi", "Lỗi khi tạo đơn hàng!"))
 
         except Exception:
             messagebox.showerror("Lỗi", "Lỗi khi tạo đơn hàng!")
 
+    def on_order_confirmed(self, result):
+        """Xử lý kết quả tạo đơn hàng trên luồng giao diện"""
+        if not result:
+            messagebox.showerror("Lỗi", "Không thể tạo đơn hàng! Có thể một số sách không đủ tồn kho.")
+            return
+
+        order_id, total_amount, changes = result
+        order_rows = changes['orders']['inserted']
+        order_code = order_rows[0][1] if order_rows else order_id
+        messagebox.showinfo("Thành công",
+                            f"Tạo đơn hàng thành công!\nMã đơn: {order_code}\nTổng tiền: {total_amount:,.0f}₫")
+        self.reset_cart()
+        self.apply_row_changes(changes)
+        self.load_combo_data()
+        self.refresh_dashboard()
+
     def clear_order(self):
-        """Làm mới đơn hàng"""
+        """Hủy giỏ hàng đang tạo, trả lại tồn kho đã giữ"""
+        if self.current_order_items:
+            self.worker.submit(f'release_stock:{self.cart_id}', self.db.release_stock, self.cart_id,
+                               on_success=self.apply_row_changes)
+        self.reset_cart()
+
+    def reset_cart(self):
+        """Làm mới đơn hàng với giỏ hàng mới"""
+        self.cart_id = uuid.uuid4().hex
         self.current_order_items = []
         self.update_order_display()
-        self.customer_combo.set('')
-        self.book_combo.set('')
+        self.customer_combo.clear()
+        self.book_combo.clear()
         self.order_quantity.set(1)
 
     def on_order_stats_type_change(self, event=None):
@@ -1204,79 +1370,59 @@ class ModernBookStoreSystem:
                 date_str = self.order_stats_day.get().strip()
                 try:
                     date_obj = datetime.strptime(date_str, '%d/%m/%Y')
-                    start_date = date_obj.replace(hour=0, minute=0, second=0, microsecond=0)
-                    end_date = date_obj.replace(hour=23, minute=59, second=59, microsecond=999999)
-
-                    stats = self.db.get_order_statistics_by_date(start_date, end_date)
-                    if stats:
-                        total_orders, total_revenue = stats
-                        avg_order = total_revenue / total_orders if total_orders > 0 else 0
-
-                        self.order_stats_label.config(
-                            text=f"📊 Thống kê ngày {date_str}: "
-                                 f"Số đơn hàng: {total_orders:,} | "
-                                 f"Tổng doanh thu: {total_revenue:,.0f}₫ | "
-                                 f"Đơn TB: {avg_order:,.0f}₫"
-                        )
-                    else:
-                        self.order_stats_label.config(
-                            text=f"📊 Thống kê ngày {date_str}: Không có dữ liệu"
-                        )
-
                 except ValueError:
                     messagebox.showerror("Lỗi", "Ngày không hợp lệ! Định dạng đúng: dd/mm/yyyy")
+                    return
+
+                title = f"ngày {date_str}"
+                start_date = date_obj.replace(hour=0, minute=0, second=0, microsecond=0)
+                end_date = date_obj.replace(hour=23, minute=59, second=59, microsecond=999999)
 
             elif stats_type == 'Theo tháng':
                 month = int(self.order_stats_month.get())
                 year = int(self.order_stats_year.get())
 
+                title = f"tháng {month}/{year}"
                 start_date = datetime(year, month, 1, 0, 0, 0)
                 if month == 12:
                     end_date = datetime(year + 1, 1, 1, 23, 59, 59) - timedelta(days=1)
                 else:
                     end_date = datetime(year, month + 1, 1, 23, 59, 59) - timedelta(days=1)
 
-                stats = self.db.get_order_statistics_by_date(start_date, end_date)
-                if stats:
-                    total_orders, total_revenue = stats
-                    avg_order = total_revenue / total_orders if total_orders > 0 else 0
-
-                    self.order_stats_label.config(
-                        text=f"📊 Thống kê tháng {month}/{year}: "
-                             f"Số đơn hàng: {total_orders:,} | "
-                             f"Tổng doanh thu: {total_revenue:,.0f}₫ | "
-                             f"Đơn TB: {avg_order:,.0f}₫"
-                    )
-                else:
-                    self.order_stats_label.config(
-                        text=f"📊 Thống kê tháng {month}/{year}: Không có dữ liệu"
-                    )
-
             elif stats_type == 'Theo năm':
                 year = int(self.order_stats_year.get())
 
+                title = f"năm {year}"
                 start_date = datetime(year, 1, 1, 0, 0, 0)
                 end_date = datetime(year, 12, 31, 23, 59, 59)
 
-                stats = self.db.get_order_statistics_by_date(start_date, end_date)
-                if stats:
-                    total_orders, total_revenue = stats
-                    avg_order = total_revenue / total_orders if total_orders > 0 else 0
-
-                    self.order_stats_label.config(
-                        text=f"📊 Thống kê năm {year}: "
-                             f"Số đơn hàng: {total_orders:,} | "
-                             f"Tổng doanh thu: {total_revenue:,.0f}₫ | "
-                             f"Đơn TB: {avg_order:,.0f}₫"
-                    )
-                else:
-                    self.order_stats_label.config(
-                        text=f"📊 Thống kê năm {year}: Không có dữ liệu"
-                    )
+            else:
+                return
+
+            self.worker.submit('order_stats', self.db.get_order_statistics_by_date, start_date, end_date,
+                               on_success=lambda stats: self.display_order_statistics(title, stats),
+                               on_error=lambda e: messagebox.showerror("Lỗi", "Lỗi khi thống kê!"))
 
         except Exception:
             messagebox.showerror("Lỗi", "Lỗi khi thống kê!")
 
+    def display_order_statistics(self, title, stats):
+        """Hiển thị kết quả thống kê đơn hàng trên luồng giao diện"""
+        if stats:
+            total_orders, total_revenue = stats
+            avg_order = total_revenue / total_orders if total_orders > 0 else 0
+
+            self.order_stats_label.config(
+                text=f"📊 Thống kê {title}: "
+                     f"Số đơn hàng: {total_orders:,} | "
+                     f"Tổng doanh thu: {total_revenue:,.0f}₫ | "
+                     f"Đơn TB: {avg_order:,.0f}₫"
+            )
+        else:
+            self.order_stats_label.config(
+                text=f"📊 Thống kê {title}: Không có dữ liệu"
+            )
+
     def show_today_order_stats(self):
         """Thống kê đơn hàng hôm nay"""
         try:
@@ -1328,7 +1474,9 @@ class ModernBookStoreSystem:
         self.supplier_entry.grid(row=0, column=1, padx=10, pady=8, sticky='w')
 
         tk.Label(parent, text="📚 Chọn sách:", **label_config).grid(row=1, column=0, padx=10, pady=8, sticky='e')
-        self.import_book_combo = ttk.Combobox(parent, width=25, state='readonly', font=('Segoe UI', 11))
+        self.import_book_combo = TypeaheadCombobox(parent, self.lookup_books, self.format_book_item,
+                                                   worker=self.worker, key='import_book_lookup',
+                                                   width=25, font=('Segoe UI', 11))
         self.import_book_combo.grid(row=1, column=1, padx=10, pady=8, sticky='w')
 
         tk.Label(parent, text="🔢 Số lượng:", **label_config).grid(row=1, column=2, padx=10, pady=8, sticky='e')
@@ -1393,6 +1541,13 @@ class ModernBookStoreSystem:
 
     def create_imports_list_table(self, parent):
         """Bảng phiếu nhập"""
+        actions_frame = ttk.Frame(parent, style='Modern.TFrame')
+        actions_frame.pack(fill='x', padx=5, pady=(5, 0))
+        ttk.Button(actions_frame, text="📥 Tải lại", command=self.load_imports,
+                   style='Primary.TButton').pack(side='right', padx=5)
+        self.imports_status = tk.Label(actions_frame, text="", font=('Segoe UI', 10), bg='#F0F8FF', fg='#64748B')
+        self.imports_status.pack(side='left', padx=5)
+
         table_frame = ttk.Frame(parent)
         table_frame.pack(fill='both', expand=True, padx=5, pady=5)
 
@@ -1412,48 +1567,51 @@ class ModernBookStoreSystem:
             self.imports_tree.heading(col, text=col)
             self.imports_tree.column(col, width=width, anchor=anchor)
 
-        v_scroll = ttk.Scrollbar(table_frame, orient='vertical', command=self.imports_tree.yview)
+        v_scroll = ttk.Scrollbar(table_frame, orient='vertical')
         h_scroll = ttk.Scrollbar(table_frame, orient='horizontal', command=self.imports_tree.xview)
-        self.imports_tree.configure(yscrollcommand=v_scroll.set, xscrollcommand=h_scroll.set)
+        self.imports_tree.configure(xscrollcommand=h_scroll.set)
 
         self.imports_tree.pack(side='left', fill='both', expand=True)
         v_scroll.pack(side='right', fill='y')
         h_scroll.pack(side='bottom', fill='x')
 
+        self.imports_loader = PagedTreeLoader(self.imports_tree, v_scroll, self.db.get_imports_page,
+                                              self.format_import_row, striped=False,
+                                              worker=self.worker, key='load_imports', newest_first=True,
+                                              count_hint=lambda: self.db.get_count_hint('ImportBooks'),
+                                              status_label=self.imports_status)
         self.load_imports()
 
     def load_imports(self):
-        """Tải danh sách phiếu nhập"""
-        for item in self.imports_tree.get_children():
-            self.imports_tree.delete(item)
-
+        """Tải danh sách phiếu nhập (trang đầu, các trang sau tải khi cuộn)"""
         try:
-            imports = self.db.get_all_imports()
-            if imports:
-                for import_data in imports:
-                    formatted_import = list(import_data)
+            self.imports_loader.reload()
+        except Exception:
+            pass
 
-                    if isinstance(formatted_import[2], datetime):
-                        formatted_import[2] = formatted_import[2].strftime("%d/%m/%Y %H:%M")
+    def format_import_row(self, import_data):
+        """Định dạng một dòng phiếu nhập để hiển thị"""
+        formatted_import = list(import_data)
 
-                    try:
-                        total = float(formatted_import[4] or 0)
-                        formatted_import[4] = f"{total:,.0f}₫"
-                    except:
-                        formatted_import[4] = "0₫"
+        if isinstance(formatted_import[2], datetime):
+            formatted_import[2] = formatted_import[2].strftime("%d/%m/%Y %H:%M")
 
-                    self.imports_tree.insert('', 'end', values=formatted_import)
-        except Exception:
-            pass
+        try:
+            total = float(formatted_import[4] or 0)
+            formatted_import[4] = f"{total:,.0f}₫"
+        except:
+            formatted_import[4] = "0₫"
+
+        return formatted_import
 
     def add_to_import(self):
         """Thêm sách vào phiếu nhập"""
         try:
-            book_idx = self.import_book_combo.current()
+            book = self.import_book_combo.selected_row()
             quantity = int(self.import_quantity.get())
             price = float(self.import_price.get())
 
-            if book_idx == -1:
+            if book is None:
                 messagebox.showwarning("Cảnh báo", "Vui lòng chọn sách!")
                 return
 
@@ -1461,8 +1619,6 @@ class ModernBookStoreSystem:
                 messagebox.showwarning("Cảnh báo", "Số lượng và giá phải lớn hơn 0!")
                 return
 
-            book = self.books_data[book_idx]
-
             import_item = {
                 'book_id': book[0],
                 'book_code': book[1],
@@ -1498,42 +1654,44 @@ class ModernBookStoreSystem:
             messagebox.showwarning("Cảnh báo", "Phiếu nhập trống!")
             return
 
+        # Không gửi lại khi phiếu trước còn đang xử lý, tránh tạo phiếu trùng
+        if self.worker.is_pending('confirm_import'):
+            return
+
         try:
             supplier = self.supplier_entry.get().strip()
-            import_code = f"PN{datetime.now().strftime('%Y%m%d%H%M%S')}{random.randint(100, 999)}"
-
-            import_id = self.db.create_import(import_code, datetime.now(), supplier)
-
-            if not import_id:
-                messagebox.showerror("Lỗi", "Không thể tạo phiếu nhập!")
-                return
+            items = [(item['book_id'], item['quantity'], item['price']) for item in self.current_import_items]
+            total_amount = sum(item['total'] for item in self.current_import_items)
 
-            success_count = 0
-            for item in self.current_import_items:
-                result = self.db.add_import_item(import_id, item['book_id'], item['quantity'], item['price'])
-                if result:
-                    success_count += 1
-
-            if success_count > 0:
-                total_amount = sum(item['total'] for item in self.current_import_items)
-                messagebox.showinfo("Thành công",
-                                    f"Tạo phiếu nhập thành công!\nMã phiếu: {import_code}\nTổng tiền: {total_amount:,.0f}₫")
-                self.clear_import()
-                self.load_books()
-                self.load_imports()
-            else:
-                self.db.execute_query("DELETE FROM ImportBooks WHERE import_id = ?", (import_id,))
-                messagebox.showerror("Lỗi", "Không thể thêm sách vào phiếu nhập!")
+            # Mã phiếu sinh trên luồng nền (trùng mã thì tự thử lại với mã mới)
+            self.worker.submit('confirm_import', self.db.create_import_with_items, None, datetime.now(),
+                               supplier, items,
+                               on_success=lambda result: self.on_import_confirmed(total_amount, result),
+                               on_error=lambda e: messagebox.showerror("Lỗi", "Lỗi khi tạo phiếu nhập!"))
 
         except Exception:
             messagebox.showerror("Lỗi", "Lỗi khi tạo phiếu nhập!")
 
+    def on_import_confirmed(self, total_amount, result):
+        """Xử lý kết quả tạo phiếu nhập trên luồng giao diện"""
+        if result is None:
+            messagebox.showerror("Lỗi", "Không thể tạo phiếu nhập!")
+        elif not result:
+            messagebox.showerror("Lỗi", "Không thể thêm sách vào phiếu nhập!")
+        else:
+            import_rows = result['imports']['inserted']
+            import_code = import_rows[0][1] if import_rows else ""
+            messagebox.showinfo("Thành công",
+                                f"Tạo phiếu nhập thành công!\nMã phiếu: {import_code}\nTổng tiền: {total_amount:,.0f}₫")
+            self.clear_import()
+            self.apply_row_changes(result)
+
     def clear_import(self):
         """Làm mới phiếu nhập"""
         self.current_import_items = []
         self.update_import_display()
         self.supplier_entry.delete(0, tk.END)
-        self.import_book_combo.set('')
+        self.import_book_combo.clear()
         self.import_quantity.set(1)
         self.import_price.delete(0, tk.END)
 
@@ -1565,234 +1723,133 @@ class ModernBookStoreSystem:
         self.report_tree = ttk.Treeview(results_frame, show='headings', height=15, style='Modern.Treeview')
         self.report_tree.pack(fill='both', expand=True, padx=10, pady=10)
 
-        v_scroll = ttk.Scrollbar(results_frame, orient='vertical', command=self.report_tree.yview)
+        v_scroll = ttk.Scrollbar(results_frame, orient='vertical')
         h_scroll = ttk.Scrollbar(results_frame, orient='horizontal', command=self.report_tree.xview)
-        self.report_tree.configure(yscrollcommand=v_scroll.set, xscrollcommand=h_scroll.set)
+        self.report_tree.configure(xscrollcommand=h_scroll.set)
 
         v_scroll.pack(side='right', fill='y')
         h_scroll.pack(side='bottom', fill='x')
 
+        self.report_tree.tag_configure('top3', background='#E8F5E8', font=('Segoe UI', 11))
+        self.report_view = VirtualTreeview(self.report_tree, v_scroll, list, striped=False)
+
     # ========== CHỨC NĂNG BÁO CÁO ==========
     def show_best_sellers(self):
         """Hiển thị sách bán chạy"""
-        try:
-            years_query = """
-                SELECT DISTINCT YEAR(order_date) as year
-                FROM Orders 
-                WHERE status = 'Completed'
-                ORDER BY year DESC
-            """
-
-            years_data = self.db.execute_query(years_query)
+        self.worker.submit('report', self.fetch_best_sellers,
+                           on_success=self.display_best_sellers,
+                           on_error=lambda e: messagebox.showerror("Lỗi", "Lỗi khi tải báo cáo!"))
+
+    def fetch_best_sellers(self):
+        """Đọc sách bán chạy nhất từng tháng (chạy trên luồng nền)"""
+        rows = self.db.get_monthly_top_sellers(1)
+        if not rows:
+            return None
+
+        result_data = []
+        for year, month, _, _, title, _, _, sold, _ in rows:
+            book_name = title or "Không có dữ liệu chi tiết"
+            if len(book_name) > 50:
+                book_name = book_name[:50] + "..."
+
+            result_data.append([
+                f"Tháng {month}",
+                str(year),
+                book_name,
+                f"{int(sold):,}" if sold else "0"
+            ])
+
+        return result_data
+
+    def display_best_sellers(self, result_data):
+        """Hiển thị kết quả sách bán chạy"""
+        if result_data is None:
+            messagebox.showinfo("Thông báo", "Không có dữ liệu đơn hàng hoàn thành!")
+            return
 
-            if not years_data:
-                messagebox.showinfo("Thông báo", "Không có dữ liệu đơn hàng hoàn thành!")
-                return
+        if result_data:
+            columns = ['Tháng', 'Năm', 'Sách bán chạy nhất', 'Số lượng bán']
+            self.display_report(result_data, columns,
+                                column_widths=[80, 70, 350, 100],
+                                aligns=['center', 'center', 'w', 'center'],
+                                format_row=list, striped=True)
 
-            result_data = []
-
-            for year_row in years_data:
-                year = year_row[0]
-
-                months_query = """
-                    SELECT DISTINCT MONTH(order_date) as month
-                    FROM Orders 
-                    WHERE status = 'Completed' AND YEAR(order_date) = ?
-                    ORDER BY month
-                """
-
-                months_data = self.db.execute_query(months_query, (year,))
-
-                if not months_data:
-                    continue
-
-                for month_row in months_data:
-                    month = month_row[0]
-
-                    try:
-                        data = self.db.get_best_selling_books(year, month, 1)
-
-                        if data and len(data) > 0:
-                            book = data[0]
-                            month_name = f"Tháng {month}"
-
-                            if len(book) >= 2:
-                                book_name = book[1]
-                                if len(book_name) > 50:
-                                    book_name = book_name[:50] + "..."
-
-                                sold = book[4] if len(book) > 4 else 0
-
-                                result_data.append([
-                                    month_name,
-                                    str(year),
-                                    book_name,
-                                    f"{int(sold):,}" if sold else "0"
-                                ])
-                            else:
-                                result_data.append([
-                                    f"Tháng {month}",
-                                    str(year),
-                                    "Không có dữ liệu chi tiết",
-                                    "0"
-                                ])
-                        else:
-                            result_data.append([
-                                f"Tháng {month}",
-                                str(year),
-                                "Không có sách bán chạy",
-                                "0"
-                            ])
-
-                    except Exception:
-                        result_data.append([
-                            f"Tháng {month}",
-                            str(year),
-                            "Lỗi khi tải dữ liệu",
-                            "0"
-                        ])
-                        continue
-
-            if result_data:
-                columns = ['Tháng', 'Năm', 'Sách bán chạy nhất', 'Số lượng bán']
-
-                for item in self.report_tree.get_children():
-                    self.report_tree.delete(item)
-
-                self.report_tree['columns'] = columns
-
-                col_widths = [80, 70, 350, 100]
-                col_aligns = ['center', 'center', 'w', 'center']
-
-                for i, col in enumerate(columns):
-                    self.report_tree.heading(col, text=col)
-                    width = col_widths[i] if i < len(col_widths) else 150
-                    align = col_aligns[i] if i < len(col_aligns) else 'w'
-                    self.report_tree.column(col, width=width, anchor=align)
-
-                for i, row in enumerate(result_data):
-                    tags = ()
-                    if i % 2 == 0:
-                        tags = ('evenrow',)
-                    else:
-                        tags = ('oddrow',)
-
-                    self.report_tree.insert('', 'end', values=row, tags=tags)
-
-                self.report_tree.tag_configure('evenrow', background='#FFFFFF')
-                self.report_tree.tag_configure('oddrow', background='#F8FAFC')
-
-                messagebox.showinfo("Thành công", f"Đã tải {len(result_data)} tháng có dữ liệu!")
-            else:
-                messagebox.showinfo("Thông báo", "Không có dữ liệu sách bán chạy!")
-
-        except Exception:
-            messagebox.showerror("Lỗi", "Lỗi khi tải báo cáo!")
+            messagebox.showinfo("Thành công", f"Đã tải {len(result_data)} tháng có dữ liệu!")
+        else:
+            messagebox.showinfo("Thông báo", "Không có dữ liệu sách bán chạy!")
 
     def show_top_customers(self):
         """Hiển thị khách hàng mua nhiều nhất"""
-        try:
-            data = self.db.get_customers_by_purchases(10)
-
-            if data:
-                for item in self.report_tree.get_children():
-                    self.report_tree.delete(item)
-
-                columns = ['Xếp hạng', 'Mã KH', 'Họ tên', 'Số sách mua', 'Tổng chi tiêu']
-                self.report_tree['columns'] = columns
-
-                col_widths = [80, 100, 250, 120, 150]
-                col_aligns = ['center', 'center', 'w', 'center', 'e']
-
-                for i, col in enumerate(columns):
-                    self.report_tree.heading(col, text=col)
-                    width = col_widths[i] if i < len(col_widths) else 150
-                    align = col_aligns[i] if i < len(col_aligns) else 'w'
-                    self.report_tree.column(col, width=width, anchor=align)
-
-                for i, row in enumerate(data):
-                    rank = i + 1
-                    rank_icon = "🥇" if rank == 1 else ("🥈" if rank == 2 else ("🥉" if rank == 3 else f"{rank}."))
-
-                    books_bought = row[3] if len(row) > 3 and row[3] else 0
-                    total_spent = row[5] if len(row) > 5 and row[5] else 0
-
-                    formatted_row = [
-                        rank_icon,
-                        row[0] if len(row) > 0 else "",
-                        row[1] if len(row) > 1 else "",
-                        f"{int(books_bought):,}",
-                        f"{float(total_spent):,.0f}₫"
-                    ]
-
-                    tags = ()
-                    if rank <= 3:
-                        tags = ('top3',)
-                    elif i % 2 == 0:
-                        tags = ('evenrow',)
-                    else:
-                        tags = ('oddrow',)
-
-                    self.report_tree.insert('', 'end', values=formatted_row, tags=tags)
-
-                self.report_tree.tag_configure('top3', background='#E8F5E8', font=('Segoe UI', 11))
-                self.report_tree.tag_configure('evenrow', background='#FFFFFF')
-                self.report_tree.tag_configure('oddrow', background='#F8FAFC')
-
-            else:
-                messagebox.showinfo("Thông báo", "Không có dữ liệu khách hàng!")
-
-        except Exception:
-            messagebox.showerror("Lỗi", "Lỗi khi tải báo cáo!")
+        self.worker.submit('report', self.db.get_customers_by_purchases, 10,
+                           on_success=self.display_top_customers,
+                           on_error=lambda e: messagebox.showerror("Lỗi", "Lỗi khi tải báo cáo!"))
+
+    def display_top_customers(self, data):
+        """Hiển thị kết quả khách hàng mua nhiều nhất"""
+        if data:
+            rows = []
+            for i, row in enumerate(data):
+                rank = i + 1
+                rank_icon = "🥇" if rank == 1 else ("🥈" if rank == 2 else ("🥉" if rank == 3 else f"{rank}."))
+
+                books_bought = row[3] if len(row) > 3 and row[3] else 0
+                total_spent = row[5] if len(row) > 5 and row[5] else 0
+
+                formatted_row = [
+                    rank_icon,
+                    row[0] if len(row) > 0 else "",
+                    row[1] if len(row) > 1 else "",
+                    f"{int(books_bought):,}",
+                    f"{float(total_spent):,.0f}₫"
+                ]
+                rows.append(formatted_row)
+
+            columns = ['Xếp hạng', 'Mã KH', 'Họ tên', 'Số sách mua', 'Tổng chi tiêu']
+            self.display_report(rows, columns,
+                                column_widths=[80, 100, 250, 120, 150],
+                                aligns=['center', 'center', 'w', 'center', 'e'],
+                                format_row=list,
+                                row_tags=lambda i, row: ('top3',) if i < 3 else (('even',) if i % 2 == 0 else ('odd',)))
+        else:
+            messagebox.showinfo("Thông báo", "Không có dữ liệu khách hàng!")
 
     def show_inventory_report(self):
         """Hiển thị tồn kho theo NXB"""
-        try:
-            data = self.db.get_inventory_by_publisher()
-            if data:
-                columns = ['Nhà xuất bản', 'Số đầu sách', 'Tổng tồn kho', 'Tổng giá trị']
-                self.display_report(data, columns,
-                                    column_widths=[200, 120, 150, 150],
-                                    aligns=['center', 'center', 'center', 'e'])
-            else:
-                messagebox.showinfo("Thông báo", "Không có dữ liệu tồn kho!")
-        except Exception:
-            messagebox.showerror("Lỗi", "Lỗi khi tải báo cáo!")
+        self.submit_report(self.db.get_inventory_by_publisher,
+                           ['Nhà xuất bản', 'Số đầu sách', 'Tổng tồn kho', 'Tổng giá trị'],
+                           [200, 120, 150, 150], ['center', 'center', 'center', 'e'],
+                           "Không có dữ liệu tồn kho!")
 
     def show_regular_customers(self):
         """Hiển thị khách hàng thường xuyên"""
-        try:
-            data = self.db.get_regular_customers(2)
-            if data:
-                columns = ['Mã KH', 'Họ tên', 'Số ĐT', 'Số đơn', 'Tổng chi tiêu']
-                self.display_report(data, columns,
-                                    column_widths=[100, 200, 120, 100, 150],
-                                    aligns=['center', 'w', 'center', 'center', 'e'])
-            else:
-                messagebox.showinfo("Thông báo", "Không có dữ liệu khách hàng thường xuyên!")
-        except Exception:
-            messagebox.showerror("Lỗi", "Lỗi khi tải báo cáo!")
+        self.submit_report(lambda: self.db.get_regular_customers(2),
+                           ['Mã KH', 'Họ tên', 'Số ĐT', 'Số đơn', 'Tổng chi tiêu'],
+                           [100, 200, 120, 100, 150], ['center', 'w', 'center', 'center', 'e'],
+                           "Không có dữ liệu khách hàng thường xuyên!")
 
     def show_revenue_by_book(self):
         """Hiển thị doanh thu theo sách"""
-        try:
-            data = self.db.get_revenue_by_book()
+        self.submit_report(self.db.get_revenue_by_book,
+                           ['Mã sách', 'Tên sách', 'Tác giả', 'NXB', 'Số đơn', 'Số lượng bán', 'Doanh thu'],
+                           [100, 250, 150, 150, 100, 120, 150],
+                           ['center', 'w', 'w', 'center', 'center', 'center', 'e'],
+                           "Không có dữ liệu doanh thu!")
+
+    def submit_report(self, fetch, columns, column_widths, aligns, empty_message):
+        """Đọc báo cáo trên luồng nền rồi hiển thị bằng display_report trên luồng giao diện"""
+        def show(data):
             if data:
-                columns = ['Mã sách', 'Tên sách', 'Tác giả', 'NXB', 'Số đơn', 'Số lượng bán', 'Doanh thu']
-                self.display_report(data, columns,
-                                    column_widths=[100, 250, 150, 150, 100, 120, 150],
-                                    aligns=['center', 'w', 'w', 'center', 'center', 'center', 'e'])
+                self.display_report(data, columns, column_widths=column_widths, aligns=aligns)
             else:
-                messagebox.showinfo("Thông báo", "Không có dữ liệu doanh thu!")
-        except Exception:
-            messagebox.showerror("Lỗi", "Lỗi khi tải báo cáo!")
+                messagebox.showinfo("Thông báo", empty_message)
+
+        self.worker.submit('report', fetch, on_success=show,
+                           on_error=lambda e: messagebox.showerror("Lỗi", "Lỗi khi tải báo cáo!"))
 
-    def display_report(self, data, columns, column_widths=None, aligns=None):
+    def display_report(self, data, columns, column_widths=None, aligns=None,
+                       format_row=None, striped=False, row_tags=None):
         """Hiển thị báo cáo"""
         try:
-            for item in self.report_tree.get_children():
-                self.report_tree.delete(item)
-
             self.report_tree['columns'] = columns
 
             if column_widths is None:
@@ -1806,56 +1863,63 @@ class ModernBookStoreSystem:
                 align = aligns[i] if i < len(aligns) else 'w'
                 self.report_tree.column(col, width=width, anchor=align)
 
-            for row in data:
-                formatted_row = []
-                for i, value in enumerate(row):
-                    if value is None:
-                        formatted_row.append("")
-                    elif isinstance(value, (int, float)):
-                        column_name = columns[i].lower() if i < len(columns) else ""
-
-                        money_keywords = ['doanh thu', 'tổng giá', 'tổng chi', 'thành tiền', 'giá trị', 'tiền']
-                        if any(keyword in column_name for keyword in money_keywords):
-                            formatted_value = f"{float(value):,.0f} đ".replace(",", "X").replace(".", ",").replace("X",
-                                                                                                                   ".")
-                            formatted_row.append(formatted_value)
-                        else:
-                            formatted_row.append(f"{int(value):,}")
-                    else:
-                        formatted_row.append(str(value))
-
-                self.report_tree.insert('', 'end', values=formatted_row)
+            self.report_view.format_row = format_row or (lambda row: self.format_report_row(row, columns))
+            self.report_view.striped = striped
+            self.report_view.row_tags = row_tags
+            self.report_view.set_rows(list(data))
 
         except Exception:
             pass
 
+    def format_report_row(self, row, columns):
+        """Định dạng một dòng báo cáo: cột tiền theo kiểu 1.234 đ, số nguyên có dấu phân cách"""
+        formatted_row = []
+        for i, value in enumerate(row):
+            if value is None:
+                formatted_row.append("")
+            elif isinstance(value, (int, float)):
+                column_name = columns[i].lower() if i < len(columns) else ""
+
+                money_keywords = ['doanh thu', 'tổng giá', 'tổng chi', 'thành tiền', 'giá trị', 'tiền']
+                if any(keyword in column_name for keyword in money_keywords):
+                    formatted_value = f"{float(value):,.0f} đ".replace(",", "X").replace(".", ",").replace("X",
+                                                                                                           ".")
+                    formatted_row.append(formatted_value)
+                else:
+                    formatted_row.append(f"{int(value):,}")
+            else:
+                formatted_row.append(str(value))
+        return formatted_row
+
     def load_combo_data(self):
-        """Tải dữ liệu cho combobox"""
+        """Làm mới gợi ý của combobox khách hàng / sách theo chuỗi đang gõ"""
         try:
-            customers = self.db.get_all_customers()
-            if customers:
-                customer_list = [f"{cust[1]} - {cust[2]}" for cust in customers]
-                self.customer_combo['values'] = customer_list
-                self.customers_data = customers
-
-            books = self.db.get_all_books()
-            if books:
-                book_list = [f"{book[1]} - {book[2]}" for book in books]
-                self.book_combo['values'] = book_list
-                self.books_data = books
+            self.customer_combo.refresh()
+            self.book_combo.refresh()
         except Exception:
             pass
 
     def load_import_combo_data(self):
-        """Tải dữ liệu sách cho combobox nhập hàng"""
+        """Làm mới gợi ý của combobox sách nhập hàng"""
         try:
-            books = self.db.get_all_books()
-            if books:
-                book_list = [f"{book[1]} - {book[2]}" for book in books]
-                self.import_book_combo['values'] = book_list
+            self.import_book_combo.refresh()
         except Exception:
             pass
 
+    def lookup_books(self, text, limit):
+        """Tra cứu sách cho combobox gợi ý (chạy trên luồng nền)"""
+        return self.db.search_books(query=text, limit=limit)
+
+    @staticmethod
+    def format_book_item(book):
+        """Chuỗi hiển thị của sách trong combobox"""
+        return f"{book[1]} - {book[2]}"
+
+    @staticmethod
+    def format_customer_item(customer):
+        """Chuỗi hiển thị của khách hàng trong combobox"""
+        return f"{customer[1]} - {customer[2]}"
+
     def show_books_tab(self):
         """Chuyển đến tab sách"""
         self.notebook.select(1)
@@ -0,0 +1,226 @@
+import argparse
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from config import DatabaseConfig
+from mongo_schema import ensure_indexes
+from mongo_sync import SYNC_TABLES
+
+
+class Backfill:
+    """Nạp lại toàn bộ một bảng SQL sang MongoDB, đọc song song theo khoảng khóa chính
+
+    Dữ liệu được nạp vào collection tạm '<collection>_backfill' đã có unique index theo khóa, collection
+    chính vẫn phục vụ bình thường; khi nạp xong mới tạo các index còn lại rồi đổi tên đè lên collection
+    chính (rename dropTarget). Thay đổi ghi vào collection chính trong lúc nạp bị thay bằng bản nạp.
+
+    Mỗi partition lưu vị trí (khóa lớn nhất đã nạp) trong SyncState với tên
+    'backfill:<bảng>:<khóa đầu>:<khóa cuối>'. Khi chạy lại sau sự cố, các document trong collection tạm
+    nằm sau vị trí đã lưu bị xóa rồi nạp tiếp.
+    """
+
+    STAGING_SUFFIX = '_backfill'
+
+    def __init__(self, pool, mongo_db, workers=4, partitions=16, chunk_size=10000):
+        self.pool = pool
+        self.db = mongo_db
+        self.workers = workers
+        self.partitions = partitions
+        self.chunk_size = chunk_size
+
+        self._lock = threading.Lock()
+        self.loaded = 0
+
+    def run(self, table_name, restart=False):
+        collection_name, key, _, _ = SYNC_TABLES[table_name]
+        staging = self.db[collection_name + self.STAGING_SUFFIX]
+
+        if restart:
+            self._clear_state(table_name)
+        state = self._load_state(table_name)
+
+        if state and staging.name not in self.db.list_collection_names():
+            # Collection tạm đã mất (bị xóa tay, hoặc lần trước đổi tên xong mà chưa kịp xóa tiến độ)
+            self._clear_state(table_name)
+            state = []
+
+        if not state:
+            # Lần chạy mới: làm lại collection tạm, chia partition theo khoảng khóa
+            staging.drop()
+            ensure_indexes(staging, collection_name, unique_only=True)
+            state = self._create_partitions(table_name, key)
+            if not state:
+                print(f"{table_name}: bảng trống")
+                return 0
+        else:
+            print(f"{table_name}: tiếp tục {len(state)} partition từ lần chạy trước")
+
+        total = self._estimate_rows(table_name)
+        self.loaded = 0
+        started = time.monotonic()
+        stop = threading.Event()
+        reporter = threading.Thread(target=self._report, args=(table_name, total, started, stop), daemon=True)
+        reporter.start()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(self._load_partition, table_name, start, position, end)
+                           for start, position, end in state]
+                for future in futures:
+                    future.result()
+        finally:
+            stop.set()
+            reporter.join()
+
+        ensure_indexes(staging, collection_name)
+        # Xóa tiến độ trước khi đổi tên: nếu dừng giữa chừng, lần sau nạp lại từ đầu chứ không
+        # nạp tiếp vào một collection tạm rỗng rồi đè lên dữ liệu đầy đủ
+        self._clear_state(table_name)
+        staging.rename(collection_name, dropTarget=True)
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        print(f"{table_name}: {self.loaded:,} dòng trong {elapsed:.1f}s ({self.loaded / elapsed:,.0f} dòng/s)")
+        return self.loaded
+
+    @contextmanager
+    def _connection(self):
+        with self.pool.connection() as conn:
+            if conn is None:
+                raise ConnectionError("Không thể kết nối SQL Server")
+            yield conn
+
+    def _create_partitions(self, table_name, key):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT MIN({key}), MAX({key}) FROM {table_name}")
+            low, high = cursor.fetchone()
+            if low is None:
+                return []
+
+            size = max((high - low + 1) // self.partitions, 1)
+            state = []
+            start = low
+            while start <= high:
+                end = min(start + size - 1, high)
+                if end + size > high:
+                    end = high
+                state.append((start, start - 1, end))
+                cursor.execute("INSERT INTO SyncState (sync_name, position) VALUES (?, ?)",
+                               (self._state_name(table_name, start, end), start - 1))
+                start = end + 1
+            conn.commit()
+            return state
+
+    def _load_partition(self, table_name, start, position, end):
+        """Nạp một partition theo từng chunk keyset, lưu vị trí sau mỗi chunk"""
+        collection_name, key, columns, to_document = SYNC_TABLES[table_name]
+        collection = self.db[collection_name + self.STAGING_SUFFIX]
+        state_name = self._state_name(table_name, start, end)
+
+        # Dọn phần chunk đã ghi nhưng chưa kịp lưu vị trí ở lần chạy trước
+        collection.delete_many({key: {"$gt": position, "$lte": end}})
+
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            while position < end:
+                cursor.execute(f"""
+                    SELECT TOP (?) {columns}
+                    FROM {table_name}
+                    WHERE {key} > ? AND {key} <= ?
+                    ORDER BY {key}
+                """, (self.chunk_size, position, end))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+
+                now = datetime.now()
+                documents = [to_document(row) for row in rows]
+                for document in documents:
+                    document['source'] = 'sql_sync'
+                    document['created_at'] = now
+                    document['synced_at'] = now
+                collection.insert_many(documents, ordered=False)
+
+                position = documents[-1][key]
+                cursor.execute("UPDATE SyncState SET position = ?, updated_at = SYSUTCDATETIME() WHERE sync_name = ?",
+                               (position, state_name))
+                conn.commit()
+
+                with self._lock:
+                    self.loaded += len(rows)
+
+                if len(rows) < self.chunk_size:
+                    break
+
+    @staticmethod
+    def _state_name(table_name, start, end):
+        return f"backfill:{table_name}:{start}:{end}"
+
+    def _load_state(self, table_name):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT sync_name, position FROM SyncState WHERE sync_name LIKE ?",
+                           (f"backfill:{table_name}:%",))
+            state = []
+            for sync_name, position in cursor.fetchall():
+                _, _, start, end = sync_name.split(':')
+                state.append((int(start), int(position), int(end)))
+            conn.commit()
+            return sorted(state)
+
+    def _clear_state(self, table_name):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM SyncState WHERE sync_name LIKE ?", (f"backfill:{table_name}:%",))
+            conn.commit()
+
+    def _estimate_rows(self, table_name):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT SUM(row_count) FROM sys.dm_db_partition_stats
+                WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1)
+            """, (table_name,))
+            row = cursor.fetchone()
+            conn.commit()
+            return int(row[0] or 0) if row else 0
+
+    def _report(self, table_name, total, started, stop, every=5):
+        while not stop.wait(every):
+            elapsed = max(time.monotonic() - started, 1e-9)
+            loaded = self.loaded
+            percent = f" ({loaded * 100 / total:.1f}%)" if total else ""
+            print(f"{table_name}: {loaded:,}/{total:,}{percent} - {loaded / elapsed:,.0f} dòng/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nạp lại toàn bộ dữ liệu SQL Server sang MongoDB")
+    parser.add_argument('--tables', nargs='+', choices=list(SYNC_TABLES), default=list(SYNC_TABLES))
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--partitions', type=int, default=16)
+    parser.add_argument('--chunk-size', type=int, default=10000)
+    parser.add_argument('--restart', action='store_true', help="bỏ tiến độ cũ, nạp lại từ đầu")
+    args = parser.parse_args()
+
+    mongo_client = DatabaseConfig.get_mongo_client()
+    if mongo_client is None:
+        print("Không thể kết nối MongoDB")
+        return 1
+
+    pool = DatabaseConfig.create_sql_pool()
+    pool.max_size = max(pool.max_size, args.workers + 1)
+    try:
+        backfill = Backfill(pool, mongo_client[DatabaseConfig.MONGO_DATABASE],
+                            workers=args.workers, partitions=args.partitions, chunk_size=args.chunk_size)
+        for table_name in args.tables:
+            backfill.run(table_name, restart=args.restart)
+    finally:
+        pool.close()
+        mongo_client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
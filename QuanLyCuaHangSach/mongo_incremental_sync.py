@@ -0,0 +1,109 @@
+import argparse
+import time
+from config import DatabaseConfig
+from mongo_sync import SYNC_TABLES, upsert_operations, load_position, save_position
+
+
+class IncrementalSync:
+    """Đồng bộ tăng dần SQL -> MongoDB theo watermark rowversion của từng bảng
+
+    Chỉ đọc các dòng có row_version lớn hơn watermark đã lưu và nhỏ hơn MIN_ACTIVE_ROWVERSION()
+    (bỏ qua giao dịch chưa commit), ghi theo từng chunk và lưu watermark sau mỗi chunk nên
+    chạy lại sau sự cố chỉ đồng bộ phần còn thiếu. Thao tác xóa không để lại rowversion,
+    phần này do SyncOutbox / mongo_replicator.py đảm nhận.
+    """
+
+    def __init__(self, sql_conn, mongo_db, chunk_size=5000):
+        self.conn = sql_conn
+        self.db = mongo_db
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def sync_name(table_name):
+        return f"watermark:{table_name}"
+
+    def reset(self, table_name):
+        """Đặt lại watermark để lần chạy sau đồng bộ toàn bộ bảng"""
+        load_position(self.conn, self.sync_name(table_name))
+        cursor = self.conn.cursor()
+        try:
+            save_position(cursor, self.sync_name(table_name), 0)
+            self.conn.commit()
+        finally:
+            cursor.close()
+
+    def sync_table(self, table_name) -> int:
+        """Đồng bộ phần thay đổi của một bảng, trả về số dòng đã ghi"""
+        collection_name, _, columns, _ = SYNC_TABLES[table_name]
+        sync_name = self.sync_name(table_name)
+        watermark = load_position(self.conn, sync_name)
+
+        cursor = self.conn.cursor()
+        total = 0
+        try:
+            # Chốt cận trên một lần để vòng lặp dừng dù bảng vẫn đang được ghi
+            cursor.execute("SELECT CAST(MIN_ACTIVE_ROWVERSION() AS BIGINT)")
+            upper = int(cursor.fetchone()[0])
+
+            while True:
+                cursor.execute(f"""
+                    SELECT TOP (?) {columns}, CAST(row_version AS BIGINT)
+                    FROM {table_name}
+                    WHERE row_version > CAST(CAST(? AS BIGINT) AS BINARY(8))
+                      AND row_version < CAST(CAST(? AS BIGINT) AS BINARY(8))
+                    ORDER BY row_version
+                """, (self.chunk_size, watermark, upper))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+
+                operations, _ = upsert_operations(table_name, [row[:-1] for row in rows])
+                self.db[collection_name].bulk_write(operations, ordered=False)
+
+                watermark = int(rows[-1][-1])
+                save_position(cursor, sync_name, watermark)
+                self.conn.commit()
+                total += len(rows)
+
+                if len(rows) < self.chunk_size:
+                    break
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+        return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đồng bộ tăng dần SQL Server -> MongoDB theo watermark")
+    parser.add_argument('--tables', nargs='+', choices=list(SYNC_TABLES), default=list(SYNC_TABLES))
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--reset', action='store_true', help="xóa watermark, đồng bộ lại toàn bộ")
+    args = parser.parse_args()
+
+    sql_conn = DatabaseConfig.get_sql_connection()
+    mongo_client = DatabaseConfig.get_mongo_client()
+    if sql_conn is None or mongo_client is None:
+        print("Không thể kết nối SQL Server hoặc MongoDB")
+        return 1
+
+    try:
+        sync = IncrementalSync(sql_conn, mongo_client[DatabaseConfig.MONGO_DATABASE], args.chunk_size)
+        for table_name in args.tables:
+            if args.reset:
+                sync.reset(table_name)
+
+            started = time.monotonic()
+            count = sync.sync_table(table_name)
+            elapsed = max(time.monotonic() - started, 1e-9)
+            print(f"{table_name}: {count:,} dòng trong {elapsed:.1f}s ({count / elapsed:,.0f} dòng/s)")
+    finally:
+        sql_conn.close()
+        mongo_client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
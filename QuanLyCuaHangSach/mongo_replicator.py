@@ -0,0 +1,305 @@
+import argparse
+import json
+import time
+from datetime import datetime
+from pymongo import DeleteOne
+from config import DatabaseConfig
+from connection_pool import is_disconnect
+from mongo_sync import (SYNC_TABLES, OUTBOX_TRIGGERS, upsert_operations, load_position, save_position,
+                        set_sync_mode)
+from mongo_write_queue import is_transient_error
+
+
+def _switch_outbox(conn, triggers_enabled=None, mode=None):
+    """Bật / tắt các trigger outbox và / hoặc đổi SyncMode trong một giao dịch"""
+    cursor = conn.cursor()
+    try:
+        if triggers_enabled is not None:
+            action = "ENABLE" if triggers_enabled else "DISABLE"
+            for trigger, table in OUTBOX_TRIGGERS:
+                cursor.execute(f"{action} TRIGGER {trigger} ON {table}")
+        if mode is not None:
+            set_sync_mode(cursor, mode)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def enable_outbox(conn):
+    """Chuyển sang đồng bộ qua outbox: bật trigger trước, rồi mới cho ứng dụng bỏ ghi trực tiếp
+
+    Trong lúc các quầy chưa đọc lại SyncMode, một thay đổi có thể được ghi hai lần (upsert, vô hại)
+    nhưng không bị mất.
+    """
+    _switch_outbox(conn, triggers_enabled=True, mode='outbox')
+
+
+def disable_outbox(replicator, grace_seconds):
+    """Quay về ghi trực tiếp từ ứng dụng mà không mất thay đổi
+
+    'draining' cho các quầy ghi trực tiếp lại trong khi trigger vẫn bật; sau grace_seconds (lớn hơn chu kỳ
+    đọc SyncMode của ứng dụng) mới tắt trigger, đồng bộ nốt outbox rồi đặt 'direct'. Không xóa bản ghi
+    outbox chưa đồng bộ.
+    """
+    conn = replicator.conn
+    _switch_outbox(conn, mode='draining')
+    time.sleep(grace_seconds)
+    _switch_outbox(conn, triggers_enabled=False)
+    while replicator.run_once() > 0:
+        pass
+    _switch_outbox(conn, mode='direct')
+
+
+class OutboxReplicator:
+    """Đọc SyncOutbox theo lô và áp dụng lên MongoDB
+
+    Mỗi lô đọc lại trạng thái hiện tại của các bản ghi thay đổi rồi upsert (hoặc xóa nếu
+    bản ghi không còn), nên chạy lại cùng một lô vẫn cho cùng kết quả. Bản ghi outbox chỉ bị
+    xóa sau khi MongoDB ghi xong (at-least-once); xóa đúng các ID đã đọc thay vì lọc theo vị trí
+    để không bỏ sót giao dịch commit muộn với ID nhỏ hơn.
+    """
+
+    def __init__(self, sql_conn, mongo_db, batch_size=5000, sync_name='outbox_replicator', max_attempts=5):
+        self.conn = sql_conn
+        self.db = mongo_db
+        self.batch_size = batch_size
+        self.sync_name = sync_name
+        self.max_attempts = max_attempts
+        self.position = load_position(sql_conn, sync_name)
+        self.dead_lettered = 0
+
+        self.replicated = 0
+        self.started_at = time.monotonic()
+
+    def run_once(self, batch_size=None) -> int:
+        """Đồng bộ một lô, trả về số bản ghi outbox đã xử lý"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT TOP (?) outbox_id, table_name, entity_id
+                FROM SyncOutbox
+                ORDER BY outbox_id
+            """, (batch_size or self.batch_size,))
+            entries = cursor.fetchall()
+            if not entries:
+                self.conn.commit()
+                return 0
+
+            changed = {}
+            for _, table_name, entity_id in entries:
+                changed.setdefault(table_name, set()).add(int(entity_id))
+
+            for table_name, entity_ids in changed.items():
+                if table_name in SYNC_TABLES:
+                    self._replicate(cursor, table_name, entity_ids)
+
+            last_id = max(self.position, max(int(entry[0]) for entry in entries))
+            save_position(cursor, self.sync_name, last_id)
+            cursor.execute("""
+                DELETE o
+                FROM SyncOutbox o
+                JOIN OPENJSON(?) ids ON o.outbox_id = CAST(ids.value AS BIGINT)
+            """, (json.dumps([int(entry[0]) for entry in entries]),))
+            self.conn.commit()
+
+            self.position = last_id
+            self.replicated += len(entries)
+            return len(entries)
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def _replicate(self, cursor, table_name, entity_ids):
+        collection_name, key, columns, _ = SYNC_TABLES[table_name]
+
+        cursor.execute(f"""
+            SELECT {columns}
+            FROM OPENJSON(?) ids
+            JOIN {table_name} ON {table_name}.{key} = CAST(ids.value AS INT)
+        """, (json.dumps(sorted(entity_ids)),))
+
+        operations, found = upsert_operations(table_name, cursor.fetchall())
+        for entity_id in entity_ids - found:
+            operations.append(DeleteOne({key: entity_id}))
+
+        if operations:
+            self.db[collection_name].bulk_write(operations, ordered=False)
+
+    def lag(self) -> dict:
+        """Độ trễ: số bản ghi outbox chưa đồng bộ và tuổi của bản ghi cũ nhất"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT COUNT_BIG(*), DATEDIFF(SECOND, MIN(created_at), SYSUTCDATETIME())
+                FROM SyncOutbox
+            """)
+            pending, oldest = cursor.fetchone()
+            self.conn.commit()
+            return {
+                'position': self.position,
+                'pending': int(pending or 0),
+                'oldest_pending_seconds': int(oldest or 0)
+            }
+        finally:
+            cursor.close()
+
+    def dead_letter(self, count, error):
+        """Chuyển count bản ghi đầu outbox sang SyncOutboxDeadLetter"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("""
+                WITH head AS (
+                    SELECT TOP (?) * FROM SyncOutbox ORDER BY outbox_id
+                )
+                DELETE FROM head
+                OUTPUT DELETED.outbox_id, DELETED.table_name, DELETED.entity_id, DELETED.operation,
+                       DELETED.created_at, ?
+                INTO SyncOutboxDeadLetter (outbox_id, table_name, entity_id, operation, created_at, error)
+            """, (count, str(error)[:2000]))
+            moved = cursor.rowcount
+            self.conn.commit()
+            self.dead_lettered += max(moved, 0)
+            return moved
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def requeue_dead_letters(self):
+        """Đưa các bản ghi dead-letter về lại outbox (sau khi đã sửa nguyên nhân lỗi)"""
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("""
+                SET NOCOUNT ON;
+                DELETE FROM SyncOutboxDeadLetter
+                OUTPUT DELETED.table_name, DELETED.entity_id, DELETED.operation, DELETED.created_at
+                INTO SyncOutbox (table_name, entity_id, operation, created_at);
+                SELECT @@ROWCOUNT;
+            """)
+            moved = cursor.fetchone()[0]
+            self.conn.commit()
+            return int(moved)
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def _reconnect(self):
+        conn = DatabaseConfig.get_sql_connection()
+        if conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = conn
+
+    def run_forever(self, interval=1.0, report_every=30, max_backoff=60):
+        """Chạy liên tục; nghỉ interval giây khi outbox đã hết
+
+        Lỗi kết nối (SQL / MongoDB) được thử lại mãi với thời gian chờ tăng dần. Lô lỗi khác lặp lại
+        max_attempts lần thì được đồng bộ lại từng bản ghi một; bản ghi nào vẫn lỗi max_attempts lần
+        thì chuyển sang SyncOutboxDeadLetter để các bản ghi sau tiếp tục được đồng bộ.
+        """
+        last_report = 0
+        failures = 0
+        isolating = 0   # số bản ghi còn phải đồng bộ từng cái một (lô vừa lỗi lặp lại)
+        while True:
+            batch_size = 1 if isolating else self.batch_size
+            try:
+                processed = self.run_once(batch_size)
+            except Exception as e:
+                transient = is_transient_error(e) or is_disconnect(e)
+                print(f"[{datetime.now():%H:%M:%S}] lỗi đồng bộ ({'tạm thời' if transient else 'lặp lại'}): {e}")
+                if transient:
+                    if is_disconnect(e):
+                        self._reconnect()
+                    failures = min(failures + 1, 16)
+                else:
+                    failures += 1
+                    if failures >= self.max_attempts:
+                        failures = 0
+                        if not isolating:
+                            isolating = batch_size
+                        else:
+                            self.dead_letter(1, e)
+                            isolating -= 1
+                time.sleep(min(interval * 2 ** failures, max_backoff))
+                continue
+
+            failures = 0
+            if isolating:
+                isolating = max(isolating - processed, 0) if processed else 0
+
+            if time.monotonic() - last_report >= report_every:
+                last_report = time.monotonic()
+                self.report()
+
+            if processed < batch_size:
+                time.sleep(interval)
+
+    def report(self):
+        lag = self.lag()
+        elapsed = max(time.monotonic() - self.started_at, 1e-9)
+        print(f"[{datetime.now():%H:%M:%S}] vị trí {lag['position']} | đã đồng bộ {self.replicated:,} "
+              f"({self.replicated / elapsed:,.0f}/s) | chờ {lag['pending']:,} "
+              f"| trễ {lag['oldest_pending_seconds']}s | dead-letter {self.dead_lettered:,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đồng bộ SyncOutbox từ SQL Server sang MongoDB")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--interval', type=float, default=1.0, help="giây nghỉ khi outbox trống")
+    parser.add_argument('--once', action='store_true', help="chạy đến khi outbox trống rồi thoát")
+    parser.add_argument('--status', action='store_true', help="chỉ in độ trễ hiện tại")
+    parser.add_argument('--disable', action='store_true',
+                        help="quay về đồng bộ trực tiếp từ ứng dụng: tắt trigger outbox sau khi đồng bộ nốt outbox")
+    parser.add_argument('--grace', type=float, default=DatabaseConfig.SYNC_MODE_REFRESH_INTERVAL * 3,
+                        help="giây chờ các quầy đọc lại SyncMode trước khi tắt trigger (--disable)")
+    parser.add_argument('--requeue-dead', action='store_true',
+                        help="đưa các bản ghi trong SyncOutboxDeadLetter về lại outbox")
+    args = parser.parse_args()
+
+    sql_conn = DatabaseConfig.get_sql_connection()
+    mongo_client = DatabaseConfig.get_mongo_client()
+    if sql_conn is None or mongo_client is None:
+        print("Không thể kết nối SQL Server hoặc MongoDB")
+        return 1
+
+    replicator = None
+    try:
+        replicator = OutboxReplicator(sql_conn, mongo_client[DatabaseConfig.MONGO_DATABASE],
+                                      batch_size=args.batch_size)
+        if args.status:
+            replicator.report()
+        elif args.disable:
+            disable_outbox(replicator, args.grace)
+            print("Đã tắt trigger outbox, đồng bộ nốt SyncOutbox và chuyển về ghi trực tiếp")
+            replicator.report()
+        elif args.requeue_dead:
+            print(f"Đã đưa {replicator.requeue_dead_letters():,} bản ghi dead-letter về outbox")
+        elif args.once:
+            enable_outbox(sql_conn)
+            while replicator.run_once() == args.batch_size:
+                pass
+            replicator.report()
+        else:
+            enable_outbox(sql_conn)
+            replicator.run_forever(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # run_forever có thể đã kết nối lại SQL Server
+        (replicator.conn if replicator else sql_conn).close()
+        mongo_client.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,94 @@
+from datetime import datetime, date
+
+
+def _month_range(year, month):
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+class MongoReports:
+    """Báo cáo tính bằng aggregation pipeline trên MongoDB, cùng định dạng kết quả với bản SQL
+
+    Document đơn hàng nhúng sẵn chi tiết đơn và thông tin khách hàng nên mỗi báo cáo chỉ quét
+    collection 'orders', không cần $lookup. Mỗi hàm trả về None khi MongoDB lỗi để nơi gọi
+    quay về truy vấn SQL.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def best_selling_books(self, year: int, month: int, limit: int = 10):
+        """Sách bán chạy trong tháng: (book_code, title, author, publisher, total_sold, total_revenue)"""
+        start, end = _month_range(year, month)
+        pipeline = [
+            {"$match": {"status": "Completed", "order_date": {"$gte": start, "$lt": end}}},
+            {"$unwind": "$items"},
+            {"$group": {
+                "_id": "$items.book_id",
+                "book_code": {"$first": "$items.book_code"},
+                "title": {"$first": "$items.title"},
+                "author": {"$first": "$items.author"},
+                "publisher": {"$first": "$items.publisher"},
+                "total_sold": {"$sum": "$items.quantity"},
+                "total_revenue": {"$sum": "$items.subtotal"}
+            }},
+            {"$sort": {"total_sold": -1}},
+            {"$limit": limit},
+        ]
+        return self._aggregate("orders", pipeline, lambda doc: (
+            doc.get("book_code"),
+            doc.get("title"),
+            doc.get("author"),
+            doc.get("publisher"),
+            doc["total_sold"],
+            doc["total_revenue"]
+        ))
+
+    def customers_by_purchases(self, limit: int = 10):
+        """Khách hàng mua nhiều nhất: (customer_code, full_name, phone_number, total_books, total_orders, total_spent)"""
+        pipeline = [
+            {"$match": {"status": "Completed", "customer_id": {"$ne": None}}},
+            {"$group": {
+                "_id": "$customer_id",
+                "customer": {"$last": "$customer"},
+                "total_books": {"$sum": {"$sum": {"$ifNull": ["$items.quantity", []]}}},
+                "total_orders": {"$sum": 1},
+                "total_spent": {"$sum": "$total_amount"}
+            }},
+            {"$sort": {"total_books": -1, "total_spent": -1}},
+            {"$limit": limit},
+        ]
+        return self._aggregate("orders", pipeline, lambda doc: (
+            (doc.get("customer") or {}).get("customer_code"),
+            (doc.get("customer") or {}).get("full_name"),
+            (doc.get("customer") or {}).get("phone_number"),
+            doc["total_books"],
+            doc["total_orders"],
+            doc["total_spent"]
+        ))
+
+    def order_statistics_by_date(self, start_date, end_date):
+        """Số đơn hoàn thành và doanh thu trong khoảng thời gian: (total_orders, total_revenue)"""
+        if isinstance(start_date, date) and not isinstance(start_date, datetime):
+            start_date = datetime.combine(start_date, datetime.min.time())
+        if isinstance(end_date, date) and not isinstance(end_date, datetime):
+            end_date = datetime.combine(end_date, datetime.max.time())
+
+        pipeline = [
+            {"$match": {"status": "Completed", "order_date": {"$gte": start_date, "$lte": end_date}}},
+            {"$group": {"_id": None, "total_orders": {"$sum": 1}, "total_revenue": {"$sum": "$total_amount"}}},
+        ]
+        rows = self._aggregate("orders", pipeline, lambda doc: (doc["total_orders"], doc["total_revenue"]))
+        if rows is None:
+            return None
+        return rows[0] if rows else (0, 0)
+
+    def _aggregate(self, collection_name, pipeline, to_row):
+        if self.db is None:
+            return None
+
+        try:
+            return [to_row(doc) for doc in self.db[collection_name].aggregate(pipeline, allowDiskUse=True)]
+        except Exception:
+            return None
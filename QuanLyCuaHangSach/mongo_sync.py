@@ -0,0 +1,131 @@
+from datetime import datetime
+from pymongo import UpdateOne
+from mongo_schema import compile_row_converter
+
+
+# Chi tiết đơn hàng nhúng trong document đơn hàng, kèm thông tin sách tại thời điểm đồng bộ
+ORDER_ITEMS_SQL = """(
+    SELECT od.book_id, b.book_code, b.title, b.author, b.publisher,
+           od.quantity, od.unit_price, od.subtotal
+    FROM OrderDetails od
+    JOIN Books b ON b.book_id = od.book_id
+    WHERE od.order_id = Orders.order_id
+    ORDER BY od.order_detail_id
+    FOR JSON PATH
+)"""
+
+# Bản sao thông tin khách hàng của đơn hàng
+ORDER_CUSTOMER_SQL = """(
+    SELECT c.customer_id, c.customer_code, c.full_name, c.phone_number
+    FROM Customers c
+    WHERE c.customer_id = Orders.customer_id
+    FOR JSON PATH, WITHOUT_ARRAY_WRAPPER
+)"""
+
+# Bảng SQL -> (collection, khóa, các cột: tên cột hoặc (biểu thức SQL, tên trường))
+_TABLES = {
+    'Books': ('books', 'book_id',
+              ['book_id', 'book_code', 'title', 'author', 'publisher', 'publish_year', 'quantity_in_stock', 'price']),
+    'Customers': ('customers', 'customer_id',
+                  ['customer_id', 'customer_code', 'full_name', 'address', 'phone_number']),
+    'Orders': ('orders', 'order_id',
+               ['order_id', 'order_code', 'customer_id', 'order_date', 'total_amount', 'status',
+                (ORDER_ITEMS_SQL, 'items'), (ORDER_CUSTOMER_SQL, 'customer')]),
+    'ImportBooks': ('imports', 'import_id',
+                    ['import_id', 'import_code', 'import_date', 'supplier', 'total_amount'])
+}
+
+
+def _select_list(columns):
+    return ", ".join(column if isinstance(column, str) else f"{column[0]} AS {column[1]}" for column in columns)
+
+
+def _field_names(columns):
+    return [column if isinstance(column, str) else column[1] for column in columns]
+
+
+# Bảng SQL -> (collection, khóa, danh sách SELECT, hàm tạo document sinh từ schema)
+SYNC_TABLES = {
+    table_name: (collection_name, key, _select_list(columns),
+                 compile_row_converter(collection_name, _field_names(columns)))
+    for table_name, (collection_name, key, columns) in _TABLES.items()
+}
+
+
+def upsert_operations(table_name, rows, now=None):
+    """Tạo các UpdateOne(upsert) cho một lô dòng; trả về (operations, tập khóa đã có)"""
+    _, key, _, to_document = SYNC_TABLES[table_name]
+    now = now or datetime.now()
+
+    operations = []
+    keys = set()
+    for row in rows:
+        document = to_document(row)
+        document['source'] = 'sql_sync'
+        document['synced_at'] = now
+        keys.add(document[key])
+        operations.append(UpdateOne(
+            {key: document[key]},
+            {"$set": document, "$setOnInsert": {"created_at": now}},
+            upsert=True
+        ))
+    return operations, keys
+
+
+# Trigger ghi SyncOutbox (BSM_Create.sql)
+OUTBOX_TRIGGERS = (
+    ('trg_Outbox_Books', 'Books'),
+    ('trg_Outbox_Customers', 'Customers'),
+    ('trg_Outbox_Orders', 'Orders'),
+    ('trg_Outbox_ImportBooks', 'ImportBooks'),
+)
+
+# 1 nếu ứng dụng được bỏ ghi MongoDB trực tiếp: chế độ 'outbox' và mọi trigger outbox đang bật
+OUTBOX_ACTIVE_SQL = f"""
+    SELECT CASE WHEN m.mode = 'outbox'
+                 AND (SELECT COUNT(*) FROM sys.triggers
+                      WHERE is_disabled = 0
+                        AND name IN ({", ".join(f"'{trigger}'" for trigger, _ in OUTBOX_TRIGGERS)})) = {len(OUTBOX_TRIGGERS)}
+                THEN 1 ELSE 0 END
+    FROM SyncMode m
+    WHERE m.id = 1
+"""
+
+
+def mark_parent_written(session_key, id_expression):
+    """SQL ghi nhận dòng cha đã được ghi trong giao dịch hiện tại (trigger chạm dòng cha sẽ bỏ qua nó)
+
+    Giá trị gắn với CURRENT_TRANSACTION_ID() nên không ảnh hưởng giao dịch sau trên cùng kết nối.
+    """
+    return f"""
+        DECLARE @{session_key} VARCHAR(40) = CONCAT(CURRENT_TRANSACTION_ID(), ':', {id_expression});
+        EXEC sp_set_session_context N'{session_key}', @{session_key};
+    """
+
+
+def set_sync_mode(cursor, mode):
+    cursor.execute("UPDATE SyncMode SET mode = ?, updated_at = SYSUTCDATETIME() WHERE id = 1", (mode,))
+
+
+def load_position(conn, sync_name) -> int:
+    """Đọc vị trí đã lưu trong SyncState (tạo mới bằng 0 nếu chưa có)"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SET NOCOUNT ON;
+            IF NOT EXISTS (SELECT 1 FROM SyncState WHERE sync_name = ?)
+                INSERT INTO SyncState (sync_name, position) VALUES (?, 0);
+            SELECT position FROM SyncState WHERE sync_name = ?;
+        """, (sync_name, sync_name, sync_name))
+        position = cursor.fetchone()[0]
+        conn.commit()
+        return int(position)
+    finally:
+        cursor.close()
+
+
+def save_position(cursor, sync_name, position):
+    cursor.execute(
+        "UPDATE SyncState SET position = ?, updated_at = SYSUTCDATETIME() WHERE sync_name = ?",
+        (position, sync_name)
+    )
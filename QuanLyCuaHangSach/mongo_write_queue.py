@@ -0,0 +1,214 @@
+import queue
+import threading
+import time
+from pymongo import InsertOne, UpdateOne, ReplaceOne, DeleteOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, ExecutionTimeout, WTimeoutError, PyMongoError
+
+
+def is_transient_error(error):
+    """Lỗi MongoDB có thể tự hết khi thử lại: mất kết nối, failover, timeout"""
+    if isinstance(error, (ConnectionFailure, ExecutionTimeout, WTimeoutError)):
+        return True
+    return isinstance(error, PyMongoError) and error.has_error_label("RetryableWriteError")
+
+
+class MongoWriteQueue:
+    """Hàng đợi ghi trễ (write-behind) cho MongoDB
+
+    Thao tác được gom theo lô và ghi bằng bulk_write trên một luồng nền, khi đủ batch_size
+    hoặc sau flush_interval giây. Hàng đợi giới hạn max_pending thao tác: khi đầy, nơi gọi
+    bị chặn tối đa put_timeout giây (backpressure) rồi thao tác bị bỏ và được đếm vào 'dropped'.
+    Lỗi tạm thời (mất kết nối, failover, timeout) không làm mất lô: các thao tác chưa ghi được giữ
+    lại đầu hàng đợi và ghi lại với thời gian chờ tăng dần (retry_delay .. max_retry_delay); chỉ lỗi
+    vĩnh viễn (dữ liệu / quyền) mới bị bỏ và đếm vào 'failed'.
+    """
+
+    _STOP = object()
+
+    def __init__(self, db, batch_size=500, flush_interval=0.5, max_pending=10000, put_timeout=2.0,
+                 retry_delay=0.5, max_retry_delay=30.0, close_retries=3):
+        self.db = db
+        self.batch_size = max(batch_size, 1)
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.close_retries = close_retries
+
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._wake = threading.Event()
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retrying = 0
+        self.last_error = None
+
+        self._thread = threading.Thread(target=self._run, name='mongo-write-behind', daemon=True)
+        self._thread.start()
+
+    def insert(self, collection_name: str, document: dict):
+        return self._put(collection_name, InsertOne(document))
+
+    def upsert(self, collection_name: str, filter_data: dict, update_data: dict):
+        return self._put(collection_name, UpdateOne(filter_data, {"$set": update_data}, upsert=True))
+
+    def replace(self, collection_name: str, filter_data: dict, document: dict):
+        return self._put(collection_name, ReplaceOne(filter_data, document, upsert=True))
+
+    def delete(self, collection_name: str, filter_data: dict):
+        return self._put(collection_name, DeleteOne(filter_data))
+
+    def _put(self, collection_name, operation):
+        if self._closed:
+            return False
+
+        try:
+            self._queue.put((collection_name, operation), timeout=self.put_timeout)
+            self.enqueued += 1
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        backlog = []    # thao tác gặp lỗi tạm thời, được ghi lại trước mọi thao tác mới để giữ thứ tự
+        attempts = 0
+        close_attempts = 0
+        stop = False
+        while True:
+            if backlog:
+                batch = backlog
+            else:
+                if stop:
+                    self._queue.task_done()
+                    return
+
+                item = self._queue.get()
+                if item is self._STOP:
+                    self._queue.task_done()
+                    return
+
+                batch = [item]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is self._STOP:
+                        stop = True
+                        break
+                    batch.append(item)
+
+            try:
+                backlog = self._write(batch)
+            except Exception as e:
+                self.last_error = e
+                self.failed += len(batch)
+                backlog = []
+
+            for _ in range(len(batch) - len(backlog)):
+                self._queue.task_done()
+
+            self.retrying = len(backlog)
+            if not backlog:
+                attempts = 0
+                continue
+
+            attempts += 1
+            if self._closed:
+                # Đang đóng ứng dụng và MongoDB vẫn chưa sẵn sàng: thử thêm vài lần rồi bỏ, không chặn việc thoát
+                close_attempts += 1
+                if close_attempts > self.close_retries:
+                    self.failed += len(backlog)
+                    for _ in backlog:
+                        self._queue.task_done()
+                    backlog = []
+                    self.retrying = 0
+                    continue
+                self._wake.wait(self.retry_delay)
+            else:
+                self._wake.wait(min(self.retry_delay * 2 ** (attempts - 1), self.max_retry_delay))
+
+    def _write(self, batch):
+        """Ghi một lô, tách theo collection và giữ nguyên thứ tự trong từng collection
+
+        Trả về các thao tác chưa ghi được do lỗi tạm thời (để ghi lại), theo thứ tự ban đầu.
+        """
+        by_collection = {}
+        for collection_name, operation in batch:
+            by_collection.setdefault(collection_name, []).append(operation)
+
+        remaining = []
+        for collection_name, operations in by_collection.items():
+            if remaining:
+                # Collection trước đang chờ ghi lại thì các collection sau cũng chờ theo
+                remaining.extend((collection_name, operation) for operation in operations)
+                continue
+
+            while operations:
+                try:
+                    self.db[collection_name].bulk_write(operations, ordered=True)
+                    self.written += len(operations)
+                    break
+                except BulkWriteError as e:
+                    self.last_error = e
+                    write_errors = e.details.get('writeErrors') or []
+                    if not write_errors:
+                        # Chỉ lỗi write concern: thao tác đã được ghi trên primary
+                        self.written += len(operations)
+                        break
+                    # Bỏ qua thao tác lỗi, tiếp tục các thao tác phía sau
+                    self.failed += 1
+                    index = write_errors[0]['index']
+                    self.written += index
+                    operations = operations[index + 1:]
+                except Exception as e:
+                    self.last_error = e
+                    if is_transient_error(e):
+                        remaining.extend((collection_name, operation) for operation in operations)
+                    else:
+                        self.failed += len(operations)
+                    break
+
+        return remaining
+
+    def flush(self, timeout=None):
+        """Chờ ghi hết các thao tác đang chờ"""
+        if timeout is None:
+            self._queue.join()
+            return True
+
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self):
+        """Thống kê hàng đợi"""
+        return {
+            'pending': self._queue.qsize(),
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'retrying': self.retrying,
+            'last_error': str(self.last_error) if self.last_error else None
+        }
+
+    def close(self, timeout=10):
+        """Ghi nốt các thao tác còn lại rồi dừng luồng nền"""
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._queue.put(self._STOP)
+        self._thread.join(timeout)
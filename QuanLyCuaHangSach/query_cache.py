@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+
+class QueryCache:
+    """Cache kết quả đọc có TTL, giới hạn kích thước (LRU) và hủy theo tag"""
+
+    def __init__(self, max_entries=256, ttl=60):
+        self.max_entries = max(max_entries, 1)
+        self.ttl = ttl
+
+        self._entries = OrderedDict()
+        self._tag_versions = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_load(self, key, loader, tags=(), ttl=None, store_if=None):
+        """Trả về giá trị trong cache, hoặc gọi loader rồi lưu lại
+
+        store_if() được gọi sau loader; trả về False thì giá trị chỉ được trả về, không lưu.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            versions = self._versions(tags)
+
+        value = loader()
+
+        with self._lock:
+            # Bỏ qua nếu có thao tác ghi làm mất hiệu lực trong lúc đang đọc
+            if versions != self._versions(tags):
+                return value
+            if store_if is not None and not store_if():
+                return value
+
+            expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+            self._entries[key] = (expires, value, tuple(tags))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return value
+
+    def _versions(self, tags):
+        return tuple(self._tag_versions.get(tag, 0) for tag in tags)
+
+    def invalidate(self, *tags):
+        """Xóa mọi mục gắn với một trong các tag"""
+        tags = set(tags)
+        with self._lock:
+            for tag in tags:
+                self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+
+            stale = [key for key, entry in self._entries.items() if tags.intersection(entry[2])]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        """Xóa toàn bộ cache"""
+        with self._lock:
+            for tag in list(self._tag_versions):
+                self._tag_versions[tag] += 1
+            self._entries.clear()
+
+    def stats(self):
+        """Thống kê hit/miss"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
+
+
+def cached(*tags, ttl=None):
+    """Decorator cho hàm đọc của DatabaseManager, khóa theo tên hàm và tham số
+
+    Kết quả đọc trong lúc có lỗi mới ghi vào self.last_error (giá trị dự phòng, dữ liệu thiếu)
+    không được lưu vào cache.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            cache = getattr(self, 'cache', None)
+            if cache is None:
+                return func(self, *args, **kwargs)
+
+            key = (func.__name__, args, tuple(sorted(kwargs.items())))
+            error = getattr(self, 'last_error', None)
+            value = cache.get_or_load(key, lambda: func(self, *args, **kwargs), tags, ttl,
+                                      store_if=lambda: getattr(self, 'last_error', None) is error)
+            # Trả bản sao để nơi gọi không sửa được dữ liệu trong cache
+            return list(value) if isinstance(value, list) else value
+        return wrapper
+    return decorator
+
+
+def invalidates(*tags):
+    """Decorator cho hàm ghi: hủy các mục cache liên quan sau khi chạy"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                cache = getattr(self, 'cache', None)
+                if cache is not None:
+                    cache.invalidate(*tags)
+        return wrapper
+    return decorator
@@ -0,0 +1,121 @@
+import argparse
+from datetime import datetime, date, time, timedelta
+from config import DatabaseConfig
+
+# RevenueDaily / RevenueMonthly được trigger trên Orders / OrderDetails giữ đúng (BSM_Create.sql), kể cả khi
+# đổi trạng thái đơn bằng SQL trực tiếp. Tính lại toàn bộ chỉ cần khi sửa dữ liệu lúc trigger bị tắt.
+
+# Tính lại toàn bộ rollup từ Orders. Khóa Orders trước (như complete_order) để không deadlock
+# và không có đơn nào hoàn thành chen vào giữa lúc tính lại.
+REBUILD_ROLLUPS_SQL = """
+    SET NOCOUNT ON;
+    SET XACT_ABORT ON;
+
+    SELECT CAST(o.order_date AS DATE) AS revenue_date,
+           COUNT(*) AS order_count,
+           ISNULL(SUM(o.total_amount), 0) AS revenue,
+           ISNULL(SUM(d.items), 0) AS item_count
+    INTO #daily
+    FROM Orders o WITH (TABLOCK, HOLDLOCK)
+    LEFT JOIN (SELECT order_id, SUM(quantity) AS items FROM OrderDetails GROUP BY order_id) d
+        ON d.order_id = o.order_id
+    WHERE o.status = 'Completed'
+    GROUP BY CAST(o.order_date AS DATE);
+
+    DELETE FROM RevenueDaily;
+    DELETE FROM RevenueMonthly;
+
+    INSERT INTO RevenueDaily (revenue_date, order_count, revenue, item_count)
+    SELECT revenue_date, order_count, revenue, item_count FROM #daily;
+
+    INSERT INTO RevenueMonthly (revenue_month, order_count, revenue, item_count)
+    SELECT DATEFROMPARTS(YEAR(revenue_date), MONTH(revenue_date), 1),
+           SUM(order_count), SUM(revenue), SUM(item_count)
+    FROM #daily
+    GROUP BY DATEFROMPARTS(YEAR(revenue_date), MONTH(revenue_date), 1);
+
+    DROP TABLE #daily;
+
+    SELECT COUNT(*) FROM RevenueDaily;
+"""
+
+# Tổng hợp khoảng [ngày đầu, ngày cuối]: các tháng trọn vẹn đọc từ RevenueMonthly,
+# phần ngày lẻ hai đầu đọc từ RevenueDaily
+RANGE_TOTALS_SQL = """
+    SELECT ISNULL(SUM(order_count), 0), ISNULL(SUM(revenue), 0), ISNULL(SUM(item_count), 0)
+    FROM (
+        SELECT order_count, revenue, item_count
+        FROM RevenueMonthly
+        WHERE revenue_month >= ? AND revenue_month < ?
+        UNION ALL
+        SELECT order_count, revenue, item_count
+        FROM RevenueDaily
+        WHERE revenue_date >= ? AND revenue_date <= ?
+          AND NOT (revenue_date >= ? AND revenue_date < ?)
+    ) r
+"""
+
+
+def _month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def _next_month(day: date) -> date:
+    return date(day.year + 1, 1, 1) if day.month == 12 else date(day.year, day.month + 1, 1)
+
+
+def whole_day_range(start_date, end_date):
+    """Trả về (ngày đầu, ngày cuối) nếu khoảng thời gian gồm trọn các ngày, ngược lại None"""
+    if not isinstance(start_date, datetime) or not isinstance(end_date, datetime):
+        return None
+    if start_date.time() != time.min or end_date.time() < time(23, 59, 59):
+        return None
+    if end_date.date() < start_date.date():
+        return None
+    return start_date.date(), end_date.date()
+
+
+def range_totals_params(first_day: date, last_day: date):
+    """Tham số cho RANGE_TOTALS_SQL"""
+    full_from = first_day if first_day.day == 1 else _next_month(first_day)
+    full_to = _month_start(last_day + timedelta(days=1))
+    if full_from >= full_to:
+        full_from = full_to = first_day
+    return full_from, full_to, first_day, last_day, full_from, full_to
+
+
+def rebuild(conn) -> int:
+    """Tính lại RevenueDaily / RevenueMonthly, trả về số ngày có doanh thu"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(REBUILD_ROLLUPS_SQL)
+        days = cursor.fetchone()[0]
+        conn.commit()
+        return int(days)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tính lại bảng tổng hợp doanh thu theo ngày / tháng")
+    parser.parse_args()
+
+    conn = DatabaseConfig.get_sql_connection()
+    if conn is None:
+        print("Không thể kết nối SQL Server")
+        return 1
+
+    try:
+        started = datetime.now()
+        days = rebuild(conn)
+        print(f"Đã tính lại doanh thu cho {days:,} ngày trong {(datetime.now() - started).total_seconds():.1f}s")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,381 @@
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+_TOKEN_RE = re.compile(r'[0-9a-z]+')
+_DIGIT_RE = re.compile(r'\D')
+
+
+def fold_vietnamese(text) -> str:
+    """Bỏ dấu tiếng Việt và chuyển về chữ thường: 'Đắc Nhân Tâm' -> 'dac nhan tam'"""
+    if text is None:
+        return ""
+    text = str(text)
+    if text.isascii():
+        return text.lower()
+    text = text.replace('đ', 'd').replace('Đ', 'D')
+    text = unicodedata.normalize('NFD', text)
+    return ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn').lower()
+
+
+def tokenize(text) -> list:
+    """Tách từ sau khi bỏ dấu"""
+    return _TOKEN_RE.findall(fold_vietnamese(text))
+
+
+def normalize_phone(phone) -> str:
+    """Chỉ giữ chữ số, đổi đầu số +84 về 0: '+84 912-345-678' -> '0912345678'"""
+    if phone is None:
+        return ""
+    text = str(phone).strip()
+    digits = _DIGIT_RE.sub('', text)
+    if text.startswith('+84') or (digits.startswith('84') and len(digits) > 10):
+        digits = '0' + digits[2:]
+    return digits
+
+
+def trigrams(token: str) -> set:
+    padded = f"${token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _FieldIndex:
+    """Chỉ mục ngược cho một trường: từ -> tập id, kèm từ điển đã sắp xếp và trigram"""
+
+    EXACT_SCORE = 1.0
+    PREFIX_SCORE = 0.8
+    FUZZY_SCORE = 0.6
+
+    def __init__(self, max_expansions=64, min_similarity=0.45):
+        self.max_expansions = max_expansions
+        self.min_similarity = min_similarity
+        self.postings = {}
+        self.vocab = []
+        self.trigram_tokens = {}
+
+    def add(self, doc_id, tokens, keep_sorted=True):
+        for token in tokens:
+            ids = self.postings.get(token)
+            if ids is None:
+                ids = self.postings[token] = set()
+                if keep_sorted:
+                    insort(self.vocab, token)
+                else:
+                    self.vocab.append(token)
+                for gram in trigrams(token):
+                    self.trigram_tokens.setdefault(gram, set()).add(token)
+            ids.add(doc_id)
+
+    def remove(self, doc_id, tokens):
+        for token in tokens:
+            ids = self.postings.get(token)
+            if ids is None:
+                continue
+            ids.discard(doc_id)
+            if ids:
+                continue
+
+            del self.postings[token]
+            pos = bisect_left(self.vocab, token)
+            if pos < len(self.vocab) and self.vocab[pos] == token:
+                del self.vocab[pos]
+            for gram in trigrams(token):
+                grams = self.trigram_tokens.get(gram)
+                if grams is not None:
+                    grams.discard(token)
+                    if not grams:
+                        del self.trigram_tokens[gram]
+
+    def match(self, token) -> dict:
+        """Trả về {id: điểm} cho một từ truy vấn: khớp đúng, khớp tiền tố, rồi mới đến gần đúng"""
+        scores = {}
+
+        exact = self.postings.get(token)
+        if exact:
+            scores = dict.fromkeys(exact, self.EXACT_SCORE)
+
+        pos = bisect_left(self.vocab, token)
+        expanded = 0
+        while pos < len(self.vocab) and expanded < self.max_expansions:
+            candidate = self.vocab[pos]
+            if not candidate.startswith(token):
+                break
+            if candidate != token:
+                for doc_id in self.postings[candidate]:
+                    if scores.get(doc_id, 0) < self.PREFIX_SCORE:
+                        scores[doc_id] = self.PREFIX_SCORE
+                expanded += 1
+            pos += 1
+
+        if scores or len(token) < 3:
+            return scores
+
+        for candidate, similarity in self._similar_tokens(token):
+            score = self.FUZZY_SCORE * similarity
+            for doc_id in self.postings[candidate]:
+                if scores.get(doc_id, 0) < score:
+                    scores[doc_id] = score
+        return scores
+
+    def _similar_tokens(self, token):
+        """Các từ gần giống (độ tương đồng Jaccard trên trigram) để chịu lỗi gõ"""
+        grams = trigrams(token)
+        overlap = {}
+        for gram in grams:
+            for candidate in self.trigram_tokens.get(gram, ()):
+                overlap[candidate] = overlap.get(candidate, 0) + 1
+
+        similar = []
+        for candidate, shared in overlap.items():
+            similarity = shared / (len(grams) + len(trigrams(candidate)) - shared)
+            if similarity >= self.min_similarity:
+                similar.append((candidate, similarity))
+
+        similar.sort(key=lambda item: -item[1])
+        return similar[:self.max_expansions]
+
+
+class BookSearchIndex:
+    """Chỉ mục tìm kiếm sách trong bộ nhớ, không phân biệt dấu và chịu lỗi gõ
+
+    Nhận các dòng có cùng thứ tự cột với get_all_books:
+    (book_id, book_code, title, author, publisher, publish_year, quantity_in_stock, price).
+    """
+
+    FIELDS = {'book_code': 1, 'title': 2, 'author': 3, 'publisher': 4}
+    WEIGHTS = {'title': 3.0, 'book_code': 2.0, 'author': 2.0, 'publisher': 1.0}
+
+    def __init__(self):
+        self.fields = {field: _FieldIndex() for field in self.FIELDS}
+        self.docs = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.docs)
+
+    def build(self, rows):
+        """Nạp toàn bộ danh mục một lần, sắp xếp từ điển sau khi nạp xong"""
+        with self._lock:
+            for row in rows:
+                self._add(row, keep_sorted=False)
+            for field_index in self.fields.values():
+                field_index.vocab.sort()
+        return self
+
+    def add(self, row):
+        """Thêm hoặc cập nhật một sách"""
+        with self._lock:
+            self._add(row)
+
+    def _add(self, row, keep_sorted=True):
+        book_id = int(row[0])
+        tokens = {field: set(tokenize(row[column])) for field, column in self.FIELDS.items()}
+        publish_year = int(row[5]) if row[5] else 0
+        price = float(row[7]) if row[7] else 0.0
+
+        self._remove(book_id)
+        for field, field_tokens in tokens.items():
+            self.fields[field].add(book_id, field_tokens, keep_sorted)
+        self.docs[book_id] = (tokens, publish_year, price, fold_vietnamese(row[2]))
+
+    def remove(self, book_id):
+        """Xóa một sách khỏi chỉ mục"""
+        with self._lock:
+            self._remove(int(book_id))
+
+    def _remove(self, book_id):
+        doc = self.docs.pop(book_id, None)
+        if doc is None:
+            return
+        for field, field_tokens in doc[0].items():
+            self.fields[field].remove(book_id, field_tokens)
+
+    def search(self, query=None, limit=None, **kwargs):
+        """Trả về danh sách book_id theo thứ tự liên quan
+
+        query tìm trên mọi trường; title/book_code/author/publisher chỉ tìm trên trường tương ứng;
+        publish_year, min_price, max_price là bộ lọc như search_books.
+        """
+        criteria = []
+        if query:
+            criteria.append((tuple(self.FIELDS), query))
+        for field in self.FIELDS:
+            if kwargs.get(field):
+                criteria.append(((field,), kwargs[field]))
+
+        publish_year = int(kwargs['publish_year']) if kwargs.get('publish_year') else None
+        min_price = float(kwargs['min_price']) if kwargs.get('min_price') else None
+        max_price = float(kwargs['max_price']) if kwargs.get('max_price') else None
+
+        with self._lock:
+            scores = None
+            for fields, text in criteria:
+                for token in tokenize(text):
+                    token_scores = self._match(fields, token)
+                    if scores is None:
+                        scores = token_scores
+                    else:
+                        scores = {doc_id: score + token_scores[doc_id]
+                                  for doc_id, score in scores.items() if doc_id in token_scores}
+                    if not scores:
+                        return []
+
+            if scores is None:
+                scores = dict.fromkeys(self.docs, 0.0)
+
+            results = []
+            for doc_id, score in scores.items():
+                _, year, price, title = self.docs[doc_id]
+                if publish_year is not None and year != publish_year:
+                    continue
+                if min_price is not None and price < min_price:
+                    continue
+                if max_price is not None and price > max_price:
+                    continue
+                results.append((-score, title, doc_id))
+
+        results.sort()
+        if limit:
+            results = results[:limit]
+        return [doc_id for _, _, doc_id in results]
+
+    def _match(self, fields, token):
+        combined = {}
+        for field in fields:
+            weight = self.WEIGHTS[field]
+            for doc_id, score in self.fields[field].match(token).items():
+                weighted = score * weight
+                if combined.get(doc_id, 0) < weighted:
+                    combined[doc_id] = weighted
+        return combined
+
+
+class PrefixIndex:
+    """Mảng (khóa, id) đã sắp xếp, tìm theo tiền tố bằng bisect"""
+
+    def __init__(self):
+        self.entries = []
+
+    def build(self, pairs):
+        self.entries = sorted(pairs)
+        return self
+
+    def add(self, key, doc_id):
+        if key:
+            insort(self.entries, (key, doc_id))
+
+    def remove(self, key, doc_id):
+        pos = bisect_left(self.entries, (key, doc_id))
+        if pos < len(self.entries) and self.entries[pos] == (key, doc_id):
+            del self.entries[pos]
+
+    def prefix(self, prefix, limit=None):
+        """Các id có khóa bắt đầu bằng prefix, theo thứ tự khóa"""
+        result = []
+        pos = bisect_left(self.entries, (prefix,))
+        while pos < len(self.entries):
+            key, doc_id = self.entries[pos]
+            if not key.startswith(prefix):
+                break
+            result.append(doc_id)
+            if limit and len(result) >= limit:
+                break
+            pos += 1
+        return result
+
+
+class CustomerSearchIndex:
+    """Chỉ mục tìm khách hàng theo số điện thoại (tiền tố), mã và họ tên không dấu
+
+    Nhận các dòng có cùng thứ tự cột với get_all_customers:
+    (customer_id, customer_code, full_name, address, phone_number).
+    """
+
+    CODE_SCORE = 10.0
+
+    def __init__(self):
+        self.phones = PrefixIndex()
+        self.codes = PrefixIndex()
+        self.names = _FieldIndex()
+        self.docs = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.docs)
+
+    def build(self, rows):
+        """Nạp toàn bộ khách hàng một lần"""
+        with self._lock:
+            for row in rows:
+                self._add(row, keep_sorted=False)
+            self.names.vocab.sort()
+            self.phones.build((doc[1], doc_id) for doc_id, doc in self.docs.items() if doc[1])
+            self.codes.build((doc[2], doc_id) for doc_id, doc in self.docs.items() if doc[2])
+        return self
+
+    def add(self, row):
+        """Thêm hoặc cập nhật một khách hàng"""
+        with self._lock:
+            self._add(row)
+            customer_id = int(row[0])
+            _, phone, code, _, _ = self.docs[customer_id]
+            self.phones.add(phone, customer_id)
+            self.codes.add(code, customer_id)
+
+    def _add(self, row, keep_sorted=True):
+        customer_id = int(row[0])
+        self._remove(customer_id)
+
+        name_tokens = set(tokenize(row[2]))
+        self.names.add(customer_id, name_tokens, keep_sorted)
+        self.docs[customer_id] = (tuple(row), normalize_phone(row[4]), fold_vietnamese(row[1]),
+                                  name_tokens, fold_vietnamese(row[2]))
+
+    def remove(self, customer_id):
+        """Xóa một khách hàng khỏi chỉ mục"""
+        with self._lock:
+            self._remove(int(customer_id))
+
+    def _remove(self, customer_id):
+        doc = self.docs.pop(customer_id, None)
+        if doc is None:
+            return
+        _, phone, code, name_tokens, _ = doc
+        self.phones.remove(phone, customer_id)
+        self.codes.remove(code, customer_id)
+        self.names.remove(customer_id, name_tokens)
+
+    def search(self, query, limit=20):
+        """Trả về các dòng khách hàng phù hợp nhất
+
+        Chuỗi chỉ gồm số (có thể có khoảng trắng, dấu chấm, gạch, +84) được tìm theo tiền tố SĐT;
+        còn lại tìm theo tiền tố mã khách hàng và từng từ trong họ tên.
+        """
+        query = (query or "").strip()
+        if not query:
+            return []
+
+        with self._lock:
+            if not any(ch.isalpha() for ch in query):
+                digits = normalize_phone(query)
+                ids = self.phones.prefix(digits, limit) if digits else []
+                return [self.docs[customer_id][0] for customer_id in ids]
+
+            scores = None
+            for token in tokenize(query):
+                token_scores = self.names.match(token)
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {doc_id: score + token_scores[doc_id]
+                              for doc_id, score in scores.items() if doc_id in token_scores}
+            scores = scores or {}
+
+            for customer_id in self.codes.prefix(fold_vietnamese(query), limit):
+                scores[customer_id] = scores.get(customer_id, 0) + self.CODE_SCORE
+
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], self.docs[item[0]][4]))
+            if limit:
+                ranked = ranked[:limit]
+            return [self.docs[customer_id][0] for customer_id, _ in ranked]
@@ -0,0 +1,64 @@
+import argparse
+from config import DatabaseConfig
+
+# Hoàn lại tồn kho cho các giữ chỗ đã hết hạn. DELETE ... OUTPUT bảo đảm mỗi giữ chỗ chỉ được
+# hoàn lại một lần dù nhiều phiên cùng dọn. Batch dùng snippet này không được khai báo lại @expired_holds.
+RELEASE_EXPIRED_HOLDS_SQL = """
+    DECLARE @expired_holds TABLE (book_id INT, quantity INT);
+
+    DELETE TOP (1000) FROM StockHolds
+    OUTPUT DELETED.book_id, DELETED.quantity INTO @expired_holds
+    WHERE expires_at <= SYSUTCDATETIME();
+
+    UPDATE b
+    SET quantity_in_stock = b.quantity_in_stock + e.quantity
+    FROM Books b
+    JOIN (SELECT book_id, SUM(quantity) AS quantity FROM @expired_holds GROUP BY book_id) e
+        ON b.book_id = e.book_id;
+"""
+
+
+def release_expired(conn) -> int:
+    """Hoàn lại tồn kho của các giữ chỗ hết hạn, trả về số sách được hoàn lại"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            SET NOCOUNT ON;
+            SET XACT_ABORT ON;
+            {RELEASE_EXPIRED_HOLDS_SQL}
+            SELECT COUNT(*) FROM @expired_holds;
+        """)
+        released = cursor.fetchone()[0]
+        conn.commit()
+        return int(released)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dọn các giữ chỗ tồn kho đã hết hạn")
+    parser.parse_args()
+
+    conn = DatabaseConfig.get_sql_connection()
+    if conn is None:
+        print("Không thể kết nối SQL Server")
+        return 1
+
+    try:
+        total = 0
+        while True:
+            released = release_expired(conn)
+            total += released
+            if released < 1000:
+                break
+        print(f"Đã hoàn lại {total:,} giữ chỗ hết hạn")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,531 @@
+import tkinter as tk
+from tkinter import ttk, TclError
+
+
+class VirtualTreeview:
+    """Hiển thị một danh sách dòng lớn trên Treeview, chỉ tạo item cho các dòng đang nhìn thấy
+
+    rows là một sequence bất kỳ (có len và truy cập theo chỉ số); format_row(row) chỉ được gọi cho
+    các dòng trong cửa sổ hiển thị. row_key(row) là khóa duy nhất của dòng (mặc định là vị trí),
+    dùng làm iid nên lựa chọn được giữ nguyên khi cuộn. row_tags(index, row) (nếu có) thay cho tô màu
+    xen kẽ mặc định. Thanh cuộn, con lăn chuột, phím lên / xuống được xử lý tại đây; mã gọi đăng ký
+    sự kiện chọn qua bind_select().
+    """
+
+    def __init__(self, tree, scrollbar, format_row, row_key=None, striped=True, row_tags=None,
+                 on_near_end=None, near_end=50):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.format_row = format_row
+        self.row_key = row_key
+        self.striped = striped
+        self.row_tags = row_tags
+        self.on_near_end = on_near_end
+        self.near_end = near_end
+
+        self.rows = []
+        self.offset = 0
+        self.visible = int(tree.cget('height') or 10)
+        self._selected = set()
+        self._iid_keys = {}
+        self._select_callbacks = []
+
+        self.tree.configure(yscrollcommand='')
+        self.scrollbar.configure(command=self.yview)
+        self.tree.tag_configure('even', background='#FFFFFF')
+        self.tree.tag_configure('odd', background='#F8FAFC')
+
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+        self.tree.bind('<Configure>', self._on_configure)
+        self.tree.bind('<MouseWheel>', self._on_wheel)
+        self.tree.bind('<Button-4>', lambda e: self._scroll_and_break(-3))
+        self.tree.bind('<Button-5>', lambda e: self._scroll_and_break(3))
+        self.tree.bind('<Up>', lambda e: self._on_arrow(-1))
+        self.tree.bind('<Down>', lambda e: self._on_arrow(1))
+        self.tree.bind('<Prior>', lambda e: self._scroll_and_break(-self.visible))
+        self.tree.bind('<Next>', lambda e: self._scroll_and_break(self.visible))
+
+    # ----- dữ liệu -----
+    def set_rows(self, rows):
+        """Thay toàn bộ dữ liệu, về đầu bảng và bỏ lựa chọn"""
+        self.rows = rows if rows is not None else []
+        self.offset = 0
+        self._selected = set()
+        self.tree.delete(*self.tree.get_children())
+        self._iid_keys = {}
+        self.render()
+
+    def extend(self, rows):
+        """Thêm dòng vào cuối danh sách"""
+        self.rows.extend(rows)
+        self.render()
+
+    def clear(self):
+        self.set_rows([])
+
+    def apply_changes(self, inserted=(), updated=(), deleted=(), insert_first=False):
+        """Áp dụng thay đổi theo khóa thay vì tải lại: thay dòng đã có, thêm dòng mới, xóa theo khóa
+
+        Dòng mới được thêm vào đầu (insert_first) hoặc cuối danh sách; dòng trong inserted đã có sẵn
+        được coi như cập nhật, dòng trong updated chưa có thì bỏ qua. Vị trí cuộn và lựa chọn được giữ.
+        """
+        deleted = set(deleted)
+        replacements = {self.row_key(row): row for row in updated}
+        replacements.update((self.row_key(row), row) for row in inserted)
+        if not deleted and not replacements:
+            return
+
+        rows = []
+        shift = 0
+        for index, row in enumerate(self.rows):
+            key = self.row_key(row)
+            if key in deleted:
+                if index < self.offset:
+                    shift -= 1
+                continue
+            rows.append(replacements.pop(key, row))
+
+        new_keys = {self.row_key(row) for row in inserted}
+        new_rows = [row for key, row in replacements.items() if key in new_keys]
+        if insert_first:
+            rows[0:0] = new_rows
+            if self.offset > 0:
+                shift += len(new_rows)
+        else:
+            rows.extend(new_rows)
+
+        self.rows = rows
+        self.offset += shift
+        self._selected -= deleted
+        self.render(force=True)
+
+    def key_of(self, index):
+        return self.row_key(self.rows[index]) if self.row_key else index
+
+    def selected_rows(self):
+        """Các dòng đang chọn, kể cả dòng đã cuộn ra ngoài vùng nhìn thấy"""
+        if not self._selected:
+            return []
+        if self.row_key is None:
+            return [self.rows[index] for index in sorted(self._selected) if index < len(self.rows)]
+        return [row for row in self.rows if self.row_key(row) in self._selected]
+
+    # ----- hiển thị -----
+    def render(self, force=False):
+        """Đồng bộ các item của Treeview với cửa sổ dòng hiện tại"""
+        total = len(self.rows)
+        self.offset = max(0, min(self.offset, total - self.visible))
+        end = min(self.offset + self.visible, total)
+
+        wanted = []
+        keys = {}
+        for index in range(self.offset, end):
+            key = self.key_of(index)
+            iid = f"k{key}"
+            wanted.append((index, iid))
+            keys[iid] = key
+
+        current = self.tree.get_children()
+        stale = [iid for iid in current if iid not in keys]
+        if stale:
+            self.tree.delete(*stale)
+        existing = set(current) - set(stale)
+
+        for position, (index, iid) in enumerate(wanted):
+            if iid in existing and not force:
+                continue
+
+            values = self.format_row(self.rows[index]) or ()
+            tags = self._tags(index)
+            if iid in existing:
+                self.tree.item(iid, values=values, tags=tags)
+                self.tree.move(iid, '', position)
+            else:
+                self.tree.insert('', position, iid=iid, values=values, tags=tags)
+
+        self._iid_keys = keys
+
+        selection = tuple(iid for _, iid in wanted if keys[iid] in self._selected)
+        if selection != self.tree.selection():
+            self.tree.selection_set(selection)
+
+        if total:
+            self.scrollbar.set(self.offset / total, end / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+        if self.on_near_end and end >= total - self.near_end:
+            self.tree.after_idle(self.on_near_end)
+
+    def _tags(self, index):
+        if self.row_tags:
+            return self.row_tags(index, self.rows[index])
+        if self.striped:
+            return ('even',) if index % 2 == 0 else ('odd',)
+        return ()
+
+    def scroll_to(self, index):
+        self.offset = index
+        self.render()
+
+    def scroll_by(self, rows):
+        self.scroll_to(self.offset + rows)
+
+    def yview(self, *args):
+        """Lệnh của thanh cuộn dọc"""
+        if not args:
+            return
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.rows)))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            self.scroll_by(step * self.visible if args[2] == 'pages' else step)
+
+    # ----- sự kiện -----
+    def bind_select(self, callback):
+        """Đăng ký hàm xử lý khi người dùng đổi lựa chọn (không gọi khi chỉ cuộn)"""
+        self._select_callbacks.append(callback)
+
+    def _on_select(self, event):
+        chosen = {self._iid_keys[iid] for iid in self.tree.selection() if iid in self._iid_keys}
+        if not chosen:
+            # Dòng đang chọn chỉ bị cuộn ra khỏi vùng nhìn thấy thì vẫn giữ lựa chọn
+            visible = set(self._iid_keys.values())
+            chosen = {key for key in self._selected if key not in visible}
+        if chosen == self._selected:
+            return
+
+        self._selected = chosen
+        for callback in self._select_callbacks:
+            callback(event)
+
+    def _on_configure(self, event):
+        visible = self._fit_rows(event.height)
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
+    def _fit_rows(self, height):
+        children = self.tree.get_children()
+        bbox = self.tree.bbox(children[0]) if children else None
+        if bbox:
+            header, row_height = bbox[1], bbox[3]
+        else:
+            style = self.tree.cget('style') or 'Treeview'
+            row_height = int(ttk.Style().lookup(style, 'rowheight') or 20)
+            header = row_height
+        return max(1, (height - header) // max(row_height, 1))
+
+    def _on_wheel(self, event):
+        steps = event.delta // 120 if abs(event.delta) >= 120 else event.delta
+        return self._scroll_and_break(-steps * 3)
+
+    def _scroll_and_break(self, rows):
+        self.scroll_by(rows)
+        return 'break'
+
+    def _on_arrow(self, step):
+        """Lên / xuống ở mép vùng nhìn thấy thì cuộn thêm một dòng rồi chọn dòng kế tiếp"""
+        children = self.tree.get_children()
+        if not children:
+            return None
+
+        focus = self.tree.focus()
+        if focus != (children[0] if step < 0 else children[-1]):
+            return None
+
+        index = self.offset + list(children).index(focus) + step
+        if not 0 <= index < len(self.rows):
+            return 'break'
+
+        self.scroll_by(step)
+        iid = f"k{self.key_of(index)}"
+        self.tree.focus(iid)
+        self.tree.selection_set(iid)
+        return 'break'
+
+
+class PagedTreeLoader:
+    """Tải dữ liệu theo từng trang (keyset) khi người dùng cuộn gần cuối bảng
+
+    Các dòng đã tải được hiển thị qua VirtualTreeview nên Treeview chỉ giữ các dòng đang nhìn thấy.
+    newest_first: thứ tự trang giảm dần (dòng mới tạo nằm ở đầu bảng), dùng cho apply_changes().
+    count_hint() trả về số dòng ước lượng của bảng; khi có status_label, nhãn hiển thị số dòng
+    đã tải trên tổng ước lượng và số trang.
+    """
+
+    def __init__(self, tree, scrollbar, fetch_page, format_row, page_size=100, striped=True,
+                 worker=None, key=None, row_key=lambda row: row[0], newest_first=False,
+                 count_hint=None, status_label=None):
+        self.fetch_page = fetch_page
+        self.page_size = page_size
+        self.newest_first = newest_first
+        self.count_hint = count_hint
+        self.status_label = status_label
+        self.total_hint = None
+        self.worker = worker
+        self.key = key or f"page:{id(self)}"
+        self.view = VirtualTreeview(tree, scrollbar, format_row, row_key=row_key, striped=striped,
+                                    on_near_end=self.load_more, near_end=page_size // 2)
+
+        self.next_key = None
+        self.exhausted = False
+        self.loading = False
+
+    @property
+    def row_count(self):
+        return len(self.view.rows)
+
+    def reload(self):
+        """Xóa bảng và tải lại trang đầu tiên"""
+        if self.worker:
+            self.worker.cancel(self.key)
+
+        self.next_key = None
+        self.exhausted = False
+        self.loading = False
+        self.total_hint = None
+        self.view.set_rows([])
+        self._load_count_hint()
+        self.load_more()
+
+    def apply_changes(self, inserted=(), updated=(), deleted=()):
+        """Áp dụng các dòng thay đổi do thao tác ghi trả về, giữ nguyên các trang đã tải
+
+        Dòng mới ở cuối thứ tự chỉ được thêm khi đã tải hết; nếu chưa, trang sau sẽ tự tải dòng đó.
+        """
+        if not self.newest_first and not self.exhausted:
+            updated, inserted = list(updated) + list(inserted), ()
+        self.view.apply_changes(inserted, updated, deleted, insert_first=self.newest_first)
+        self.update_status()
+
+    def load_more(self):
+        """Tải trang kế tiếp nếu còn dữ liệu"""
+        if self.exhausted or self.loading:
+            return
+
+        self.loading = True
+        if self.worker:
+            self.worker.submit(self.key, self.fetch_page, self.next_key, self.page_size,
+                               on_success=self._apply_page, on_error=self._page_failed)
+            return
+
+        try:
+            self._apply_page(self.fetch_page(self.next_key, self.page_size))
+        finally:
+            self.loading = False
+
+    def _apply_page(self, page):
+        rows, next_key = page
+        self.next_key = next_key
+        self.exhausted = next_key is None
+        self.loading = False
+        self.view.extend(list(rows))
+        self.update_status()
+
+    def _page_failed(self, error):
+        self.loading = False
+
+    def _load_count_hint(self):
+        if self.count_hint is None or self.status_label is None:
+            return
+
+        if self.worker:
+            self.worker.submit(f"{self.key}:count", self.count_hint, on_success=self._set_total_hint)
+        else:
+            self._set_total_hint(self.count_hint())
+
+    def _set_total_hint(self, total):
+        self.total_hint = total
+        self.update_status()
+
+    def update_status(self):
+        """Cập nhật nhãn trạng thái: số dòng đã tải / tổng ước lượng, số trang"""
+        if self.status_label is None:
+            return
+
+        loaded = self.row_count
+        if self.exhausted:
+            text = f"{loaded:,} dòng"
+        elif not self.total_hint:
+            text = f"Đã tải {loaded:,} dòng"
+        else:
+            total = max(self.total_hint, loaded)
+            pages_loaded = -(-loaded // self.page_size)
+            pages = -(-total // self.page_size)
+            text = f"Đã tải {loaded:,} / ~{total:,} dòng (trang {pages_loaded}/~{pages})"
+        self.status_label.configure(text=text)
+
+
+class TypeaheadCombobox(ttk.Combobox):
+    """Combobox gợi ý theo chuỗi đang gõ, chỉ giữ top-N kết quả thay vì toàn bộ danh sách
+
+    lookup(text, limit) trả về các dòng (cột đầu là ID) và được gọi trên luồng nền;
+    format_item(row) tạo chuỗi hiển thị. Giá trị chọn được lấy qua selected_row() / selected_id().
+    """
+
+    IGNORED_KEYS = {'Up', 'Down', 'Left', 'Right', 'Return', 'Escape', 'Tab',
+                    'Shift_L', 'Shift_R', 'Control_L', 'Control_R', 'Alt_L', 'Alt_R'}
+
+    def __init__(self, parent, lookup, format_item, worker=None, key=None,
+                 limit=20, debounce_ms=250, min_chars=1, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.lookup = lookup
+        self.format_item = format_item
+        self.worker = worker
+        self.key = key or f"typeahead:{id(self)}"
+        self.limit = limit
+        self.debounce_ms = debounce_ms
+        self.min_chars = min_chars
+
+        self._matches = []
+        self._selected = None
+        self._debounce_job = None
+
+        # Danh sách gợi ý riêng (Toplevel không viền + Listbox), không grab như dropdown của ttk,
+        # nên phím gõ vẫn vào ô nhập; Up / Down / Return / Escape được xử lý trên ô nhập
+        self._popup = tk.Toplevel(self)
+        self._popup.withdraw()
+        self._popup.overrideredirect(True)
+        self._listbox = tk.Listbox(self._popup, takefocus=0, exportselection=False, activestyle='none',
+                                   font=kwargs.get('font'))
+        self._listbox.pack(fill='both', expand=True)
+        self._listbox.bind('<ButtonRelease-1>', self._on_list_click)
+
+        self.bind('<KeyRelease>', self._on_key)
+        self.bind('<<ComboboxSelected>>', self._on_selected)
+        self.bind('<Down>', lambda event: self._move_active(1))
+        self.bind('<Up>', lambda event: self._move_active(-1))
+        self.bind('<Return>', self._on_return)
+        self.bind('<Escape>', lambda event: self._hide_popup())
+        self.bind('<FocusOut>', lambda event: self.after(150, self._hide_if_outside))
+
+    def _on_key(self, event):
+        if event.keysym in self.IGNORED_KEYS:
+            return
+
+        self._selected = None
+        if self._debounce_job is not None:
+            self.after_cancel(self._debounce_job)
+        self._debounce_job = self.after(self.debounce_ms, self.refresh)
+
+    def refresh(self):
+        """Tra cứu lại theo chuỗi hiện tại"""
+        self._debounce_job = None
+        text = self.get().strip()
+        if self._selected is not None:
+            return
+
+        if len(text) < self.min_chars:
+            if self.worker:
+                self.worker.cancel(self.key)
+            self._show_matches([])
+            return
+
+        if self.worker:
+            self.worker.submit(self.key, self.lookup, text, self.limit, on_success=self._show_matches)
+        else:
+            self._show_matches(self.lookup(text, self.limit))
+
+    def _show_matches(self, rows):
+        self._matches = list(rows or [])
+        items = [self.format_item(row) for row in self._matches]
+        self['values'] = items
+
+        if not items or self.focus_get() is not self:
+            self._hide_popup()
+            return
+
+        self._listbox.delete(0, 'end')
+        for item in items:
+            self._listbox.insert('end', item)
+        self._listbox.configure(height=min(len(items), 10))
+
+        # Đặt ngay dưới ô nhập, rộng bằng ô nhập
+        x, y = self.winfo_rootx(), self.winfo_rooty() + self.winfo_height()
+        self._popup.geometry(f"{self.winfo_width()}x{self._listbox.winfo_reqheight()}+{x}+{y}")
+        self._popup.deiconify()
+        self._popup.lift()
+
+    def _popup_visible(self):
+        try:
+            return self._popup.winfo_ismapped()
+        except TclError:
+            return False
+
+    def _hide_popup(self):
+        try:
+            self._popup.withdraw()
+        except TclError:
+            pass
+
+    def _hide_if_outside(self):
+        """Ẩn gợi ý khi focus rời ô nhập, trừ khi con trỏ chuột đang ở trên danh sách (đang bấm chọn)"""
+        try:
+            pointed = self.winfo_containing(*self.winfo_pointerxy())
+        except (TclError, KeyError):
+            pointed = None
+        if self.focus_get() is not self and pointed is not self._listbox:
+            self._hide_popup()
+
+    def _move_active(self, step):
+        """Up / Down trên ô nhập: di chuyển dòng đang chọn trong danh sách gợi ý"""
+        if not self._popup_visible():
+            return None
+
+        size = self._listbox.size()
+        current = self._listbox.curselection()
+        index = (current[0] + step) if current else (0 if step > 0 else size - 1)
+        index = max(0, min(size - 1, index))
+        self._listbox.selection_clear(0, 'end')
+        self._listbox.selection_set(index)
+        self._listbox.see(index)
+        return 'break'
+
+    def _on_return(self, event=None):
+        if not self._popup_visible():
+            return None
+        current = self._listbox.curselection()
+        if current:
+            self._choose(current[0])
+        else:
+            self._hide_popup()
+        return 'break'
+
+    def _on_list_click(self, event):
+        index = self._listbox.nearest(event.y)
+        if 0 <= index < len(self._matches):
+            self._choose(index)
+
+    def _choose(self, index):
+        """Chọn một gợi ý như khi chọn trong dropdown của Combobox"""
+        self._hide_popup()
+        self.current(index)
+        self.focus_set()
+        self.icursor('end')
+        self.event_generate('<<ComboboxSelected>>')
+
+    def _on_selected(self, event=None):
+        idx = self.current()
+        self._selected = self._matches[idx] if 0 <= idx < len(self._matches) else None
+
+    def selected_row(self):
+        """Dòng đang được chọn, hoặc None"""
+        return self._selected
+
+    def selected_id(self):
+        """ID (cột đầu) của dòng đang được chọn, hoặc None"""
+        return self._selected[0] if self._selected is not None else None
+
+    def clear(self):
+        """Xóa chuỗi đang gõ, gợi ý và lựa chọn"""
+        if self._debounce_job is not None:
+            self.after_cancel(self._debounce_job)
+            self._debounce_job = None
+        if self.worker:
+            self.worker.cancel(self.key)
+        self._selected = None
+        self._matches = []
+        self['values'] = []
+        self._hide_popup()
+        self.set('')
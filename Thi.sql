@@ -44,21 +44,10 @@ FROM ImportBooks
 GROUP BY supplier
 ORDER BY tong_gia_tri DESC;
 
--- TRIGGER: Cập nhật tồn kho khi nhập sách (ĐƠN GIẢN)
+-- Tồn kho khi nhập do ứng dụng cộng (add_import_item, add_import_items_bulk) nên không dùng trigger
+-- cộng kho trên ImportDetails, tránh cộng hai lần cho cùng một dòng phiếu nhập
 GO
-CREATE OR ALTER TRIGGER trg_UpdateStockWhenImportCreated
-ON ImportDetails
-AFTER INSERT
-AS
-BEGIN
-    SET NOCOUNT ON;
-    
-    UPDATE b
-    SET quantity_in_stock = quantity_in_stock + i.quantity,
-        updated_date = GETDATE()
-    FROM Books b
-    INNER JOIN inserted i ON b.book_id = i.book_id;
-END;
+DROP TRIGGER IF EXISTS trg_UpdateStockWhenImportCreated;
 GO
 
 -- VIEW: Sách cần nhập thêm (nếu chưa có trong file LINH)
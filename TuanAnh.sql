@@ -62,22 +62,10 @@ BEGIN
     PRINT 'Đơn hàng không tồn tại';
 END
 
--- TRIGGER: Cập nhật tồn kho khi tạo đơn (ĐƠN GIẢN)
+-- Tồn kho khi bán do ứng dụng trừ (giữ chỗ StockHolds, checkout) nên không dùng trigger trừ kho
+-- trên OrderDetails, tránh trừ hai lần cho cùng một dòng đơn hàng
 GO
-CREATE OR ALTER TRIGGER trg_UpdateStockWhenOrderCreated
-ON OrderDetails
-AFTER INSERT
-AS
-BEGIN
-    SET NOCOUNT ON;
-    
-    UPDATE b
-    SET quantity_in_stock = quantity_in_stock - i.quantity
-    FROM Books b
-    INNER JOIN inserted i ON b.book_id = i.book_id
-    INNER JOIN Orders o ON i.order_id = o.order_id
-    WHERE o.status != 'Cancelled';
-END;
+DROP TRIGGER IF EXISTS trg_UpdateStockWhenOrderCreated;
 GO
 
 -- VIEW: Đơn hàng đang chờ xử lý